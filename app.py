@@ -1,50 +1,69 @@
+from startup import StartupTimer, check_browser, install_browser_in_background, log_once
+
+startup_timer = StartupTimer()
+
 import streamlit as st
 from dotenv import load_dotenv
 import os
-import io
 from pathlib import Path
-import pandas as pd
-import random
+import time
+import uuid
+import queue
+from concurrent import futures
+from functools import partial
 from datetime import datetime
-import subprocess
-import requests
-from playwright.sync_api import sync_playwright
-
-# Deze functie draait maar 1x per sessie/reboot
-@st.cache_resource
-def install_playwright_browser():
-    print("Installing Playwright Chromium...")
-    # We installeren alleen chromium om ruimte te besparen
-    subprocess.run(["playwright", "install", "chromium"])
-
-try:
-    # Probeer de installatie te draaien
-    install_playwright_browser()
-except Exception as e:
-    st.error(f"Fout bij installatie browser: {e}")
-
-def run_scraper():
-    with sync_playwright() as p:
-        # Headless MOET True zijn op Streamlit Cloud
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        page.goto("https://example.com")
-        title = page.title()
-        
-        browser.close()
-        return title
 
 # Import de nieuwe klassen
-from message_generator import MessageGenerator
-from audio_generator import AudioGenerator
-from video_generator import VideoGenerator
-from video_generator_v1 import VideoGeneratorV1
-from letter_generator import LetterGenerator
+import generator_config
+from image_variants import image_for
+from letter_generator import OVERFLOW_WARNING
+from pdf_renderer import submit_pdf
+from webhook_receiver import start_receiver
+from video_scheduler import get_scheduler
+from video_events import VideoGenerationError
+from streamlit_progress import StreamlitVideoProgress
+from avatar_catalog import get_avatar_catalog, validate_avatar_id
+from video_archive import get_video_archive, start_video_server, video_url_for
+from artifact_store import artifact_url_for, get_artifact_store
+from video_jobs import request_key, resume_pending_jobs
+from pipeline import Pipeline, SkippedError
+from tracing import span, start_metrics_server
+from job_queue import QUEUED, RUNNING, SUCCEEDED, get_job_queue, queue_enabled
+
+startup_timer.mark("imports")
 
 # Load environment variables
 load_dotenv()
 
+# Enkel controleren of Chromium er is (een paar stat() calls; installeren is een
+# build stap). PDF tooling zelf wordt pas geladen bij de eerste PDF.
+def browser_status():
+    status = check_browser()
+    if not status.available and os.getenv("SINTERKLAAS_INSTALL_BROWSER", "").lower() in ("1", "true"):
+        # Geen build stap mogelijk: 1x per proces op de achtergrond installeren
+        install_browser_in_background()
+    return status
+
+# De webhook receiver draait 1x per proces, gedeeld door alle sessies
+@st.cache_resource
+def start_webhook_receiver(port):
+    return start_receiver(port)
+
+# Na een herstart 1x per proces aanhaken op renders die nog liepen
+@st.cache_resource
+def resume_video_jobs(api_key):
+    return resume_pending_jobs(api_key)
+
+# Video archief over HTTP (met Range), enkel als er een publieke URL voor is
+@st.cache_resource
+def start_video_archive_server(port):
+    return start_video_server(port)
+
+# Prometheus /metrics met de tijden per stap (tracing.py), 1x per proces
+@st.cache_resource
+def start_metrics_endpoint(port):
+    return start_metrics_server(port)
+
 # Helper function to safely get secrets
 def get_secret(key, default=""):
     try:
@@ -52,11 +71,17 @@ def get_secret(key, default=""):
     except:
         return default
 
+# Instelling uit .env, anders uit st.secrets
+def get_setting(key, default=""):
+    return os.getenv(key) or get_secret(key, default)
+
 # Login credentials from .env
 APP_USERNAME = os.getenv("APP_USERNAME") or get_secret("APP_USERNAME", "")
 APP_PASSWORD = os.getenv("APP_PASSWORD") or get_secret("APP_PASSWORD", "")
 
 # Initialize generators (optioneel - kan worden uitgeschakeld)
+# Eén instantie per proces en configuratie (generator_config.py): een rerun bouwt
+# niets opnieuw en de HTTP connection pools blijven warm.
 USE_MESSAGE_GENERATOR = True
 USE_AUDIO_GENERATOR = True
 USE_VIDEO_GENERATOR = True
@@ -69,62 +94,92 @@ letter_gen = None
 
 # Initialize MessageGenerator
 if USE_MESSAGE_GENERATOR:
-    api_key = os.getenv("OPENAI_API_KEY") or get_secret("OPENAI_API_KEY", "")
-    if api_key:
-        try:
-            message_gen = MessageGenerator(api_key)
-        except Exception as e:
-            st.error(f"❌ MessageGenerator initialisatie mislukt: {e}")
+    try:
+        message_gen = generator_config.message_generator(get_setting)
+    except Exception as e:
+        st.error(f"❌ MessageGenerator initialisatie mislukt: {e}")
+
+startup_timer.mark("message generator")
 
 # Initialize AudioGenerator
 if USE_AUDIO_GENERATOR:
-    elevenlabs_key = os.getenv("ELEVENLABS_API_KEY") or get_secret("ELEVENLABS_API_KEY", "")
-    elevenlabs_voice = os.getenv("ELEVENLABS_VOICE_ID") or get_secret("ELEVENLABS_VOICE_ID", "")
-    openai_key = os.getenv("OPENAI_API_KEY") or get_secret("OPENAI_API_KEY", "")
-    if elevenlabs_key or openai_key:
-        try:
-            audio_gen = AudioGenerator(elevenlabs_key, elevenlabs_voice, openai_key)
-        except Exception as e:
-            st.warning(f"⚠️ AudioGenerator initialisatie mislukt: {e}")
+    try:
+        audio_gen = generator_config.audio_generator(get_setting)
+    except Exception as e:
+        st.warning(f"⚠️ AudioGenerator initialisatie mislukt: {e}")
+
+startup_timer.mark("audio generator")
+
+# Media server voor video's, audio en PDF's (ook zonder video generator).
+# Zonder SINTERKLAAS_VIDEO_BASE_URL leest Streamlit elk getoond bestand volledig in
+# zijn in-memory media manager, per sessie: zet de URL voor grote of drukke installaties.
+if os.getenv("SINTERKLAAS_VIDEO_BASE_URL"):
+    try:
+        start_video_archive_server(int(os.getenv("SINTERKLAAS_VIDEO_PORT") or 8766))
+    except Exception as e:
+        st.warning(f"⚠️ Media server kon niet starten, video's en downloads gaan via Streamlit: {e}")
+        os.environ.pop("SINTERKLAAS_VIDEO_BASE_URL", None)
 
 # Initialize VideoGenerator
 if USE_VIDEO_GENERATOR:
-    heygen_key = os.getenv("HEYGEN_API_KEY") or get_secret("HEYGEN_API_KEY", "")
-    heygen_avatar_id = os.getenv("HEYGEN_AVATAR_ID") or get_secret("HEYGEN_AVATAR_ID", "")
-    heygen_api_version = (os.getenv("HEYGEN_API_VERSION") or get_secret("HEYGEN_API_VERSION", "v2")).lower()
-    heygen_avatar_type = (os.getenv("HEYGEN_AVATAR_TYPE") or get_secret("HEYGEN_AVATAR_TYPE", "avatar")).lower()
-    heygen_background = os.getenv("HEYGEN_BACKGROUND_COLOR") or get_secret("HEYGEN_BACKGROUND_COLOR", "#FFFFFF")
-    heygen_aspect_ratio = os.getenv("HEYGEN_ASPECT_RATIO") or get_secret("HEYGEN_ASPECT_RATIO", "16:9")
-    heygen_width = int(os.getenv("HEYGEN_WIDTH") or get_secret("HEYGEN_WIDTH", 1280))
-    heygen_height = int(os.getenv("HEYGEN_HEIGHT") or get_secret("HEYGEN_HEIGHT", 720))
-    heygen_test_mode = (os.getenv("HEYGEN_TEST_MODE") or get_secret("HEYGEN_TEST_MODE", "false")).lower() == "true"
-
-    if heygen_key and heygen_avatar_id:
+    heygen_key = get_setting("HEYGEN_API_KEY")
+    heygen_avatar_id = get_setting("HEYGEN_AVATAR_ID")
+    # Optioneel: HeyGen meldt voltooiing via een webhook i.p.v. (snel) pollen
+    heygen_callback_url = get_setting("HEYGEN_CALLBACK_URL")
+    heygen_webhook_port = get_setting("HEYGEN_WEBHOOK_PORT")
+    
+    if heygen_callback_url and heygen_webhook_port:
+        # Zonder secret weigert de receiver te starten (ongesigneerde callbacks zijn te vervalsen)
         try:
-            if heygen_api_version == "v1":
-                st.info("🎥 HeyGen v1 modus actief (geschikt voor photo avatars).")
-                video_gen = VideoGeneratorV1(
-                    heygen_key,
-                    heygen_avatar_id,
-                    avatar_type=heygen_avatar_type,
-                    background_color=heygen_background,
-                    aspect_ratio=heygen_aspect_ratio,
-                    width=heygen_width,
-                    height=heygen_height,
-                    test_mode=heygen_test_mode,
-                )
-            else:
-                video_gen = VideoGenerator(heygen_key, heygen_avatar_id)
+            start_webhook_receiver(int(heygen_webhook_port))
+        except Exception as e:
+            st.warning(f"⚠️ HeyGen webhook receiver kon niet starten, val terug op pollen: {e}")
+            heygen_callback_url = ""
+
+    try:
+        video_gen = generator_config.video_generator(get_setting, callback_url=heygen_callback_url)
+        if video_gen and generator_config.video_api_version(get_setting) == "v1":
+            st.info("🎥 HeyGen v1 modus actief (geschikt voor photo avatars).")
+    except Exception as e:
+        st.warning(f"⚠️ VideoGenerator initialisatie mislukt: {e}")
+
+    if video_gen:
+        try:
+            resume_video_jobs(heygen_key)
         except Exception as e:
-            st.warning(f"⚠️ VideoGenerator initialisatie mislukt: {e}")
+            st.warning(f"⚠️ Lopende video jobs konden niet hervat worden: {e}")
+
+        # Offline controle tegen de lokale avatar catalogus; een verlopen catalogus
+        # wordt op de achtergrond ververst zonder de pagina op te houden
+        avatar_catalog = get_avatar_catalog()
+        avatar_catalog.refresh_in_background(heygen_key)
+        if validate_avatar_id(avatar_catalog, heygen_key, heygen_avatar_id) is False:
+            st.warning(
+                f"⚠️ HEYGEN_AVATAR_ID `{heygen_avatar_id}` staat niet in je HeyGen account. "
+                "Zoek een geldige ID met `python avatars.py`."
+            )
+
+startup_timer.mark("video generator")
 
 # Initialize LetterGenerator
 if USE_LETTER_GENERATOR:
     try:
-        letter_gen = LetterGenerator("sint-briefpapier.png")
+        letter_gen = generator_config.letter_generator()
     except Exception as e:
         st.warning(f"⚠️ LetterGenerator initialisatie mislukt: {e}")
 
+startup_timer.mark("letter generator")
+
+pdf_browser = browser_status()
+startup_timer.mark("browser check")
+
+if os.getenv("SINTERKLAAS_METRICS_PORT"):
+    try:
+        start_metrics_endpoint(int(os.getenv("SINTERKLAAS_METRICS_PORT")))
+    except Exception as e:
+        st.warning(f"⚠️ Metrics endpoint kon niet starten (zie `python tracing.py serve`): {e}")
+log_once(startup_timer)
+
 # Page configuration
 st.set_page_config(
     page_title="Sinterklaas boodschap",
@@ -195,7 +250,7 @@ if not st.session_state['authenticated']:
     # Show Sinterklaas image if available
     image_path = Path(__file__).parent / "sint.png"
     if image_path.exists():
-        st.image(str(image_path), use_container_width=True)
+        st.image(str(image_for(image_path, "column")), use_container_width=True)
     
     st.markdown("## 🔐 Login")
     st.markdown("Voer je inloggegevens in om de Sinterklaas app te gebruiken.")
@@ -229,12 +284,13 @@ with col3:
         st.session_state.pop('sinterklaas_tekst', None)
         st.session_state.pop('sinterklaas_tekst_aangepast', None)
         st.session_state.pop('genereer_media', None)
+        st.session_state.pop('pdf_job', None)
         st.rerun()
 
 # Check for Sinterklaas image
 image_path = Path(__file__).parent / "sint.png"
 if image_path.exists():
-    st.image(str(image_path), use_container_width=True)
+    st.image(str(image_for(image_path, "column")), use_container_width=True)
 else:
     st.markdown("### *Afbeelding van Sinterklaas wordt hier getoond*")
     st.info("💡 Tip: Voeg een `sint.png` bestand toe aan deze map voor een mooie afbeelding!")
@@ -259,6 +315,40 @@ if 'app_mode' not in st.session_state:
 # Continue based on selected mode
 app_mode = st.session_state.get('app_mode')
 
+# Zo lang een tekst job in de wachtrij mag staan voor we melden dat er geen worker draait
+MESSAGE_JOB_NO_WORKER_AFTER = 30
+
+
+@st.fragment(run_every=2)
+def message_job_progress(job_id):
+    """Status van de tekst job in de queue; volledige rerun zodra ze klaar is."""
+    job = get_job_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    if job.status == QUEUED and time.time() - job.created_at > MESSAGE_JOB_NO_WORKER_AFTER:
+        st.warning("⚠️ De boodschap staat nog in de wachtrij: er lijkt geen worker te draaien (`python worker.py`).")
+    elif job.status == QUEUED:
+        st.info("🕒 Sinterklaas' boodschap staat in de wachtrij...")
+    else:
+        st.info(f"⏳ Sinterklaas neemt z'n pen en brief en schrijft zijn boodschap... {job.progress or ''}")
+
+
+def show_message_job(job_id):
+    """Neem de tekst over uit een afgewerkte job, of toon de voortgang zolang ze loopt."""
+    job = get_job_queue().get(job_id)
+    if job is not None and not job.finished:
+        message_job_progress(job_id)
+        return
+    st.session_state.pop('message_job', None)
+    if job is None:
+        st.error("❌ De tekst job is niet meer beschikbaar; probeer opnieuw.")
+    elif job.status != SUCCEEDED:
+        st.error(f"❌ Er is een fout opgetreden bij tekst generatie: {job.error or job.status}")
+        st.info("Controleer of je OpenAI API key geldig is en of je credits hebt.")
+    else:
+        st.session_state['sinterklaas_tekst'] = job.result["text"]
+        st.session_state['tekst_generatie_klaar'] = True
+
 # Manual mode - User writes their own message
 if app_mode == 'manual':
     st.markdown("### ✍️ Schrijf je eigen Sinterklaas boodschap")
@@ -375,7 +465,7 @@ elif app_mode == 'auto':
             with st.spinner("Sinterklaas neemt z'n pen en brief en schrijft zijn boodschap... even geduld, aub."):
                 try:
                     # Generate text using MessageGenerator
-                    tekst = message_gen.generate(
+                    message_args = dict(
                         naam=naam,
                         leeftijd=leeftijd,
                         geslacht=geslacht,
@@ -385,10 +475,15 @@ elif app_mode == 'auto':
                         schoentje_gezet="Ja" if schoentje_gezet == "Ja" else "Nee",
                         slang_toggle=slang_toggle
                     )
-                    
-                    # Store in session state
-                    st.session_state['sinterklaas_tekst'] = tekst
-                    st.session_state['tekst_generatie_klaar'] = True
+                    if queue_enabled():
+                        # Een worker schrijft de tekst; enkel het job ID in de sessie, een fragment
+                        # pollt de status (de job loopt door als deze sessie wegvalt)
+                        session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+                        st.session_state['message_job'] = get_job_queue().submit("message", message_args, owner=session_id)
+                    else:
+                        # Store in session state
+                        st.session_state['sinterklaas_tekst'] = message_gen.generate(**message_args)
+                        st.session_state['tekst_generatie_klaar'] = True
                     st.session_state['naam'] = naam
                     st.rerun()
                     
@@ -397,6 +492,9 @@ elif app_mode == 'auto':
                     st.info("Controleer of je OpenAI API key geldig is en of je credits hebt.")
                     tekst = None
 
+    if st.session_state.get('message_job'):
+        show_message_job(st.session_state['message_job'])
+
 # Display the text and allow editing (only for auto mode, outside submitted block, so it persists after rerun)
 if app_mode == 'auto' and st.session_state.get('sinterklaas_tekst'):
     tekst = st.session_state['sinterklaas_tekst']
@@ -464,200 +562,402 @@ if app_mode == 'auto' and st.session_state.get('sinterklaas_tekst'):
             st.rerun()
 
 
+def file_download_button(label, path, file_name, mime, url=None, key=None):
+    """
+    Download van een bestand op schijf.
+
+    Met de media server (SINTERKLAAS_VIDEO_BASE_URL) een link: de browser haalt het
+    bestand daar gestreamd op. Anders leest Streamlit het bestand bij het tonen
+    volledig in het geheugen (per sessie).
+    """
+    if url:
+        st.link_button(label, url, use_container_width=True)
+        return
+    with open(path, "rb") as f:
+        st.download_button(label=label, data=f, file_name=file_name, mime=mime, use_container_width=True, key=key)
+
+
+def pdf_download():
+    """
+    Toon de PDF download knop voor de PDF job in session state.
+
+    Zolang de job loopt een uitgeschakelde wachtknop: toon in een placeholder en
+    vervang die zodra de job klaar is (er wordt niet gepolld vanuit de browser).
+    """
+    store = get_artifact_store()
+    pdf_id = st.session_state.get('pdf_artifact')
+    if pdf_id is None:
+        pdf_job = st.session_state.get('pdf_job')
+        if pdf_job is None:
+            return
+        if not pdf_job.done():
+            st.button("⏳ Brief als PDF wordt gemaakt...", disabled=True, use_container_width=True, key="pdf_download_wait")
+            return
+        try:
+            pdf_bytes = pdf_job.result()
+        except ImportError:
+            st.info("💡 **PDF download beschikbaar** - Installeer `playwright` voor PDF download functionaliteit: `pip install playwright && playwright install chromium`")
+            return
+        except Exception as pdf_error:
+            st.warning(f"⚠️ PDF generatie mislukt: {str(pdf_error)[:200]}")
+            st.info("💡 Probeer: `pip install playwright && playwright install chromium`")
+            return
+        # Vanaf nu enkel het artifact ID in de sessie; de bytes staan op schijf
+        pdf_id = store.put(pdf_bytes, "pdf")
+        st.session_state['pdf_artifact'] = pdf_id
+        st.session_state.pop('pdf_job', None)
+    pdf_path = store.get(pdf_id)
+    if pdf_path is None:
+        st.info("💡 De PDF is niet meer beschikbaar; maak de brief opnieuw.")
+        return
+    file_name = f"sinterklaas_brief_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    file_download_button("📥 Download Brief als PDF", pdf_path, file_name, "application/pdf",
+                         url=artifact_url_for(pdf_id, download=file_name))
+
+
+def show_letter_overflow():
+    st.warning(f"⚠️ {OVERFLOW_WARNING}: het einde wordt afgeknipt. Maak de tekst wat korter.")
+
+
+def show_audio_player(audio_path, artifact_id=None):
+    """Audio speler + download voor een mp3 op schijf (uit de artifact store of een job)."""
+    if audio_path is None:
+        st.info("💡 De audio is niet meer beschikbaar; maak ze opnieuw.")
+        return
+    naam = st.session_state.get('naam', 'kind')
+    file_name = f"sinterklaas_audio_{naam}_{datetime.now().strftime('%Y%m%d')}.mp3"
+    st.markdown("### 🎵 Luister naar Sinterklaas")
+    audio_url = artifact_url_for(artifact_id) if artifact_id else None
+    st.audio(audio_url or str(audio_path), format="audio/mp3", autoplay=False)
+    file_download_button("📥 Download Audio", audio_path, file_name, "audio/mpeg",
+                         url=artifact_url_for(artifact_id, download=file_name) if artifact_id else None)
+
+
+def show_video(video_path, video_url, naam, datum):
+    """Video speler + download; een gearchiveerde video via de media server of van schijf."""
+    if video_path is not None:
+        video_url = video_url_for(video_path) or str(video_path)
+    st.markdown("### 🎥 Sinterklaas in HeyGen Ultra Quality")
+    st.video(video_url)
+    if video_path is not None:
+        file_name = f"sinterklaas_video_{naam}_{datum}.mp4"
+        file_download_button("📥 Download Video", video_path, file_name, "video/mp4",
+                             url=video_url_for(video_path, download=file_name))
+
+
+MEDIA_JOB_LABELS = {'audio': "🎤 Audio", 'video': "🎬 Video", 'pdf': "✉️ Brief als PDF"}
+
+
+def load_media_jobs(media_jobs):
+    job_queue = get_job_queue()
+    return {name: job_queue.get(job_id) for name, job_id in media_jobs['jobs'].items()}
+
+
+@st.fragment(run_every=2)
+def media_jobs_progress():
+    """Status van de media jobs; volledige rerun zodra alles klaar is."""
+    media_jobs = st.session_state.get('media_jobs')
+    if not media_jobs:
+        return
+    jobs = load_media_jobs(media_jobs)
+    if all(job is None or job.finished for job in jobs.values()):
+        st.rerun()
+    for name, job in jobs.items():
+        label = MEDIA_JOB_LABELS[name]
+        if job is None:
+            # Al opgeruimd (JobQueue.purge); de volledige rerun toont wat er nog is
+            continue
+        if job.status == QUEUED:
+            retry = f" (poging {job.attempts + 1})" if job.attempts else ""
+            st.info(f"🕒 {label}: in de wachtrij{retry}")
+        elif job.status == RUNNING:
+            st.info(f"⏳ {label}: {job.progress or 'bezig...'}")
+        elif job.status == SUCCEEDED:
+            st.success(f"✅ {label}: klaar")
+        else:
+            st.error(f"❌ {label}: {job.error or job.status}")
+
+
+def show_media_jobs(media_jobs):
+    """Resultaten van de media jobs (of hun voortgang zolang ze lopen)."""
+    jobs = load_media_jobs(media_jobs)
+    naam = st.session_state.get('naam', 'kind')
+    datum = datetime.now().strftime('%Y%m%d')
+    if not all(job is None or job.finished for job in jobs.values()):
+        media_jobs_progress()
+    else:
+        audio_job = jobs.get('audio')
+        audio_path = None
+        if audio_job is not None and audio_job.status == SUCCEEDED:
+            audio_path = Path(audio_job.result['audio'])
+        elif audio_job is not None:
+            st.warning(f"⚠️ **Audio generatie fout**\n\n*Fout: {(audio_job.error or audio_job.status)[:150]}*")
+
+        video_job = jobs.get('video')
+        if video_job is not None:
+            if video_job.status == SUCCEEDED:
+                result = video_job.result
+                if result.get('from_archive'):
+                    st.info("♻️ Deze video werd al eerder gemaakt en komt uit het archief.")
+                video_path = Path(result['video_path']) if result.get('video_path') else None
+                show_video(video_path, result.get('video_url'), naam, datum)
+            else:
+                st.error(f"❌ HeyGen video generatie mislukt: {video_job.error or video_job.status}")
+
+        if audio_path and (media_jobs['audio_explicit'] or video_job is None):
+            show_audio_player(audio_path)
+
+    if media_jobs['letter'] and letter_gen:
+        st.markdown("### ✉️ Officiële Sinterklaasbrief")
+        if not letter_gen.fits_on_page(media_jobs['text']):
+            show_letter_overflow()
+        st.markdown(letter_gen.generate_html(media_jobs['text']), unsafe_allow_html=True)
+        pdf_job = jobs.get('pdf')
+        if pdf_job is not None and pdf_job.status == SUCCEEDED:
+            file_download_button("📥 Download Brief als PDF", Path(pdf_job.result['pdf']),
+                                 f"sinterklaas_brief_{naam}_{datum}.pdf", "application/pdf")
+        elif pdf_job is not None and pdf_job.finished:
+            st.warning(f"⚠️ PDF generatie mislukt: {(pdf_job.error or pdf_job.status)[:200]}")
+
+    st.markdown("---")
+    if st.button("🔄 Terug naar modus selectie", use_container_width=True, key="media_jobs_back"):
+        st.session_state.pop('app_mode', None)
+        st.session_state.pop('sinterklaas_tekst', None)
+        st.session_state.pop('sinterklaas_tekst_aangepast', None)
+        st.session_state.pop('media_jobs', None)
+        st.rerun()
+
+
+# Media via de job queue: volgen tot de workers klaar zijn, ook na een rerun
+if st.session_state.get('media_jobs') and not st.session_state.get('genereer_media', False):
+    show_media_jobs(st.session_state['media_jobs'])
+
+
 # Generate audio, video and letter if button was clicked
 if st.session_state.get('genereer_media', False):
     # Get the final text (edited or original)
     final_tekst = st.session_state.get('sinterklaas_tekst_aangepast', st.session_state.get('sinterklaas_tekst', ''))
     
+    generate_letter = st.session_state.get('generate_letter', True)
+    # Generate audio if selected OR if video is selected (video requires audio)
+    generate_audio = st.session_state.get('generate_audio', True)
+    generate_audio_explicit = st.session_state.get('generate_audio_explicit', True)  # Of audio expliciet was geselecteerd
+    generate_video = st.session_state.get('generate_video', False) and USE_VIDEO_GENERATOR
+    # Video vereist audio, dus audio altijd genereren als video wordt gegenereerd
+    if generate_video:
+        generate_audio = True
+    
     if not final_tekst:
         st.error("❌ Geen tekst beschikbaar om audio, video en brief te genereren.")
-    else:
-        # Generate audio if selected OR if video is selected (video requires audio)
-        audio_bytes = None
-        generate_audio = st.session_state.get('generate_audio', True)
-        generate_audio_explicit = st.session_state.get('generate_audio_explicit', True)  # Of audio expliciet was geselecteerd
-        generate_video = st.session_state.get('generate_video', False) and USE_VIDEO_GENERATOR
-        # Video vereist audio, dus audio altijd genereren als video wordt gegenereerd
-        if generate_video:
-            generate_audio = True
-        
+    elif queue_enabled():
+        # Alles via de workers (worker.py): de jobs lopen door, ook na een rerun of een
+        # verbroken browser. Deze sessie volgt enkel hun status.
+        session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+        job_queue = get_job_queue()
+        media_jobs = {}
         if generate_audio:
-            with st.spinner("🎤 Sinterklaas spreekt..."):
-                if not audio_gen:
-                    st.error("❌ AudioGenerator niet geïnitialiseerd. Configureer ElevenLabs of OpenAI API key.")
-                else:
-                    try:
-                        audio_bytes = audio_gen.generate(final_tekst, prefer_elevenlabs=True)
-                    except Exception as e:
-                        error_msg = str(e)
-                        # Show specific error messages
-                        if "authenticatie" in error_msg.lower() or "401" in error_msg:
-                            st.error(f"❌ **ElevenLabs authenticatie fout**\n\nControleer je API key in `.env` of `st.secrets`.\n\n*Fout: {error_msg[:150]}*")
-                        elif "Voice ID" in error_msg or "404" in error_msg:
-                            st.error(f"❌ **ElevenLabs Voice ID fout**\n\nVoice ID niet gevonden. Controleer of de Voice ID correct is.\n\n*Fout: {error_msg[:150]}*")
-                        elif "rate limit" in error_msg.lower() or "429" in error_msg:
-                            st.warning(f"⚠️ **ElevenLabs rate limit bereikt**\n\nProbeer over een paar minuten opnieuw.\n\n*Fout: {error_msg[:150]}*")
-                        elif "quota" in error_msg.lower() or "quota_exceeded" in error_msg.lower():
-                            st.warning(f"⚠️ **ElevenLabs quota overschreden**\n\nJe account heeft niet genoeg credits. Gebruik OpenAI TTS als backup.\n\n*Fout: {error_msg[:150]}*")
-                        else:
-                            st.warning(f"⚠️ **Audio generatie fout**\n\n*Fout: {error_msg[:150]}*")
-        
-        # Handle video generation if selected and enabled
-        # generate_video is al hierboven gedefinieerd
+            media_jobs['audio'] = job_queue.submit("audio", {"text": final_tekst}, owner=session_id)
         if generate_video:
-            if not audio_bytes:
-                st.warning("⚠️ Audio is vereist voor video generatie. Genereer eerst audio.")
+            media_jobs['video'] = job_queue.submit(
+                "video", {"text": final_tekst}, owner=session_id, depends_on=media_jobs['audio']
+            )
+        if generate_letter:
+            media_jobs['pdf'] = job_queue.submit("pdf", {"text": final_tekst}, owner=session_id)
+        st.session_state['media_jobs'] = {
+            'jobs': media_jobs,
+            'text': final_tekst,
+            'letter': generate_letter,
+            'audio_explicit': generate_audio_explicit,
+        }
+        st.session_state['genereer_media'] = False
+        st.rerun()
+    else:
+        st.session_state.pop('pdf_job', None)
+        st.session_state.pop('pdf_artifact', None)
+        naam = st.session_state.get('naam', 'kind')
+        datum = datetime.now().strftime('%Y%m%d')
+        sint_image_path = Path(__file__).parent / "sint.png"
+        
+        def show_audio_error(error):
+            error_msg = str(error)
+            # Show specific error messages
+            if "authenticatie" in error_msg.lower() or "401" in error_msg:
+                st.error(f"❌ **ElevenLabs authenticatie fout**\n\nControleer je API key in `.env` of `st.secrets`.\n\n*Fout: {error_msg[:150]}*")
+            elif "Voice ID" in error_msg or "404" in error_msg:
+                st.error(f"❌ **ElevenLabs Voice ID fout**\n\nVoice ID niet gevonden. Controleer of de Voice ID correct is.\n\n*Fout: {error_msg[:150]}*")
+            elif "rate limit" in error_msg.lower() or "429" in error_msg:
+                st.warning(f"⚠️ **ElevenLabs rate limit bereikt**\n\nOok na wachten bleef ElevenLabs weigeren. Probeer over een paar minuten opnieuw.\n\n*Fout: {error_msg[:150]}*")
+            elif "quota" in error_msg.lower() or "quota_exceeded" in error_msg.lower():
+                st.warning(f"⚠️ **ElevenLabs quota overschreden**\n\nJe account heeft niet genoeg credits. Gebruik OpenAI TTS als backup.\n\n*Fout: {error_msg[:150]}*")
             else:
-                sint_image_path = Path(__file__).parent / "sint.png"
-                if not video_gen:
-                    st.warning("⚠️ VideoGenerator niet geïnitialiseerd. Voeg `HEYGEN_API_KEY` toe aan je `.env` om video te genereren.")
-                    if audio_bytes:
-                        st.markdown("### 🎵 Luister naar Sinterklaas")
-                        audio_bytes.seek(0)
-                        st.audio(audio_bytes, format="audio/mp3", autoplay=False)
-                else:
-                    if sint_image_path.exists():
-                        st.image(str(sint_image_path), use_container_width=True, caption="🎅 Sinterklaas bereidt zich voor...")
-                    with st.spinner("🎬 HeyGen maakt een ultra-realistische video... even geduld (30-90 seconden)"):
-                        try:
-                            # Create a copy of audio_bytes to avoid pointer issues
-                            if hasattr(audio_bytes, 'getvalue'):
-                                audio_bytes.seek(0)
-                                audio_bytes_copy = io.BytesIO(audio_bytes.getvalue())
-                            elif hasattr(audio_bytes, 'read'):
-                                audio_bytes.seek(0)
-                                audio_bytes_copy = io.BytesIO(audio_bytes.read())
-                            else:
-                                audio_bytes_copy = io.BytesIO(audio_bytes)
-                            
-                            video_url = video_gen.generate(audio_bytes_copy)
-                            if video_url:
-                                st.markdown("### 🎥 Sinterklaas in HeyGen Ultra Quality")
-                                st.video(video_url)
-                                
-                                # Toon ook audio player if audio was explicitly selected
-                                if generate_audio_explicit and audio_bytes:
-                                    st.markdown("### 🎵 Luister naar Sinterklaas")
-                                    audio_bytes.seek(0)
-                                    st.audio(audio_bytes, format="audio/mp3", autoplay=False)
-                                    # Download button voor audio
-                                    audio_bytes.seek(0)
-                                    st.download_button(
-                                        label="📥 Download Audio",
-                                        data=audio_bytes.getvalue() if hasattr(audio_bytes, 'getvalue') else audio_bytes.read(),
-                                        file_name=f"sinterklaas_audio_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.mp3",
-                                        mime="audio/mpeg",
-                                        use_container_width=True
-                                    )
-                            else:
-                                st.warning("⚠️ Video generatie mislukt.")
-                                if generate_audio_explicit and audio_bytes:
-                                    st.markdown("### 🎵 Luister naar Sinterklaas")
-                                    audio_bytes.seek(0)
-                                    st.audio(audio_bytes, format="audio/mp3", autoplay=False)
-                                    # Download button voor audio
-                                    audio_bytes.seek(0)
-                                    st.download_button(
-                                        label="📥 Download Audio",
-                                        data=audio_bytes.getvalue() if hasattr(audio_bytes, 'getvalue') else audio_bytes.read(),
-                                        file_name=f"sinterklaas_audio_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.mp3",
-                                        mime="audio/mpeg",
-                                        use_container_width=True
-                                    )
-                        except Exception as video_error:
-                            st.error(f"❌ HeyGen video generatie mislukt: {str(video_error)}")
-                            if generate_audio_explicit and audio_bytes:
-                                st.info("Toon alleen audio als fallback.")
-                                st.markdown("### 🎵 Luister naar Sinterklaas")
-                                audio_bytes.seek(0)
-                                st.audio(audio_bytes, format="audio/mp3", autoplay=False)
-                                # Download button voor audio
-                                audio_bytes.seek(0)
-                                st.download_button(
-                                    label="📥 Download Audio",
-                                    data=audio_bytes.getvalue() if hasattr(audio_bytes, 'getvalue') else audio_bytes.read(),
-                                    file_name=f"sinterklaas_audio_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.mp3",
-                                    mime="audio/mpeg",
-                                    use_container_width=True
-                                )
+                st.warning(f"⚠️ **Audio generatie fout**\n\n*Fout: {error_msg[:150]}*")
         
-        # Show audio player if audio was explicitly selected and video was not
-        if generate_audio_explicit and audio_bytes and not generate_video:
-            sint_image_path = Path(__file__).parent / "sint.png"
-            if sint_image_path.exists():
-                st.image(str(sint_image_path), use_container_width=True)
-            st.markdown("### 🎵 Luister naar Sinterklaas")
-            audio_bytes.seek(0)
-            st.audio(audio_bytes, format="audio/mp3", autoplay=False)
-            # Download button voor audio
-            audio_bytes.seek(0)
-            st.download_button(
-                label="📥 Download Audio",
-                data=audio_bytes.getvalue() if hasattr(audio_bytes, 'getvalue') else audio_bytes.read(),
-                file_name=f"sinterklaas_audio_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.mp3",
-                mime="audio/mpeg",
-                use_container_width=True
-            )
+        # Vaste plaatsen op de pagina (in de gewone volgorde), gevuld zodra een stap klaar is
+        video_area = st.container()
+        audio_area = st.container()
+        letter_area = st.container()
+        
+        # Brief/PDF hangen enkel af van de tekst, video van de audio: de takken lopen
+        # parallel en de totale wachttijd is die van de langste tak.
+        media = Pipeline()
+        artifacts = get_artifact_store()
+        # Meldingen van workers (voortgang, wachtrij) worden in de script thread getoond
+        ui_updates = queue.Queue()
         
-        # Render the parchment-style letter if selected
-        generate_letter = st.session_state.get('generate_letter', True)
         if generate_letter:
             if not letter_gen:
-                st.warning("⚠️ LetterGenerator niet geïnitialiseerd.")
+                letter_area.warning("⚠️ LetterGenerator niet geïnitialiseerd.")
+            else:
+                def make_letter():
+                    # PDF krijgt de achtergrond in printresolutie, de preview de webvariant
+                    pdf_job = None
+                    if pdf_browser.available:
+                        pdf_job = submit_pdf(letter_gen.generate_html(final_tekst, for_print=True))
+                    return pdf_job, letter_gen.generate_html(final_tekst), letter_gen.fits_on_page(final_tekst)
+                media.add("brief", make_letter)
+        
+        if generate_audio:
+            if not audio_gen:
+                audio_area.error("❌ AudioGenerator niet geïnitialiseerd. Configureer ElevenLabs of OpenAI API key.")
             else:
-                letter_html = letter_gen.generate_html(final_tekst)
-                st.markdown("### ✉️ Officiële Sinterklaasbrief")
-                st.markdown(letter_html, unsafe_allow_html=True)
-                
-                # PDF Download button
+                # Meteen naar de artifact store: de sessie houdt enkel het ID bij
+                media.add("audio", lambda: artifacts.put(audio_gen.generate(final_tekst, prefer_elevenlabs=True), "mp3"))
+        
+        video_node = generate_video and audio_gen is not None and video_gen is not None
+        if generate_video and not audio_gen:
+            video_area.warning("⚠️ Audio is vereist voor video generatie. Genereer eerst audio.")
+        elif generate_video and not video_gen:
+            video_area.warning("⚠️ VideoGenerator niet geïnitialiseerd. Voeg `HEYGEN_API_KEY` toe aan je `.env` om video te genereren.")
+        elif video_node:
+            with video_area:
+                if sint_image_path.exists():
+                    st.image(str(image_for(sint_image_path, "column")), use_container_width=True, caption="🎅 Sinterklaas bereidt zich voor...")
+                queue_placeholder = st.empty()
+            video_progress = StreamlitVideoProgress()
+            # Max. HEYGEN_MAX_CONCURRENT renders tegelijk; eerlijk verdeeld over sessies
+            session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+            video_archive = get_video_archive()
+            
+            def show_queue(position, eta):
+                ui_updates.put(lambda: queue_placeholder.info(f"🕒 In de wachtrij: positie {position}, nog ±{int(eta)} seconden"))
+            
+            def make_video(audio_id):
+                audio_path = artifacts.get(audio_id)
+                if audio_path is None:
+                    raise FileNotFoundError("Audio niet meer beschikbaar in de artifact store")
+                # Zelfde tekst + avatar + audio al eens gemaakt: uit het archief, zonder nieuwe render.
+                # Loopt de render nog (rerun, refresh, andere sessie), dan haakt generate() erop aan.
+                # Het artifact ID is de sha256 van de audio, dus gelijk aan audio_digest().
+                video_key = request_key(final_tekst, video_gen.avatar_id, audio_id.split(".")[0],
+                                        type(video_gen).__name__)
+                video_path = video_archive.lookup(video_key)
+                if video_path is not None:
+                    return video_path, None, True
+                with get_scheduler().slot(session_id, on_wait=show_queue):
+                    ui_updates.put(queue_placeholder.empty)
+                    # Enkel tijdens de upload in het geheugen; de generator leest via een memoryview
+                    video_url = video_gen.generate(
+                        audio_path.read_bytes(),
+                        on_event=lambda event: ui_updates.put(partial(video_progress, event)),
+                        request_key=video_key
+                    )
                 try:
-                    from playwright.sync_api import sync_playwright
-                    from datetime import datetime
-                    import io
-                    import tempfile
-                    import os
-                    
-                    # Create a temporary HTML file
-                    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp_html:
-                        tmp_html.write(letter_html)
-                        tmp_html_path = tmp_html.name
-                    
+                    return video_archive.store(video_key, video_url), video_url, False
+                except Exception as e:
+                    message = f"⚠️ Video kon niet lokaal bewaard worden, de HeyGen link verloopt later: {e}"
+                    ui_updates.put(lambda: st.warning(message))
+                    return None, video_url, False
+            
+            media.add("video", make_video, deps=["audio"])
+        
+        # Placeholder van de PDF knop zolang de PDF job loopt
+        pdf_areas = []
+        
+        def refresh_pdf_download(wait=False):
+            pdf_job = st.session_state.get('pdf_job')
+            if not pdf_areas or (pdf_job is not None and not pdf_job.done() and not wait):
+                return
+            if pdf_job is not None:
+                futures.wait([pdf_job])
+            with pdf_areas.pop().container():
+                pdf_download()
+        
+        def drain_ui_updates():
+            refresh_pdf_download()
+            with video_area:
+                while True:
                     try:
-                        # Use Playwright to generate PDF in A4 format
-                        with sync_playwright() as p:
-                            browser = p.chromium.launch(headless=True)
-                            # Set viewport to A4 dimensions (210mm x 297mm at 96 DPI ≈ 794x1123px)
-                            page = browser.new_page(viewport={'width': 794, 'height': 1123}, device_scale_factor=1)
-                            page.goto(f"file://{tmp_html_path}")
-                            # Wait for fonts and images to load
-                            page.wait_for_load_state('networkidle')
-                            page.wait_for_timeout(2000)  # Extra time for fonts to load
-                            # Generate PDF in A4 format with proper scaling
-                            pdf_bytes = page.pdf(
-                                format='A4',
-                                print_background=True,
-                                margin={'top': '0', 'right': '0', 'bottom': '0', 'left': '0'},
-                                scale=1.0,
-                                prefer_css_page_size=True  # Use CSS @page size
-                            )
-                            browser.close()
-                        
-                        st.download_button(
-                            label="📥 Download Brief als PDF",
-                            data=pdf_bytes,
-                            file_name=f"sinterklaas_brief_{st.session_state.get('naam', 'kind')}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                            mime="application/pdf",
-                            use_container_width=True
-                        )
-                    finally:
-                        # Clean up temp file
-                        if os.path.exists(tmp_html_path):
-                            os.unlink(tmp_html_path)
-                except ImportError:
-                    st.info("💡 **PDF download beschikbaar** - Installeer `playwright` voor PDF download functionaliteit: `pip install playwright && playwright install chromium`")
-                except Exception as pdf_error:
-                    st.warning(f"⚠️ PDF generatie mislukt: {str(pdf_error)[:200]}")
-                    st.info("💡 Probeer: `pip install playwright && playwright install chromium`")
+                        update = ui_updates.get_nowait()
+                    except queue.Empty:
+                        return
+                    update()
+        
+        outputs = {}
+        
+        def show_result(result):
+            drain_ui_updates()
+            outputs[result.name] = result.value
+            if result.name == "brief":
+                with letter_area:
+                    if not result.ok:
+                        st.warning(f"⚠️ Brief kon niet gemaakt worden: {str(result.error)[:200]}")
+                        return
+                    pdf_job, letter_html, letter_fits = result.value
+                    st.session_state['pdf_job'] = pdf_job
+                    st.markdown("### ✉️ Officiële Sinterklaasbrief")
+                    if not letter_fits:
+                        show_letter_overflow()
+                    st.markdown(letter_html, unsafe_allow_html=True)
+                    # PDF Download button: wordt actief zodra de achtergrondjob klaar is
+                    if pdf_browser.available:
+                        pdf_area = st.empty()
+                        with pdf_area.container():
+                            pdf_download()
+                        if pdf_job is not None and not pdf_job.done():
+                            pdf_areas.append(pdf_area)
+                    else:
+                        st.info(f"💡 PDF download niet beschikbaar: {pdf_browser.detail}")
+            elif result.name == "audio":
+                with audio_area:
+                    if not result.ok:
+                        show_audio_error(result.error)
+                    elif not video_node and (generate_audio_explicit or generate_video):
+                        # Geen video: audio apart tonen
+                        if generate_audio_explicit and not generate_video and sint_image_path.exists():
+                            st.image(str(image_for(sint_image_path, "column")), use_container_width=True)
+                        show_audio_player(artifacts.get(result.value), result.value)
+            elif result.name == "video":
+                audio_id = outputs.get("audio")
+                with video_area:
+                    queue_placeholder.empty()
+                    if isinstance(result.error, SkippedError):
+                        st.warning("⚠️ Audio is vereist voor video generatie. Genereer eerst audio.")
+                        return
+                    if isinstance(result.error, VideoGenerationError):
+                        video_progress.show_error(result.error)
+                        st.warning("⚠️ Video generatie mislukt.")
+                    elif result.error is not None:
+                        st.error(f"❌ HeyGen video generatie mislukt: {str(result.error)}")
+                        if generate_audio_explicit and audio_id:
+                            st.info("Toon alleen audio als fallback.")
+                    else:
+                        video_path, video_url, from_archive = result.value
+                        if from_archive:
+                            st.info("♻️ Deze video werd al eerder gemaakt en komt uit het archief.")
+                        show_video(video_path, video_url, naam, datum)
+                    # Toon ook audio player if audio was explicitly selected
+                    if generate_audio_explicit and audio_id:
+                        show_audio_player(artifacts.get(audio_id), audio_id)
+        
+        spinner_text = "🎬 Sinterklaas is bezig... (video duurt 30-90 seconden)" if video_node else "🎤 Sinterklaas spreekt..."
+        with st.spinner(spinner_text):
+            # Eén trace per aanvraag: de stappen (en de PDF render) hangen eronder
+            with span("media.request", labels={"mode": "direct"},
+                      audio=generate_audio, video=video_node, letter=generate_letter):
+                media.run(on_result=show_result, on_tick=drain_ui_updates)
+            # Enkel een brief (of een PDF trager dan de video): nog even op de PDF wachten
+            refresh_pdf_download(wait=True)
+        drain_ui_updates()
         
         # Reset flag
         st.session_state['genereer_media'] = False
@@ -669,5 +969,8 @@ if st.session_state.get('genereer_media', False):
             st.session_state.pop('sinterklaas_tekst', None)
             st.session_state.pop('sinterklaas_tekst_aangepast', None)
             st.session_state.pop('genereer_media', None)
+            st.session_state.pop('pdf_job', None)
+            st.session_state.pop('pdf_artifact', None)
+            st.session_state.pop('media_jobs', None)
             st.rerun()
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Content-addressed opslag op schijf voor gegenereerde media (audio, PDF).
+
+Een sessie bewaart enkel het artifact ID (sha256 van de inhoud + extensie), niet de
+bytes: weergave en downloads lezen het bestand, of halen het via de media server
+(zie video_archive.py, met SINTERKLAAS_VIDEO_BASE_URL). Dezelfde inhoud staat maar
+één keer op schijf, hoeveel sessies er ook naar verwijzen.
+
+Retentie op basis van de laatste toegang (mtime): een artifact dat langer dan de TTL
+(SINTERKLAAS_ARTIFACT_TTL_HOURS, standaard 24) niet gebruikt werd, wordt opgeruimd.
+    python artifact_store.py list
+    python artifact_store.py gc
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import quote
+
+from storage import data_path
+
+ARTIFACT_PATH_PREFIX = "/artifacts/"
+
+_ID_RE = re.compile(r"[0-9a-f]{64}\.[a-z0-9]{1,8}")
+
+
+class ArtifactStore:
+    """Bestanden op schijf onder de hash van hun inhoud, met TTL op de laatste toegang."""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        ttl_seconds: Optional[float] = None,
+        gc_interval: float = 600.0
+    ):
+        """
+        Initialiseer de ArtifactStore.
+
+        Args:
+            directory: Map voor de artifacts (standaard `<data dir>/artifact-store`)
+            ttl_seconds: Hoe lang een ongebruikt artifact bewaard wordt
+                (standaard SINTERKLAAS_ARTIFACT_TTL_HOURS, of 24 uur)
+            gc_interval: Hoe vaak `put` hooguit opruimt (seconden)
+        """
+        self.directory = Path(directory) if directory else data_path("artifact-store")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("SINTERKLAAS_ARTIFACT_TTL_HOURS", "24")) * 3600
+        self.ttl_seconds = ttl_seconds
+        self.gc_interval = gc_interval
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_id(artifact_id: str) -> bool:
+        return bool(artifact_id) and _ID_RE.fullmatch(artifact_id) is not None
+
+    def path_for(self, artifact_id: str) -> Path:
+        """
+        Pad van een artifact (twee tekens als submap, zoals het video archief).
+
+        Raises:
+            ValueError: Voor een ongeldig artifact ID
+        """
+        if not self.is_valid_id(artifact_id):
+            raise ValueError(f"Ongeldig artifact ID: {artifact_id!r}")
+        return self.directory / artifact_id[:2] / artifact_id
+
+    # --- Bewaren en ophalen -------------------------------------------------
+
+    def put(self, data: Union[bytes, bytearray, memoryview, io.BytesIO], suffix: str) -> str:
+        """
+        Bewaar inhoud en geef het artifact ID.
+
+        Args:
+            data: De inhoud; een BytesIO wordt via zijn buffer gelezen (zonder kopie)
+            suffix: Extensie, bv. "mp3" of ".pdf"
+
+        Returns:
+            Artifact ID (`<sha256>.<extensie>`)
+        """
+        buffer = data.getbuffer() if isinstance(data, io.BytesIO) else memoryview(data)
+        try:
+            artifact_id = f"{hashlib.sha256(buffer).hexdigest()}.{suffix.lstrip('.').lower()}"
+            path = self.path_for(artifact_id)
+            if path.exists():
+                # Zelfde inhoud al aanwezig (andere sessie, rerun): enkel de toegang bijwerken
+                _touch(path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as tmp:
+                        tmp.write(buffer)
+                    os.replace(tmp_name, path)
+                except BaseException:
+                    try:
+                        os.unlink(tmp_name)
+                    except FileNotFoundError:
+                        pass
+                    raise
+        finally:
+            # Geef de buffer vrij zodat de BytesIO weer aangepast mag worden
+            buffer.release()
+        self._maybe_collect_garbage()
+        return artifact_id
+
+    def get(self, artifact_id: Optional[str]) -> Optional[Path]:
+        """Pad van een artifact (en de toegangstijd bijwerken), of None als het er niet (meer) is."""
+        if not artifact_id or not self.is_valid_id(artifact_id):
+            return None
+        path = self.path_for(artifact_id)
+        if not _touch(path):
+            return None
+        return path
+
+    # --- Retentie -----------------------------------------------------------
+
+    def _maybe_collect_garbage(self) -> None:
+        with self._gc_lock:
+            if self._last_gc and time.monotonic() - self._last_gc < self.gc_interval:
+                return
+            self._last_gc = time.monotonic()
+        try:
+            self.collect_garbage()
+        except OSError as e:
+            print(f"⚠️ Artifacts opruimen mislukt: {e}")
+
+    def collect_garbage(self) -> int:
+        """
+        Verwijder artifacts die langer dan de TTL niet gebruikt zijn, en halve schrijfacties.
+
+        Returns:
+            Aantal verwijderde bestanden
+        """
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        part_cutoff = now - 3600
+        removed = 0
+        for path in self.directory.glob("*/*"):
+            try:
+                mtime = path.stat().st_mtime
+                if mtime < cutoff or (path.suffix == ".part" and mtime < part_cutoff):
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def entries(self) -> list[dict]:
+        """Alle artifacts, meest recent gebruikt eerst."""
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if not self.is_valid_id(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append({"id": path.name, "size": stat.st_size, "last_access": stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry["last_access"], reverse=True)
+
+
+def _touch(path: Path) -> bool:
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Gedeelde ArtifactStore voor het proces."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+def artifact_url_for(artifact_id: str, download: Optional[str] = None, base_url: Optional[str] = None) -> Optional[str]:
+    """
+    Publieke URL van een artifact via de media server (zie video_archive.py).
+
+    Geeft None als SINTERKLAAS_VIDEO_BASE_URL niet gezet is; lees het bestand dan zelf.
+
+    Args:
+        artifact_id: Het artifact
+        download: Bestandsnaam voor een download link (Content-Disposition: attachment)
+        base_url: Publieke URL van de media server (standaard SINTERKLAAS_VIDEO_BASE_URL)
+    """
+    base_url = base_url or os.getenv("SINTERKLAAS_VIDEO_BASE_URL")
+    if not base_url:
+        return None
+    query = f"?download={quote(download)}" if download else ""
+    return f"{base_url.rstrip('/')}{ARTIFACT_PATH_PREFIX}{artifact_id}{query}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Opslag van gegenereerde audio en PDF's")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Toon de artifacts")
+    sub.add_parser("gc", help="Ruim artifacts op die langer dan de TTL niet gebruikt zijn")
+
+    args = parser.parse_args(argv)
+    store = get_artifact_store()
+    if args.command == "list":
+        entries = store.entries()
+        for entry in entries:
+            last_access = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_access"]))
+            print(f"{entry['id'][:12]}…{Path(entry['id']).suffix:<5} {entry['size'] / 1024:8.1f} KB  {last_access}")
+        print(f"\n{len(entries)} artifact(s), {sum(entry['size'] for entry in entries) / 1024 / 1024:.1f} MB")
+        return 0
+
+    removed = store.collect_garbage()
+    print(f"🧹 {removed} bestand(en) verwijderd")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
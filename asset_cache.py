@@ -0,0 +1,100 @@
+"""
+Cache van geüploade HeyGen audio assets, zodat dezelfde MP3 niet opnieuw geüpload wordt.
+
+Tabel `audio_assets` in `.sinterklaas/heygen.db` (SQLite, WAL), per HeyGen account
+(hash van de API key) en sha256 van de audio. Een asset ID wordt hergebruikt tot
+HEYGEN_ASSET_TTL_DAYS (standaard 7) na de upload; verlopen rijen worden bij een
+nieuwe upload opgeruimd.
+
+De video generators vergeten een asset enkel als HeyGen het expliciet weigert
+(`VideoStartError.asset_rejected`); bij elke andere fout blijft het staan en wordt er
+niet opnieuw geüpload of gerenderd.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from heygen_client import account_key
+from storage import connect
+
+
+class AudioAssetCache:
+    """
+    Persistente map van audio-inhoud (sha256) naar HeyGen `audio_asset_id`.
+    
+    Zo wordt dezelfde MP3 (bv. bij een retry of andere avatar) niet opnieuw
+    geüpload zolang het asset nog geldig is.
+    """
+    
+    def __init__(self, db_name: str = "heygen.db", ttl_seconds: Optional[float] = None):
+        """
+        Initialiseer de AudioAssetCache.
+        
+        Args:
+            db_name: SQLite database in de data map
+            ttl_seconds: Hoe lang een asset ID hergebruikt mag worden
+                (standaard HEYGEN_ASSET_TTL_DAYS, of 7 dagen)
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("HEYGEN_ASSET_TTL_DAYS", "7")) * 24 * 3600
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._db_name = db_name
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS audio_assets (
+                account TEXT NOT NULL,
+                audio_hash TEXT NOT NULL,
+                asset_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (account, audio_hash)
+            )
+            """
+        )
+    
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+        return conn
+    
+    def get(self, api_key: str, audio_hash: str) -> Optional[str]:
+        """Geef een nog geldig asset ID voor deze audio, of None."""
+        row = self._conn().execute(
+            "SELECT asset_id FROM audio_assets WHERE account = ? AND audio_hash = ? AND created_at > ?",
+            (account_key(api_key), audio_hash, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return row["asset_id"] if row else None
+    
+    def put(self, api_key: str, audio_hash: str, asset_id: str) -> None:
+        """Onthoud het asset ID van een geüploade audio."""
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO audio_assets (account, audio_hash, asset_id, created_at) VALUES (?, ?, ?, ?)",
+            (account_key(api_key), audio_hash, asset_id, time.time())
+        )
+        # Verlopen items opruimen
+        conn.execute("DELETE FROM audio_assets WHERE created_at <= ?", (time.time() - self.ttl_seconds,))
+    
+    def invalidate(self, api_key: str, audio_hash: str) -> None:
+        """Vergeet een asset ID (bv. als HeyGen het niet meer aanvaardt)."""
+        self._conn().execute(
+            "DELETE FROM audio_assets WHERE account = ? AND audio_hash = ?",
+            (account_key(api_key), audio_hash)
+        )
+
+
+_asset_cache: Optional[AudioAssetCache] = None
+_asset_cache_lock = threading.Lock()
+
+
+def get_asset_cache() -> AudioAssetCache:
+    """Gedeelde AudioAssetCache voor het proces."""
+    global _asset_cache
+    with _asset_cache_lock:
+        if _asset_cache is None:
+            _asset_cache = AudioAssetCache()
+        return _asset_cache
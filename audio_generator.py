@@ -22,6 +22,9 @@ except ImportError:
 
 from pydub import AudioSegment
 
+from rate_limiter import get_rate_limiter
+from tracing import span, traced
+
 
 class AudioGenerator:
     """Klasse voor het genereren van audio met ElevenLabs of OpenAI TTS."""
@@ -67,24 +70,28 @@ class AudioGenerator:
         Raises:
             ValueError: Als geen audio engine beschikbaar is
         """
-        # Try ElevenLabs first if preferred and available
-        if prefer_elevenlabs and self.elevenlabs_client and self.elevenlabs_voice_id:
-            try:
-                return self._generate_elevenlabs(text)
-            except Exception as e:
-                error_msg = str(e)
-                # Fallback to OpenAI if ElevenLabs fails
-                if self.openai_client:
-                    print(f"ElevenLabs fout, gebruik OpenAI TTS: {error_msg}")
-                    return self._generate_openai(text)
-                else:
-                    raise ValueError(f"ElevenLabs fout en geen OpenAI fallback: {error_msg}")
-        
-        # Use OpenAI if available
-        if self.openai_client:
-            return self._generate_openai(text)
-        
-        raise ValueError("Geen audio engine beschikbaar. Configureer ElevenLabs of OpenAI API key.")
+        with span("audio.generate", chars=len(text)) as s:
+            # Try ElevenLabs first if preferred and available
+            if prefer_elevenlabs and self.elevenlabs_client and self.elevenlabs_voice_id:
+                try:
+                    s.label(engine="elevenlabs")
+                    return self._generate_elevenlabs(text)
+                except Exception as e:
+                    error_msg = str(e)
+                    # Fallback to OpenAI if ElevenLabs fails
+                    if self.openai_client:
+                        print(f"ElevenLabs fout, gebruik OpenAI TTS: {error_msg}")
+                        s.label(engine="openai").set(fallback=error_msg[:200])
+                        return self._generate_openai(text)
+                    else:
+                        raise ValueError(f"ElevenLabs fout en geen OpenAI fallback: {error_msg}")
+            
+            # Use OpenAI if available
+            if self.openai_client:
+                s.label(engine="openai")
+                return self._generate_openai(text)
+            
+            raise ValueError("Geen audio engine beschikbaar. Configureer ElevenLabs of OpenAI API key.")
     
     def _generate_elevenlabs(self, text: str) -> io.BytesIO:
         """Genereer audio met ElevenLabs."""
@@ -93,17 +100,24 @@ class AudioGenerator:
         if not self.elevenlabs_voice_id:
             raise ValueError("ElevenLabs Voice ID niet gevonden")
         
-        audio_generator = self.elevenlabs_client.text_to_speech.convert(
-            voice_id=self.elevenlabs_voice_id,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-            text=text
-        )
+        def synthesize() -> io.BytesIO:
+            # De SDK streamt: de call loopt tot de laatste chunk binnen is
+            audio_generator = self.elevenlabs_client.text_to_speech.convert(
+                voice_id=self.elevenlabs_voice_id,
+                model_id="eleven_multilingual_v2",
+                output_format="mp3_44100_128",
+                text=text
+            )
+            audio_bytes = io.BytesIO()
+            for chunk in audio_generator:
+                audio_bytes.write(chunk)
+            audio_bytes.seek(0)
+            return audio_bytes
         
-        audio_bytes = io.BytesIO()
-        for chunk in audio_generator:
-            audio_bytes.write(chunk)
-        audio_bytes.seek(0)
+        # Max. ELEVENLABS_MAX_CONCURRENT calls tegelijk over alle sessies en processen
+        with span("audio.elevenlabs", labels={"provider": "elevenlabs"}) as s:
+            audio_bytes = get_rate_limiter().call("elevenlabs", synthesize)
+            s.set(bytes=audio_bytes.getbuffer().nbytes)
         
         # Voeg 1-2 seconden stilte toe aan het einde
         return self._add_silence_padding(audio_bytes)
@@ -113,12 +127,16 @@ class AudioGenerator:
         if not self.openai_client:
             raise ValueError("OpenAI client niet geïnitialiseerd")
         
-        audio_response = self.openai_client.audio.speech.create(
-            model="tts-1-hd",
-            voice="onyx",
-            speed=0.85,
-            input=text
-        )
+        with span("audio.openai_tts", labels={"provider": "openai-tts"}) as s:
+            audio_response = get_rate_limiter().call(
+                "openai-tts",
+                self.openai_client.audio.speech.create,
+                model="tts-1-hd",
+                voice="onyx",
+                speed=0.85,
+                input=text
+            )
+            s.set(bytes=len(audio_response.content))
         
         audio_bytes = io.BytesIO(audio_response.content)
         audio_bytes.seek(0)
@@ -126,6 +144,7 @@ class AudioGenerator:
         # Voeg 1-2 seconden stilte toe aan het einde
         return self._add_silence_padding(audio_bytes)
     
+    @traced("audio.padding")
     def _add_silence_padding(self, audio_bytes: io.BytesIO, padding_seconds: float = 1.5) -> io.BytesIO:
         """
         Voeg stilte toe aan het einde van een audio bestand.
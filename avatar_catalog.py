@@ -0,0 +1,295 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from heygen_client import account_key, get_client
+from storage import connect
+from video_events import HeyGenAPIError
+
+
+def fetch_avatars(client) -> dict:
+    """
+    Haal de volledige avatarlijst op bij HeyGen (`/v2/avatars`).
+
+    Returns:
+        De `data` van het antwoord, met `avatars` en (indien aanwezig) `talking_photos`
+
+    Raises:
+        HeyGenAPIError: Als HeyGen een fout of onverwacht antwoord geeft
+    """
+    try:
+        response = client.list_avatars()
+    except Exception as e:
+        raise HeyGenAPIError(f"Exception bij ophalen avatars: {e}") from e
+
+    if response.status_code != 200:
+        raise HeyGenAPIError(
+            f"Fout bij ophalen avatars ({response.status_code})",
+            response.status_code,
+            response.text
+        )
+    json_data = response.json()
+    if "data" in json_data and "avatars" in json_data["data"]:
+        return json_data["data"]
+    raise HeyGenAPIError(f"Onverwacht API formaat: {json_data}", response.status_code)
+
+
+def _rows_from_api(data: dict) -> list[tuple]:
+    """Zet het HeyGen antwoord om naar (avatar_id, naam, type, is_public, is_custom, raw) rijen."""
+    rows = []
+    for avatar in data.get("avatars") or []:
+        avatar_id = avatar.get("avatar_id")
+        if not avatar_id:
+            continue
+        is_public = bool(avatar.get("is_public", True))
+        # Custom: niet publiek en geen "_public" in de ID (zoals list_my_avatars.py altijd deed)
+        is_custom = not is_public and "_public" not in avatar_id
+        rows.append((
+            avatar_id,
+            avatar.get("avatar_name") or "",
+            avatar.get("avatar_type") or "avatar",
+            is_public,
+            is_custom,
+            json.dumps(avatar),
+        ))
+    for photo in data.get("talking_photos") or []:
+        photo_id = photo.get("talking_photo_id")
+        if not photo_id:
+            continue
+        is_public = bool(photo.get("is_public", False))
+        rows.append((
+            photo_id,
+            photo.get("talking_photo_name") or "",
+            "photo",
+            is_public,
+            not is_public,
+            json.dumps(photo),
+        ))
+    return rows
+
+
+class AvatarCatalog:
+    """
+    Lokale, geïndexeerde kopie van de HeyGen avatarlijst per account.
+
+    De lijst wordt hooguit om de `ttl_seconds` opnieuw opgehaald; opzoeken (op ID,
+    type, publiek/custom of naam) gebeurt daarna volledig lokaal in SQLite.
+    """
+
+    def __init__(self, db_name: str = "heygen.db", ttl_seconds: Optional[float] = None):
+        """
+        Initialiseer de AvatarCatalog.
+
+        Args:
+            db_name: SQLite database in de data map
+            ttl_seconds: Hoe lang de lijst geldig blijft
+                (standaard HEYGEN_AVATAR_CATALOG_TTL_HOURS, of 24 uur)
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("HEYGEN_AVATAR_CATALOG_TTL_HOURS", "24")) * 3600
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._db_name = db_name
+        self._refreshing: set[str] = set()
+        self._refreshing_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS avatars (
+                account TEXT NOT NULL,
+                avatar_id TEXT NOT NULL,
+                avatar_name TEXT NOT NULL,
+                avatar_type TEXT NOT NULL,
+                is_public INTEGER NOT NULL,
+                is_custom INTEGER NOT NULL,
+                raw TEXT NOT NULL,
+                PRIMARY KEY (account, avatar_id)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS avatars_type ON avatars (account, avatar_type)")
+        conn.execute("CREATE INDEX IF NOT EXISTS avatars_custom ON avatars (account, is_custom, is_public)")
+        conn.execute("CREATE INDEX IF NOT EXISTS avatars_name ON avatars (account, avatar_name COLLATE NOCASE)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS avatar_catalog_meta (
+                account TEXT PRIMARY KEY,
+                refreshed_at REAL NOT NULL,
+                count INTEGER NOT NULL
+            )
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+        return conn
+
+    # --- Verversen ----------------------------------------------------------
+
+    def refreshed_at(self, api_key: str) -> Optional[float]:
+        """Tijdstip van de laatste verversing, of None als de lijst nog nooit opgehaald werd."""
+        row = self._conn().execute(
+            "SELECT refreshed_at FROM avatar_catalog_meta WHERE account = ?", (account_key(api_key),)
+        ).fetchone()
+        return row["refreshed_at"] if row else None
+
+    def is_fresh(self, api_key: str) -> bool:
+        refreshed_at = self.refreshed_at(api_key)
+        return refreshed_at is not None and time.time() - refreshed_at < self.ttl_seconds
+
+    def refresh(self, api_key: str) -> int:
+        """
+        Haal de avatarlijst opnieuw op en vervang de lokale kopie.
+
+        Returns:
+            Aantal avatars in de catalogus
+
+        Raises:
+            HeyGenAPIError: Als het ophalen mislukt (de oude kopie blijft dan staan)
+        """
+        rows = _rows_from_api(fetch_avatars(get_client(api_key)))
+        account = account_key(api_key)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM avatars WHERE account = ?", (account,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO avatars "
+                "(account, avatar_id, avatar_name, avatar_type, is_public, is_custom, raw) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(account, *row) for row in rows]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO avatar_catalog_meta (account, refreshed_at, count) VALUES (?, ?, ?)",
+                (account, time.time(), len(rows))
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def ensure(self, api_key: str, refresh: bool = False) -> None:
+        """Ververs de catalogus als die verlopen is (of als refresh gevraagd wordt)."""
+        if refresh or not self.is_fresh(api_key):
+            self.refresh(api_key)
+
+    def refresh_in_background(self, api_key: str) -> Optional[threading.Thread]:
+        """Ververs een verlopen catalogus op een achtergrondthread (niet blokkerend)."""
+        account = account_key(api_key)
+        if self.is_fresh(api_key):
+            return None
+        with self._refreshing_lock:
+            if account in self._refreshing:
+                return None
+            self._refreshing.add(account)
+
+        def run():
+            try:
+                self.refresh(api_key)
+            except HeyGenAPIError:
+                # Offline of fout: de oude kopie blijft bruikbaar
+                pass
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(account)
+
+        thread = threading.Thread(target=run, name="avatar-catalog-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    # --- Opzoeken -----------------------------------------------------------
+
+    def get(self, api_key: str, avatar_id: str) -> Optional[dict]:
+        """Geef één avatar uit de catalogus, of None als die er niet in staat."""
+        row = self._conn().execute(
+            "SELECT * FROM avatars WHERE account = ? AND avatar_id = ?",
+            (account_key(api_key), avatar_id.strip())
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def search(
+        self,
+        api_key: str,
+        avatar_type: Optional[str] = None,
+        custom: Optional[bool] = None,
+        public: Optional[bool] = None,
+        name: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> list[dict]:
+        """
+        Zoek avatars in de lokale catalogus.
+
+        Args:
+            api_key: HeyGen API key (de catalogus is per account)
+            avatar_type: Enkel dit type (bv. "studio" of "photo")
+            custom: Enkel custom (True) of enkel niet-custom (False) avatars
+            public: Enkel publieke (True) of niet-publieke (False) avatars
+            name: Deel van de naam (hoofdletterongevoelig)
+            limit: Maximum aantal resultaten
+
+        Returns:
+            List van avatar dictionaries, gesorteerd op naam
+        """
+        query = "SELECT * FROM avatars WHERE account = ?"
+        params: list = [account_key(api_key)]
+        if avatar_type:
+            query += " AND avatar_type = ?"
+            params.append(avatar_type)
+        if custom is not None:
+            query += " AND is_custom = ?"
+            params.append(int(custom))
+        if public is not None:
+            query += " AND is_public = ?"
+            params.append(int(public))
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query += " AND avatar_name LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+        query += " ORDER BY avatar_name COLLATE NOCASE"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self._to_dict(row) for row in self._conn().execute(query, params)]
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        avatar = json.loads(row["raw"])
+        avatar.update({
+            "avatar_id": row["avatar_id"],
+            "avatar_name": row["avatar_name"],
+            "avatar_type": row["avatar_type"],
+            "is_public": bool(row["is_public"]),
+            "is_custom": bool(row["is_custom"]),
+        })
+        return avatar
+
+
+def validate_avatar_id(catalog: "AvatarCatalog", api_key: str, avatar_id: str) -> Optional[bool]:
+    """
+    Controleer offline of een avatar ID in het account bestaat.
+
+    Returns:
+        True/False, of None als de catalogus nog nooit opgehaald werd (onbekend)
+    """
+    if catalog.refreshed_at(api_key) is None:
+        return None
+    return catalog.get(api_key, avatar_id) is not None
+
+
+_catalog: Optional[AvatarCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_avatar_catalog() -> AvatarCatalog:
+    """Gedeelde AvatarCatalog voor het proces."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = AvatarCatalog()
+        return _catalog
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+HeyGen avatars opzoeken vanuit een lokale catalogus.
+
+De avatarlijst wordt gecachet (HEYGEN_AVATAR_CATALOG_TTL_HOURS, standaard 24 uur);
+alleen bij een verlopen catalogus of met --refresh wordt HeyGen aangesproken.
+
+Voorbeelden:
+    python avatars.py                      # alle avatars
+    python avatars.py --custom             # enkel je eigen avatars
+    python avatars.py --type studio -n 10  # eerste 10 studio avatars
+    python avatars.py --search sint        # zoeken op naam
+    python avatars.py --check              # bestaat HEYGEN_AVATAR_ID?
+    python avatars.py --refresh            # catalogus opnieuw ophalen
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from avatar_catalog import get_avatar_catalog, validate_avatar_id
+from video_events import HeyGenAPIError
+
+
+def _print_avatar(index: int, avatar: dict, current_avatar_id: str) -> None:
+    avatar_type = avatar["avatar_type"]
+    print(f"\n{index}. {avatar['avatar_name'] or 'N/A'}")
+    print(f"   ID: {avatar['avatar_id']}")
+    print(f"   Type: {avatar_type}")
+    print(f"   Public: {'Ja' if avatar['is_public'] else 'Nee'}")
+    if avatar_type == "studio":
+        print("   ✅ Geanimeerd (Studio Avatar) - werkt met de V2 API")
+    elif avatar_type == "photo":
+        print("   📷 Photo Avatar - gebruik HEYGEN_API_VERSION=v1 en HEYGEN_AVATAR_TYPE=photo")
+    if avatar["avatar_id"] == current_avatar_id:
+        print("   👉 HUIDIGE AVATAR IN .ENV")
+    print("-" * 80)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="HeyGen avatars opzoeken (lokale catalogus)")
+    parser.add_argument("--type", dest="avatar_type", help="Enkel dit type, bv. studio of photo")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--custom", action="store_true", help="Enkel je eigen (custom) avatars")
+    scope.add_argument("--public", action="store_true", help="Enkel publieke avatars")
+    parser.add_argument("--search", help="Zoek op (een deel van) de naam")
+    parser.add_argument("-n", "--limit", type=int, help="Maximum aantal resultaten")
+    parser.add_argument("--refresh", action="store_true", help="Haal de catalogus opnieuw op bij HeyGen")
+    parser.add_argument(
+        "--check",
+        nargs="?",
+        const="",
+        metavar="AVATAR_ID",
+        help="Controleer of een avatar ID (standaard HEYGEN_AVATAR_ID) bestaat"
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("HEYGEN_API_KEY")
+    if not api_key:
+        print("❌ HEYGEN_API_KEY niet gevonden in .env bestand")
+        return 1
+    current_avatar_id = os.getenv("HEYGEN_AVATAR_ID", "")
+
+    catalog = get_avatar_catalog()
+    try:
+        catalog.ensure(api_key, refresh=args.refresh)
+    except HeyGenAPIError as e:
+        if catalog.refreshed_at(api_key) is None:
+            print(f"❌ {e}")
+            return 1
+        print(f"⚠️ Verversen mislukt, oude catalogus wordt gebruikt: {e}")
+
+    refreshed_at = datetime.fromtimestamp(catalog.refreshed_at(api_key)).strftime("%Y-%m-%d %H:%M")
+
+    if args.check is not None:
+        avatar_id = args.check or current_avatar_id
+        if not avatar_id:
+            print("❌ Geen avatar ID opgegeven en HEYGEN_AVATAR_ID is niet gezet")
+            return 1
+        if validate_avatar_id(catalog, api_key, avatar_id):
+            avatar = catalog.get(api_key, avatar_id)
+            print(f"✅ {avatar_id} bestaat: {avatar['avatar_name']} ({avatar['avatar_type']})")
+            return 0
+        print(f"❌ {avatar_id} staat niet in je HeyGen account (catalogus van {refreshed_at})")
+        return 2
+
+    avatars = catalog.search(
+        api_key,
+        avatar_type=args.avatar_type,
+        custom=True if args.custom else None,
+        public=True if args.public else None,
+        name=args.search,
+        limit=args.limit,
+    )
+
+    print(f"\n🎭 HeyGen Avatars (catalogus van {refreshed_at}):\n")
+    print("=" * 80)
+    if not avatars:
+        print("❌ Geen avatars gevonden voor deze filters.\n")
+        return 0
+
+    for i, avatar in enumerate(avatars, 1):
+        _print_avatar(i, avatar, current_avatar_id)
+
+    print(f"\n✅ {len(avatars)} avatar(s) getoond")
+    print("\n💡 Tip: Kopieer de ID van een 'studio' type avatar naar je .env bestand als HEYGEN_AVATAR_ID\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+"""
+HTTP backend voor Sinterklaas (zie s.plan.md): de generatie-pipeline als API voor
+de webshop, los van de Streamlit UI.
+
+Start vanuit de projectmap:
+
+    uvicorn backend.api:app --port 8000
+"""
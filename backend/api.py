@@ -0,0 +1,488 @@
+"""
+Async HTTP API voor tekst, audio, brief PDF en video.
+
+Elke POST zet een job in de job queue (job_queue.py) en geeft meteen een job ID
+terug. Het resultaat volg je met polling (`GET /jobs/{id}`) of als stream van
+Server-Sent Events (`GET /jobs/{id}/events`); bestanden haal je op met
+`GET /jobs/{id}/file`.
+
+De jobs worden uitgevoerd door de gewone worker handlers (worker.py). Standaard
+draaien er SINTERKLAAS_API_WORKERS (8) workers in dit proces, elk op een thread uit
+een pool, zodat de synchrone SDK calls (OpenAI, ElevenLabs, HeyGen, Playwright) de
+event loop nooit blokkeren. Met SINTERKLAAS_API_WORKERS=0 voert de API zelf niets
+uit en doen aparte `python worker.py` processen het werk.
+
+Zet SINTERKLAAS_API_KEY om een `X-API-Key` header te vereisen. `GET /metrics`
+(tijden per stap in Prometheus formaat, zie tracing.py) vraagt geen key.
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.credits import ACTION_CREDITS, LEDGER_TIMEOUT, LedgerBusy, get_ledger
+from backend.payments import LocalPaymentProvider, PaymentError, get_payment_service
+from job_queue import CANCELLED, FAILED, SUCCEEDED, Job, get_job_queue
+from tracing import MetricsAggregator
+from worker import Worker
+
+load_dotenv()
+
+API_WORKERS = int(os.getenv("SINTERKLAAS_API_WORKERS", "8"))
+# Audio en brieven kosten een credit (pay-per-use, zie s.plan.md)
+CREDITS_REQUIRED = os.getenv("SINTERKLAAS_CREDITS_REQUIRED", "").lower() in ("1", "true")
+# De lokale betaalprovider geeft gratis credits weg: samen met credits enkel in development
+DEVELOPMENT = os.getenv("SINTERKLAAS_ENV", "").lower() in ("dev", "development")
+# Hoe vaak mislukte betaalde jobs terugbetaald worden (seconden)
+REFUND_INTERVAL = 5.0
+# Bij de start: mislukte jobs van zo ver terug nog nakijken (zoals JobQueue.purge)
+REFUND_LOOKBACK = 7 * 24 * 3600
+
+# Bestand per soort job (sleutel in het resultaat) en zijn content type
+RESULT_FILES = {
+    "audio": ("audio", "audio/mpeg"),
+    "pdf": ("pdf", "application/pdf"),
+    "video": ("video_path", "video/mp4"),
+}
+
+
+class MessageRequest(BaseModel):
+    naam: str
+    leeftijd: int = Field(5, ge=1, le=18)
+    geslacht: str = "Jongen"
+    anekdote: str = "(Geen specifieke notitie)"
+    verlanglijstje: str = "(Geen verlanglijstje)"
+    zeker_item: str = "(Geen specifiek item)"
+    schoentje_gezet: str = "Nee"
+    slang_toggle: bool = True
+
+
+class TextRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    # Verplicht als SINTERKLAAS_CREDITS_REQUIRED aan staat: wie de credit betaalt
+    user_id: Optional[str] = None
+
+
+class VideoRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    # Bestaande (geslaagde of nog lopende) audio job voor deze tekst; anders wordt audio eerst gemaakt
+    audio_job_id: Optional[str] = None
+    # Verplicht als SINTERKLAAS_CREDITS_REQUIRED aan staat (zie ACTION_CREDITS)
+    user_id: Optional[str] = None
+
+
+class JobCreated(BaseModel):
+    job_id: str
+    status_url: str
+    events_url: str
+    credits_remaining: Optional[int] = None
+
+
+class CreditUseRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+    action: str = Field(..., min_length=1)
+    reference: Optional[str] = None
+
+
+class PaymentRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+
+
+def job_view(job: Job) -> dict:
+    """Publieke weergave van een job (zonder interne velden zoals de worker)."""
+    view = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+    if job.status == SUCCEEDED:
+        result = dict(job.result or {})
+        # Geen lokale paden naar buiten: bestanden gaan via /jobs/{id}/file
+        for key, _ in RESULT_FILES.values():
+            if result.pop(key, None):
+                result["file_url"] = f"/jobs/{job.id}/file"
+        view["result"] = result
+    return view
+
+
+def _run_embedded_workers(stop: asyncio.Event, executor: ThreadPoolExecutor) -> list[asyncio.Task]:
+    loop = asyncio.get_running_loop()
+
+    async def run(worker: Worker):
+        while not stop.is_set():
+            ran = await loop.run_in_executor(executor, worker.run_once)
+            if not ran:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=worker.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    return [
+        asyncio.create_task(run(Worker(name=f"api:{os.getpid()}:{i}", poll_interval=0.5)))
+        for i in range(API_WORKERS)
+    ]
+
+
+def refund_failed_jobs(since: float) -> int:
+    """
+    Geef de credits terug van betaalde jobs die mislukten of geannuleerd werden sinds `since`.
+
+    Vangt elke weg naar FAILED op (fout in de handler, verlopen lease, mislukte
+    afhankelijkheid) en annuleringen via DELETE /jobs/{id}; de ledger betaalt per
+    job hooguit één keer terug.
+
+    Returns:
+        Aantal terugbetaalde jobs
+    """
+    job_queue = get_job_queue()
+    jobs = job_queue.with_status_since(FAILED, since) + job_queue.with_status_since(CANCELLED, since)
+    return sum(1 for job in jobs if _refund_job(job))
+
+
+def _refund_job(job: Job) -> bool:
+    """Geef de credits van een betaalde job terug; False als er niets (meer) terug te geven is."""
+    billing = job.payload.get("billing")
+    if not billing:
+        return False
+    return get_ledger().refund(billing["user_id"], billing["action"], f"job:{job.id}", billing["credits"]) is not None
+
+
+async def _refund_loop(stop: asyncio.Event) -> None:
+    since = time.time() - REFUND_LOOKBACK
+    while not stop.is_set():
+        checked_at = time.time()
+        try:
+            await asyncio.to_thread(refund_failed_jobs, since)
+            # Wat overlap: een job die net tijdens de vorige ronde mislukte, valt er niet tussen
+            since = checked_at - 60
+        except Exception as e:
+            print(f"⚠️ Terugbetalen van mislukte jobs mislukt: {e}", flush=True)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=REFUND_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _check_payment_provider() -> None:
+    """
+    Weiger verplichte credits met de lokale betaalprovider buiten development.
+
+    Raises:
+        RuntimeError: Als de API zo niet mag starten
+    """
+    if not CREDITS_REQUIRED or DEVELOPMENT:
+        return
+    if os.getenv("SINTERKLAAS_PAYMENT_PROVIDER", "").lower() == "local":
+        raise RuntimeError(
+            "SINTERKLAAS_CREDITS_REQUIRED met SINTERKLAAS_PAYMENT_PROVIDER=local geeft credits weg aan "
+            "wie de checkout URL opent; enkel toegelaten met SINTERKLAAS_ENV=development"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _check_payment_provider()
+    stop = asyncio.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, API_WORKERS), thread_name_prefix="api-worker")
+    tasks = _run_embedded_workers(stop, executor) if API_WORKERS > 0 else []
+    # De ledger (DDL + flusher thread) aanmaken buiten de event loop, niet bij de eerste request
+    await asyncio.to_thread(get_ledger)
+    if CREDITS_REQUIRED:
+        tasks.append(asyncio.create_task(_refund_loop(stop)))
+    try:
+        yield
+    finally:
+        stop.set()
+        # Lopende jobs worden niet afgebroken: hun lease verloopt en een andere worker neemt over
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Sinterklaas API", lifespan=lifespan)
+
+
+def require_api_key(x_api_key: Optional[str] = Header(None)) -> None:
+    expected = os.getenv("SINTERKLAAS_API_KEY")
+    if expected and not (x_api_key and secrets.compare_digest(x_api_key, expected)):
+        raise HTTPException(status_code=401, detail="Ongeldige of ontbrekende X-API-Key")
+
+
+async def _submit(kind: str, payload: dict, depends_on: Optional[str] = None) -> JobCreated:
+    # SQLite schrijven op een thread: de event loop blijft vrij
+    job_id = await asyncio.to_thread(get_job_queue().submit, kind, payload, "api", depends_on)
+    return JobCreated(job_id=job_id, status_url=f"/jobs/{job_id}", events_url=f"/jobs/{job_id}/events")
+
+
+async def _get_job(job_id: str) -> Job:
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job niet gevonden")
+    return job
+
+
+@app.post("/messages", status_code=202, response_model=JobCreated, dependencies=[Depends(require_api_key)])
+async def create_message(request: MessageRequest):
+    """Laat Sinterklaas een boodschap schrijven; het resultaat bevat `text`."""
+    return await _submit("message", request.model_dump())
+
+
+def _ledger_use(user_id: str, action: str, reference: Optional[str] = None, credits: int = 1) -> Optional[int]:
+    # Op de event loop nooit tot busy_timeout (30 s) wachten: is de schrijflock bezet
+    # (refund, log flush, een ander API proces), dan liever meteen een 503
+    try:
+        return get_ledger().use(user_id, action, reference, credits=credits, timeout=LEDGER_TIMEOUT)
+    except LedgerBusy as e:
+        raise HTTPException(status_code=503, detail=f"{e}, probeer opnieuw", headers={"Retry-After": "1"})
+
+
+async def _use_credit(user_id: Optional[str], action: str) -> Optional[int]:
+    """Trek de credits voor een actie af als dat vereist is; 402 als er te weinig zijn."""
+    if not CREDITS_REQUIRED:
+        return None
+    if not user_id:
+        raise HTTPException(status_code=422, detail="user_id is verplicht (pay-per-use)")
+    # Rechtstreeks op de event loop: een credit check duurt tientallen microseconden,
+    # een omweg via de thread pool kost meer dan de check zelf (zie bench_credits.py)
+    remaining = _ledger_use(user_id, action, credits=ACTION_CREDITS[action])
+    if remaining is None:
+        raise HTTPException(
+            status_code=402,
+            detail=f"Niet genoeg credits ({action} kost er {ACTION_CREDITS[action]}): start een betaling via POST /payments/create"
+        )
+    return remaining
+
+
+def _with_billing(payload: dict, user_id: Optional[str], action: str, remaining: Optional[int]) -> dict:
+    # Wie wat betaalde: mislukt de job, dan gaat het terug (zie refund_failed_jobs)
+    if remaining is None:
+        return payload
+    return {**payload, "billing": {"user_id": user_id, "action": action, "credits": ACTION_CREDITS[action]}}
+
+
+async def _refund_unsubmitted(user_id: Optional[str], action: str, remaining: Optional[int]) -> None:
+    # Betaald maar de job kwam nooit in de queue
+    if remaining is not None:
+        await asyncio.to_thread(
+            get_ledger().refund, user_id, action, f"submit:{uuid.uuid4().hex}", ACTION_CREDITS[action]
+        )
+
+
+async def _submit_paid(kind: str, text: str, user_id: Optional[str], action: str) -> JobCreated:
+    remaining = await _use_credit(user_id, action)
+    try:
+        created = await _submit(kind, _with_billing({"text": text}, user_id, action, remaining))
+    except Exception:
+        await _refund_unsubmitted(user_id, action, remaining)
+        raise
+    created.credits_remaining = remaining
+    return created
+
+
+@app.post("/audio", status_code=202, response_model=JobCreated, dependencies=[Depends(require_api_key)])
+async def create_audio(request: TextRequest):
+    """Spreek een tekst in; het resultaat is een mp3 via `file_url`."""
+    return await _submit_paid("audio", request.text, request.user_id, "audio")
+
+
+@app.post("/letters", status_code=202, response_model=JobCreated, dependencies=[Depends(require_api_key)])
+async def create_letter(request: TextRequest):
+    """Zet een tekst als brief in een A4 PDF."""
+    return await _submit_paid("pdf", request.text, request.user_id, "letter")
+
+
+@app.post("/videos", status_code=202, response_model=JobCreated, dependencies=[Depends(require_api_key)])
+async def create_video(request: VideoRequest):
+    """
+    Start een HeyGen video; zonder `audio_job_id` wordt de audio eerst gemaakt.
+
+    Kost ACTION_CREDITS["video"] credits, ook als de audio er al was (de render is
+    het dure deel); audio die voor de video gemaakt wordt, kost niets extra. Mislukt
+    de audio of de video, dan gaan de credits terug.
+    """
+    audio_job_id = request.audio_job_id
+    if audio_job_id:
+        audio_job = await _get_job(audio_job_id)
+        if audio_job.kind != "audio":
+            raise HTTPException(status_code=422, detail="audio_job_id is geen audio job")
+    remaining = await _use_credit(request.user_id, "video")
+    try:
+        if not audio_job_id:
+            audio_job_id = (await _submit("audio", {"text": request.text})).job_id
+        payload = _with_billing({"text": request.text}, request.user_id, "video", remaining)
+        created = await _submit("video", payload, depends_on=audio_job_id)
+    except Exception:
+        await _refund_unsubmitted(request.user_id, "video", remaining)
+        raise
+    created.credits_remaining = remaining
+    return created
+
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(require_api_key)])
+async def get_job(job_id: str):
+    """Status (en resultaat) van een job, om te pollen."""
+    return job_view(await _get_job(job_id))
+
+
+@app.delete("/jobs/{job_id}", dependencies=[Depends(require_api_key)])
+async def cancel_job(job_id: str):
+    """Annuleer een job die nog niet klaar is."""
+    job = await _get_job(job_id)
+    cancelled = await asyncio.to_thread(get_job_queue().cancel, job_id)
+    if cancelled:
+        # Meteen terugbetalen; de periodieke ronde vangt het anders op (hooguit één keer per job)
+        await asyncio.to_thread(_refund_job, job)
+    return {"job_id": job_id, "cancelled": cancelled}
+
+
+@app.get("/jobs/{job_id}/events", dependencies=[Depends(require_api_key)])
+async def job_events(job_id: str, interval: float = 0.5):
+    """
+    Server-Sent Events: een `job` event bij elke wijziging van status of voortgang,
+    tot de job klaar is.
+    """
+    job = await _get_job(job_id)
+    interval = min(max(interval, 0.1), 5.0)
+
+    async def stream():
+        nonlocal job
+        last = None
+        while True:
+            view = job_view(job)
+            state = (view["status"], view["progress"], view["attempts"])
+            if state != last:
+                last = state
+                yield f"event: job\ndata: {json.dumps(view)}\n\n"
+            if job.finished:
+                return
+            await asyncio.sleep(interval)
+            job = await _get_job(job_id)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/file", dependencies=[Depends(require_api_key)])
+async def job_file(job_id: str):
+    """Het bestand van een geslaagde audio-, PDF- of video job."""
+    job = await _get_job(job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is niet geslaagd ({job.status})")
+    if job.kind not in RESULT_FILES:
+        raise HTTPException(status_code=404, detail="Deze job heeft geen bestand")
+    key, media_type = RESULT_FILES[job.kind]
+    path = (job.result or {}).get(key)
+    if not path or not Path(path).is_file():
+        raise HTTPException(status_code=410, detail="Bestand niet meer beschikbaar")
+    return FileResponse(path, media_type=media_type, filename=f"sinterklaas_{job.kind}_{job.id[:8]}{Path(path).suffix}")
+
+
+@app.post("/credits/use", dependencies=[Depends(require_api_key)])
+async def use_credit(request: CreditUseRequest):
+    """Trek atomair één credit af; 402 als het saldo op is."""
+    remaining = _ledger_use(request.user_id, request.action, request.reference)
+    if remaining is None:
+        raise HTTPException(status_code=402, detail="Geen credits meer")
+    return {"user_id": request.user_id, "credits": remaining}
+
+
+@app.get("/credits/status", dependencies=[Depends(require_api_key)])
+async def credit_status(user_id: str):
+    """Huidig saldo van een gebruiker."""
+    return {"user_id": user_id, "credits": await asyncio.to_thread(get_ledger().balance, user_id)}
+
+
+@app.post("/payments/create", dependencies=[Depends(require_api_key)])
+async def create_payment(request: PaymentRequest):
+    """Start een betaling (€1 voor 5 credits); de gebruiker betaalt via `checkout_url`."""
+    try:
+        service = get_payment_service()
+    except PaymentError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return await asyncio.to_thread(service.create, request.user_id)
+
+
+@app.post("/payments/webhook")
+async def payment_webhook(request: Request):
+    """Webhook van de betaalprovider (geen API key: de provider signeert zelf)."""
+    body = await request.body()
+    try:
+        return await asyncio.to_thread(get_payment_service().handle_webhook, body, dict(request.headers))
+    except PaymentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _local_provider() -> LocalPaymentProvider:
+    # Enkel als SINTERKLAAS_PAYMENT_PROVIDER=local expliciet ingesteld is (anders faalt get_payment_service)
+    try:
+        provider = get_payment_service().provider
+    except PaymentError:
+        provider = None
+    if not isinstance(provider, LocalPaymentProvider):
+        raise HTTPException(status_code=404, detail="Enkel beschikbaar met de lokale betaalprovider")
+    return provider
+
+
+@app.get("/payments/local/{payment_id}", response_class=HTMLResponse)
+async def local_checkout(payment_id: str):
+    """Checkout pagina van de lokale stand-in."""
+    _local_provider()
+    payment = await asyncio.to_thread(get_ledger().payment, payment_id)
+    if payment is None:
+        raise HTTPException(status_code=404, detail="Betaling niet gevonden")
+    amount = f"€{payment['amount_cents'] / 100:.2f}"
+    return f"""<!doctype html><meta charset="utf-8"><title>Sinterklaas betaling</title>
+<h1>🎅 {amount} voor {payment['credits']} credits</h1><p>Status: {payment['status']}</p>
+<form method="post" action="{payment_id}/pay"><button>Betaal {amount} (lokale test)</button></form>"""
+
+
+@app.post("/payments/local/{payment_id}/pay")
+async def local_pay(payment_id: str):
+    """Simuleer een geslaagde betaling: de stand-in stuurt een gesigneerde webhook."""
+    provider = _local_provider()
+    body, headers = provider.webhook(payment_id, "paid")
+    try:
+        return await asyncio.to_thread(get_payment_service().handle_webhook, body, headers)
+    except PaymentError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+_metrics: Optional[MetricsAggregator] = None
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: duur per stap uit het gedeelde trace bestand (zie tracing.py)."""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsAggregator()
+    # Enkel de nieuwe regels sinds de vorige scrape, maar toch bestands-I/O: op een thread
+    body = await asyncio.to_thread(_metrics.prometheus)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("backend.api:app", host=os.getenv("SINTERKLAAS_API_HOST", "127.0.0.1"),
+                port=int(os.getenv("SINTERKLAAS_API_PORT", "8000")))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark van de credit ledger: hoeveel tijd voegt een credit check toe aan een request?
+
+Honderden gelijktijdige gebruikers (coroutines) doen elk een reeks credit checks
+met wat bedenktijd ertussen, tegen een tijdelijke database, op dezelfde manier als
+de API: `use()` rechtstreeks op de event loop, met dezelfde korte timeout op de
+schrijflock (een bezette lock wordt geteld in plaats van de loop te blokkeren). Per check wordt de latency gemeten;
+daarna volgt een burst zonder bedenktijd voor de maximale doorvoer.
+
+    python -m backend.bench_credits                       # 500 gebruikers x 20 checks
+    python -m backend.bench_credits --users 200 --think 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _simulate(ledger, users: list[str], ops: int, think: float) -> tuple[list[float], int, float]:
+    from backend.credits import LEDGER_TIMEOUT, LedgerBusy
+
+    latencies: list[float] = []
+    refused = 0
+
+    async def user(user_id: str) -> None:
+        nonlocal refused
+        for _ in range(ops):
+            # Gemiddeld `think` seconden tussen twee requests van dezelfde gebruiker
+            await asyncio.sleep(random.uniform(0, 2 * think))
+            while True:
+                started = time.perf_counter()
+                try:
+                    remaining = ledger.use(user_id, "bench", timeout=LEDGER_TIMEOUT)
+                    break
+                except LedgerBusy:
+                    # De API geeft een 503; de client probeert opnieuw
+                    latencies.append(time.perf_counter() - started)
+                    await asyncio.sleep(0.01)
+            latencies.append(time.perf_counter() - started)
+            if remaining is None:
+                refused += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(user_id) for user_id in users))
+    return latencies, refused, time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark van de credit ledger")
+    parser.add_argument("--users", type=int, default=500, help="Aantal gelijktijdige gebruikers")
+    parser.add_argument("--ops", type=int, default=20, help="Credit checks per gebruiker")
+    parser.add_argument("--think", type=float, default=0.1, help="Gemiddelde tijd tussen requests per gebruiker (s)")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="Doel voor de p99 latency")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Tijdelijke data map: de echte credits.db blijft onaangeroerd
+        os.environ["SINTERKLAAS_DATA_DIR"] = directory
+        from backend.credits import CreditLedger
+
+        ledger = CreditLedger()
+        users = [f"bench-{i}" for i in range(args.users)]
+        for user_id in users:
+            # Eén credit te weinig: de laatste check moet geweigerd worden
+            ledger.grant(user_id, args.ops - 1)
+        ledger.flush()
+
+        latencies, refused, wall = asyncio.run(_simulate(ledger, users, args.ops, args.think))
+        balances_ok = all(ledger.balance(user_id) == 0 for user_id in users)
+
+        # Burst: zo snel mogelijk, geen bedenktijd
+        for user_id in users:
+            ledger.grant(user_id, args.ops)
+        burst_started = time.perf_counter()
+        for _ in range(args.ops):
+            for user_id in users:
+                ledger.use(user_id, "bench")
+        burst_rate = args.ops * len(users) / (time.perf_counter() - burst_started)
+
+        flush_started = time.perf_counter()
+        ledger.close()
+        flush_seconds = time.perf_counter() - flush_started
+        logged = sum(
+            sum(1 for log in ledger.usage(user_id, limit=4 * args.ops) if log["action"] == "bench")
+            for user_id in users
+        )
+
+    all_ms = [value * 1000 for value in latencies]
+    p99 = _percentile(all_ms, 0.99)
+    correct = balances_ok and refused == len(users) and logged == 2 * args.ops * len(users) - len(users)
+    print(f"👥 {args.users} gebruikers x {args.ops} checks = {len(all_ms)} credit checks in {wall:.2f}s "
+          f"({len(all_ms) / wall:,.0f}/s)")
+    print(f"⏱️ latency: gem. {statistics.mean(all_ms):.3f} ms, p50 {_percentile(all_ms, 0.5):.3f} ms, "
+          f"p95 {_percentile(all_ms, 0.95):.3f} ms, p99 {p99:.3f} ms, max {max(all_ms):.3f} ms")
+    print(f"🚀 burst zonder bedenktijd: {burst_rate:,.0f} checks/s")
+    print(f"📝 laatste batch usage logs weggeschreven in {flush_seconds * 1000:.1f} ms ({logged} logs)")
+    print(f"{'✅' if correct else '❌'} saldo's kloppen: elke gebruiker eindigt op 0, kreeg precies één "
+          f"weigering en elke check staat in de usage logs")
+    within_budget = p99 < args.budget_ms
+    print(f"{'✅' if within_budget else '❌'} p99 {'<' if within_budget else '>='} {args.budget_ms} ms")
+    return 0 if correct and within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
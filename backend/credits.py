@@ -0,0 +1,383 @@
+"""
+Credit ledger voor het pay-per-use plan (zie s.plan.md).
+
+Tabellen in `.sinterklaas/credits.db` (SQLite, WAL):
+    user_credits  huidig saldo per gebruiker
+    usage_logs    elk verbruik (audit)
+    payments      betalingen en hun status (zie payments.py)
+    refunds       terugbetaalde referenties (bv. een mislukte job), hooguit één keer
+
+Een credit gebruiken is één voorwaardelijke UPDATE (`credits >= ?`) met `RETURNING`:
+twee gelijktijdige aanvragen kunnen nooit dezelfde laatste credit krijgen, ook niet
+over processen heen, en het teruggegeven saldo is dat van deze aftrek. Binnen een proces gaan alle schrijfacties via één verbinding onder
+een lock; zo wacht een thread kort op de lock in plaats van in SQLite's busy
+handler, die bij een conflict milliseconden slaapt.
+
+Usage logs staan niet op het kritieke pad: ze worden gebufferd en in batches
+weggeschreven (standaard om de 50 ms). Het saldo is de bron van waarheid; bij een
+crash kunnen hooguit de logs van de laatste batch ontbreken.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from storage import connect
+
+# Standaardpakket: €1 voor 5 generaties
+CREDITS_PER_PAYMENT = 5
+PRICE_CENTS = 100
+
+# Kost per actie in credits. Een video (HeyGen render) is het duurste product en
+# kost 3 credits, inclusief de audio die ervoor gemaakt wordt.
+ACTION_CREDITS = {"audio": 1, "letter": 1, "video": 3}
+
+
+# Standaard busy timeout van storage.connect (ms), hersteld na een schrijfactie met timeout
+_BUSY_TIMEOUT_MS = 30000
+# Hoe lang een credit check op de event loop (API) hooguit op de schrijflock wacht (seconden)
+LEDGER_TIMEOUT = 0.05
+
+
+class LedgerBusy(Exception):
+    """De ledger kon niet binnen de gevraagde tijd schrijven (lock bezet door een andere thread of proces)."""
+
+
+class CreditLedger:
+    """Saldo, verbruik en betalingen per gebruiker."""
+
+    def __init__(self, db_name: str = "credits.db", flush_interval: float = 0.05, flush_size: int = 500):
+        """
+        Initialiseer de CreditLedger.
+
+        Args:
+            db_name: SQLite database in de data map
+            flush_interval: Hoe vaak gebufferde usage logs weggeschreven worden (seconden)
+            flush_size: Schrijf meteen weg vanaf zoveel gebufferde logs
+        """
+        self._db_name = db_name
+        self._local = threading.local()
+        # Eén schrijfverbinding per proces, beschermd door een lock
+        self._writer = connect(db_name)
+        self._write_lock = threading.Lock()
+        self._pending_logs: list[tuple] = []
+        self._logs_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._flush_wakeup = threading.Event()
+        self._closed = threading.Event()
+
+        with self._write_lock:
+            self._writer.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS user_credits (
+                    user_id TEXT PRIMARY KEY,
+                    credits INTEGER NOT NULL DEFAULT 0 CHECK (credits >= 0),
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS usage_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    delta INTEGER NOT NULL,
+                    reference TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS usage_logs_user ON usage_logs (user_id, created_at);
+                CREATE TABLE IF NOT EXISTS payments (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    amount_cents INTEGER NOT NULL,
+                    credits INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    checkout_url TEXT,
+                    created_at REAL NOT NULL,
+                    paid_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS payments_user ON payments (user_id, created_at);
+                CREATE TABLE IF NOT EXISTS refunds (
+                    reference TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    credits INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                """
+            )
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="credit-log-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        # Lezen gaat via een eigen verbinding per thread (WAL: lezers wachten niet op schrijvers)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+        return conn
+
+    # --- Saldo --------------------------------------------------------------
+
+    def balance(self, user_id: str) -> int:
+        """Huidig aantal credits (0 voor een onbekende gebruiker)."""
+        row = self._conn().execute("SELECT credits FROM user_credits WHERE user_id = ?", (user_id,)).fetchone()
+        return row["credits"] if row else 0
+
+    @contextmanager
+    def _writing(self, timeout: Optional[float] = None):
+        """
+        De schrijfverbinding onder _write_lock, hooguit `timeout` seconden wachten.
+
+        Zonder timeout wacht SQLite tot busy_timeout (30 s) als een ander proces de
+        schrijflock heeft; met timeout volgt dan LedgerBusy.
+
+        Raises:
+            LedgerBusy: Als de lock of de database binnen de timeout niet vrijkomt
+        """
+        if timeout is None:
+            with self._write_lock:
+                yield self._writer
+            return
+        if not self._write_lock.acquire(timeout=timeout):
+            raise LedgerBusy("Credit ledger is bezet")
+        try:
+            self._writer.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+            try:
+                yield self._writer
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                raise LedgerBusy(f"Credit ledger is bezet: {e}") from e
+            finally:
+                self._writer.execute(f"PRAGMA busy_timeout = {_BUSY_TIMEOUT_MS}")
+        finally:
+            self._write_lock.release()
+
+    def _add_credits(self, user_id: str, credits: int, now: float) -> int:
+        # Eén upsert met RETURNING: het saldo dat deze bijschrijving opleverde (onder _write_lock)
+        return self._writer.execute(
+            "INSERT INTO user_credits (user_id, credits, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET credits = credits + excluded.credits, updated_at = excluded.updated_at "
+            "RETURNING credits",
+            (user_id, credits, now)
+        ).fetchall()[0]["credits"]
+
+    def use(
+        self,
+        user_id: str,
+        action: str,
+        reference: Optional[str] = None,
+        credits: int = 1,
+        timeout: Optional[float] = None
+    ) -> Optional[int]:
+        """
+        Trek atomair credits af (alles of niets).
+
+        Args:
+            user_id: De gebruiker
+            action: Waarvoor (bv. "audio" of "letter"), voor de usage log
+            reference: Optionele verwijzing (bv. een job ID)
+            credits: Aantal credits (zie ACTION_CREDITS)
+            timeout: Hoe lang hooguit wachten op de schrijflock (None = busy_timeout)
+
+        Returns:
+            Het resterende saldo, of None als er niet genoeg credits waren
+
+        Raises:
+            LedgerBusy: Als de schrijflock binnen `timeout` niet vrijkwam (er is niets afgetrokken)
+        """
+        now = time.time()
+        with self._writing(timeout) as writer:
+            # Eén statement: het teruggegeven saldo is precies wat deze aftrek achterliet
+            rows = writer.execute(
+                "UPDATE user_credits SET credits = credits - ?, updated_at = ? WHERE user_id = ? AND credits >= ? "
+                "RETURNING credits",
+                (credits, now, user_id, credits)
+            ).fetchall()
+            if not rows:
+                return None
+            remaining = rows[0]["credits"]
+        self._log(user_id, action, -credits, reference, now)
+        return remaining
+
+    def refund(self, user_id: str, action: str, reference: str, credits: int = 1) -> Optional[int]:
+        """
+        Geef credits terug (bv. als de generatie zelf mislukte), hooguit één keer per referentie.
+
+        Args:
+            user_id: De gebruiker
+            action: De actie die terugbetaald wordt, voor de usage log
+            reference: Waarvoor (bv. "job:<id>"); een tweede refund met dezelfde referentie doet niets
+            credits: Aantal credits
+
+        Returns:
+            Nieuw saldo, of None als deze referentie al terugbetaald was
+        """
+        now = time.time()
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._writer.execute(
+                    "INSERT OR IGNORE INTO refunds (reference, user_id, credits, created_at) VALUES (?, ?, ?, ?)",
+                    (reference, user_id, credits, now)
+                )
+                if cursor.rowcount == 0:
+                    self._writer.execute("ROLLBACK")
+                    return None
+                balance = self._add_credits(user_id, credits, now)
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+        self._log(user_id, f"refund:{action}", credits, reference, now)
+        return balance
+
+    def grant(self, user_id: str, credits: int, action: str = "grant", reference: Optional[str] = None) -> int:
+        """Voeg credits toe. Returns: nieuw saldo."""
+        now = time.time()
+        with self._write_lock:
+            balance = self._add_credits(user_id, credits, now)
+        self._log(user_id, action, credits, reference, now)
+        return balance
+
+    # --- Usage logs ---------------------------------------------------------
+
+    def _log(self, user_id: str, action: str, delta: int, reference: Optional[str], created_at: float) -> None:
+        with self._logs_lock:
+            self._pending_logs.append((user_id, action, delta, reference, created_at))
+            full = len(self._pending_logs) >= self._flush_size
+        if full:
+            self._flush_wakeup.set()
+
+    def flush(self) -> int:
+        """Schrijf de gebufferde usage logs weg. Returns: aantal weggeschreven logs."""
+        with self._logs_lock:
+            batch, self._pending_logs = self._pending_logs, []
+        if not batch:
+            return 0
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                self._writer.executemany(
+                    "INSERT INTO usage_logs (user_id, action, delta, reference, created_at) VALUES (?, ?, ?, ?, ?)",
+                    batch
+                )
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                with self._logs_lock:
+                    self._pending_logs[:0] = batch
+                raise
+        return len(batch)
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._flush_wakeup.wait(self._flush_interval)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Volgende ronde opnieuw; de logs blijven in de buffer
+                print(f"⚠️ Usage logs konden niet weggeschreven worden: {e}")
+
+    def usage(self, user_id: str, limit: int = 50) -> list[dict]:
+        """Recentste verbruik van een gebruiker."""
+        self.flush()
+        rows = self._conn().execute(
+            "SELECT action, delta, reference, created_at FROM usage_logs WHERE user_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Stop de flusher en schrijf de resterende logs weg."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flush_wakeup.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+
+    # --- Betalingen ---------------------------------------------------------
+
+    def create_payment(
+        self,
+        payment_id: str,
+        user_id: str,
+        provider: str,
+        amount_cents: int = PRICE_CENTS,
+        credits: int = CREDITS_PER_PAYMENT,
+        checkout_url: Optional[str] = None
+    ) -> None:
+        """Registreer een nieuwe (openstaande) betaling."""
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT INTO payments (id, user_id, provider, amount_cents, credits, status, checkout_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (payment_id, user_id, provider, amount_cents, credits, checkout_url, time.time())
+            )
+
+    def set_checkout_url(self, payment_id: str, checkout_url: str) -> None:
+        with self._write_lock:
+            self._writer.execute("UPDATE payments SET checkout_url = ? WHERE id = ?", (checkout_url, payment_id))
+
+    def confirm_payment(self, payment_id: str) -> Optional[int]:
+        """
+        Markeer een betaling als betaald en schrijf de credits bij, in één transactie.
+
+        Idempotent: een webhook die twee keer binnenkomt geeft maar één keer credits.
+
+        Returns:
+            Het nieuwe saldo, of None als de betaling onbekend of al verwerkt was
+        """
+        now = time.time()
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._writer.execute(
+                    "UPDATE payments SET status = 'paid', paid_at = ? WHERE id = ? AND status = 'pending'",
+                    (now, payment_id)
+                )
+                if cursor.rowcount == 0:
+                    self._writer.execute("COMMIT")
+                    return None
+                payment = self._writer.execute(
+                    "SELECT user_id, credits FROM payments WHERE id = ?", (payment_id,)
+                ).fetchone()
+                balance = self._add_credits(payment["user_id"], payment["credits"], now)
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+        self._log(payment["user_id"], "payment", payment["credits"], payment_id, now)
+        return balance
+
+    def fail_payment(self, payment_id: str) -> bool:
+        """Markeer een openstaande betaling als mislukt."""
+        with self._write_lock:
+            cursor = self._writer.execute(
+                "UPDATE payments SET status = 'failed' WHERE id = ? AND status = 'pending'", (payment_id,)
+            )
+        return cursor.rowcount > 0
+
+    def payment(self, payment_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM payments WHERE id = ?", (payment_id,)).fetchone()
+        return dict(row) if row else None
+
+
+_ledger: Optional[CreditLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> CreditLedger:
+    """Gedeelde CreditLedger voor het proces."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = CreditLedger()
+        return _ledger
@@ -0,0 +1,158 @@
+"""
+Betalingen voor credits (zie s.plan.md), met een verwisselbare provider.
+
+Voorlopig is er enkel een lokale stand-in (`LocalPaymentProvider`): de checkout
+URL wijst naar een pagina van de API zelf, en "betalen" stuurt een gesigneerde
+webhook langs exact dezelfde weg als een echte provider (Stripe, Payconiq) later
+zal doen. Zo is de hele flow lokaal te testen zonder account of netwerk.
+
+Een echte provider implementeert `create_checkout` en `parse_webhook`; de rest
+(betaling registreren, idempotent credits bijschrijven) blijft in PaymentService.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import uuid
+from typing import Optional
+
+from backend.credits import CREDITS_PER_PAYMENT, PRICE_CENTS, CreditLedger, get_ledger
+
+
+class PaymentError(Exception):
+    """Ongeldige webhook of onbekende provider."""
+
+
+class PaymentProvider:
+    """Interface voor een betaalprovider."""
+
+    name = "base"
+
+    def create_checkout(self, payment_id: str, user_id: str, amount_cents: int) -> str:
+        """Maak een checkout aan en geef de URL (of QR-inhoud) voor de gebruiker."""
+        raise NotImplementedError
+
+    def parse_webhook(self, body: bytes, headers: dict) -> tuple[str, str]:
+        """
+        Controleer en lees een webhook.
+
+        Returns:
+            (payment_id, status) met status "paid" of "failed"
+
+        Raises:
+            PaymentError: Als de handtekening of inhoud niet klopt
+        """
+        raise NotImplementedError
+
+
+class LocalPaymentProvider(PaymentProvider):
+    """Lokale stand-in voor de betaalprovider, met HMAC-gesigneerde webhooks."""
+
+    name = "local"
+
+    def __init__(self, secret: Optional[str] = None, base_url: str = ""):
+        """
+        Initialiseer de LocalPaymentProvider.
+
+        Args:
+            secret: Sleutel voor de webhook handtekening (standaard SINTERKLAAS_PAYMENT_SECRET, anders willekeurig)
+            base_url: Prefix voor de checkout URL (bv. de publieke URL van de API)
+        """
+        self.secret = (secret or os.getenv("SINTERKLAAS_PAYMENT_SECRET") or secrets.token_hex(16)).encode()
+        self.base_url = base_url.rstrip("/")
+
+    def create_checkout(self, payment_id: str, user_id: str, amount_cents: int) -> str:
+        return f"{self.base_url}/payments/local/{payment_id}"
+
+    def sign(self, body: bytes) -> str:
+        return hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+
+    def webhook(self, payment_id: str, status: str = "paid") -> tuple[bytes, dict]:
+        """Body en headers zoals de provider ze naar de webhook zou sturen."""
+        body = json.dumps({"payment_id": payment_id, "status": status}).encode()
+        return body, {"x-signature": self.sign(body)}
+
+    def parse_webhook(self, body: bytes, headers: dict) -> tuple[str, str]:
+        signature = {key.lower(): value for key, value in headers.items()}.get("x-signature", "")
+        if not hmac.compare_digest(signature, self.sign(body)):
+            raise PaymentError("Ongeldige webhook handtekening")
+        try:
+            data = json.loads(body)
+            payment_id, status = data["payment_id"], data["status"]
+        except (ValueError, KeyError) as e:
+            raise PaymentError(f"Ongeldige webhook inhoud: {e}") from e
+        if status not in ("paid", "failed"):
+            raise PaymentError(f"Onbekende status: {status}")
+        return payment_id, status
+
+
+class PaymentService:
+    """Betalingen aanmaken en webhooks verwerken."""
+
+    def __init__(self, provider: PaymentProvider, ledger: Optional[CreditLedger] = None):
+        self.provider = provider
+        self.ledger = ledger or get_ledger()
+
+    def create(self, user_id: str, amount_cents: int = PRICE_CENTS, credits: int = CREDITS_PER_PAYMENT) -> dict:
+        """Start een betaling voor een pakket credits."""
+        payment_id = uuid.uuid4().hex
+        self.ledger.create_payment(payment_id, user_id, self.provider.name, amount_cents, credits)
+        checkout_url = self.provider.create_checkout(payment_id, user_id, amount_cents)
+        self.ledger.set_checkout_url(payment_id, checkout_url)
+        return {
+            "payment_id": payment_id,
+            "checkout_url": checkout_url,
+            "amount_cents": amount_cents,
+            "credits": credits,
+        }
+
+    def handle_webhook(self, body: bytes, headers: dict) -> dict:
+        """
+        Verwerk een webhook van de provider (idempotent).
+
+        Raises:
+            PaymentError: Als de webhook ongeldig is
+        """
+        payment_id, status = self.provider.parse_webhook(body, headers)
+        payment = self.ledger.payment(payment_id)
+        if payment is None:
+            raise PaymentError(f"Onbekende betaling: {payment_id}")
+        if status == "paid":
+            balance = self.ledger.confirm_payment(payment_id)
+            return {
+                "payment_id": payment_id,
+                "status": "paid",
+                "credits": balance if balance is not None else self.ledger.balance(payment["user_id"]),
+                "already_processed": balance is None,
+            }
+        self.ledger.fail_payment(payment_id)
+        return {"payment_id": payment_id, "status": "failed"}
+
+
+_service: Optional[PaymentService] = None
+_service_lock = threading.Lock()
+
+
+def get_payment_service() -> PaymentService:
+    """
+    Gedeelde PaymentService volgens SINTERKLAAS_PAYMENT_PROVIDER.
+
+    Er is geen standaard provider: de lokale stand-in schrijft credits bij voor
+    wie de checkout URL opent, dus die moet expliciet aangezet worden.
+
+    Raises:
+        PaymentError: Als er geen provider ingesteld is, of voor een provider die (nog) niet bestaat
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            provider_name = os.getenv("SINTERKLAAS_PAYMENT_PROVIDER", "").lower()
+            if not provider_name:
+                raise PaymentError("Geen betaalprovider ingesteld (SINTERKLAAS_PAYMENT_PROVIDER)")
+            if provider_name != "local":
+                raise PaymentError(f"Betaalprovider '{provider_name}' is nog niet geïmplementeerd")
+            _service = PaymentService(LocalPaymentProvider(base_url=os.getenv("SINTERKLAAS_API_BASE_URL", "")))
+        return _service
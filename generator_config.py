@@ -0,0 +1,103 @@
+"""
+Generators bouwen uit de configuratie (omgevingsvariabelen of Streamlit secrets).
+
+Gedeeld door app.py, de workers (worker.py) en de batch CLI, zodat overal dezelfde
+instellingen gelden. De instanties komen uit generator_registry: één per proces en
+configuratie. De generator modules worden pas geïmporteerd als ze nodig zijn.
+
+Elke functie geeft None terug als de nodige API keys ontbreken; fouten bij het
+bouwen zelf worden doorgegeven.
+"""
+
+import os
+from typing import Callable, Optional
+
+from generator_registry import get_generator
+
+Setting = Callable[[str, str], str]
+
+
+def env_setting(key: str, default: str = "") -> str:
+    """Lees een instelling uit de omgeving (na `load_dotenv()`)."""
+    return os.getenv(key) or default
+
+
+def message_generator(setting: Setting = env_setting):
+    """MessageGenerator met OPENAI_API_KEY, of None."""
+    from message_generator import MessageGenerator
+
+    api_key = setting("OPENAI_API_KEY", "")
+    if not api_key:
+        return None
+    return get_generator("message", MessageGenerator, api_key=api_key)
+
+
+def audio_generator(setting: Setting = env_setting):
+    """AudioGenerator met ElevenLabs en/of OpenAI, of None."""
+    from audio_generator import AudioGenerator
+
+    elevenlabs_key = setting("ELEVENLABS_API_KEY", "")
+    openai_key = setting("OPENAI_API_KEY", "")
+    if not (elevenlabs_key or openai_key):
+        return None
+    return get_generator(
+        "audio",
+        AudioGenerator,
+        elevenlabs_api_key=elevenlabs_key,
+        elevenlabs_voice_id=setting("ELEVENLABS_VOICE_ID", ""),
+        openai_api_key=openai_key,
+    )
+
+
+def video_api_version(setting: Setting = env_setting) -> str:
+    return (setting("HEYGEN_API_VERSION", "v2") or "v2").lower()
+
+
+def video_generator(setting: Setting = env_setting, callback_url: Optional[str] = None):
+    """
+    VideoGenerator (v2) of VideoGeneratorV1 volgens HEYGEN_API_VERSION, of None.
+
+    Args:
+        setting: Functie die instellingen opzoekt
+        callback_url: Webhook URL; standaard HEYGEN_CALLBACK_URL
+    """
+    api_key = setting("HEYGEN_API_KEY", "")
+    avatar_id = setting("HEYGEN_AVATAR_ID", "")
+    if not (api_key and avatar_id):
+        return None
+    if callback_url is None:
+        callback_url = setting("HEYGEN_CALLBACK_URL", "")
+
+    if video_api_version(setting) == "v1":
+        from video_generator_v1 import VideoGeneratorV1
+
+        return get_generator(
+            "video",
+            VideoGeneratorV1,
+            api_key=api_key,
+            avatar_id=avatar_id,
+            avatar_type=(setting("HEYGEN_AVATAR_TYPE", "avatar") or "avatar").lower(),
+            background_color=setting("HEYGEN_BACKGROUND_COLOR", "#FFFFFF"),
+            aspect_ratio=setting("HEYGEN_ASPECT_RATIO", "16:9"),
+            width=int(setting("HEYGEN_WIDTH", "1280")),
+            height=int(setting("HEYGEN_HEIGHT", "720")),
+            test_mode=setting("HEYGEN_TEST_MODE", "false").lower() == "true",
+            callback_url=callback_url or None,
+        )
+
+    from video_generator import VideoGenerator
+
+    return get_generator(
+        "video",
+        VideoGenerator,
+        api_key=api_key,
+        avatar_id=avatar_id,
+        callback_url=callback_url or None,
+    )
+
+
+def letter_generator(background_image_path: str = "sint-briefpapier.png"):
+    """LetterGenerator met het standaard briefpapier."""
+    from letter_generator import LetterGenerator
+
+    return get_generator("letter", LetterGenerator, background_image_path=background_image_path)
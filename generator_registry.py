@@ -0,0 +1,98 @@
+"""
+Eén instantie per generator per proces, gedeeld door alle sessies.
+
+Streamlit voert app.py bij elke interactie opnieuw uit. In plaats van telkens nieuwe
+generators (met nieuwe OpenAI/ElevenLabs/HeyGen clients en connection pools) te
+bouwen, geeft `get_generator` de bestaande instantie terug zolang de configuratie
+dezelfde is. Verandert de configuratie (bv. een andere API key of avatar), dan
+wordt de generator opnieuw gebouwd en vervangt die de oude.
+
+De generators houden na hun constructor geen toestand per aanvraag bij en zijn dus
+veilig te delen tussen threads.
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Optional
+
+
+def config_key(config: dict) -> str:
+    """Stabiele sleutel voor een configuratie (secrets zitten er enkel gehasht in)."""
+    encoded = repr(sorted(config.items())).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class GeneratorRegistry:
+    """Bouwt generators hooguit één keer per naam en configuratie."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # naam -> (config sleutel, instantie)
+        self._instances: dict[str, tuple[str, Any]] = {}
+        # Eén lock per naam: twee sessies bouwen nooit tegelijk dezelfde generator
+        self._build_locks: dict[str, threading.Lock] = {}
+
+    def get(self, name: str, factory: Callable[..., Any], **config) -> Any:
+        """
+        Geef de generator voor `name`, gebouwd met `factory(**config)`.
+
+        Args:
+            name: Naam van de generator (bv. "audio")
+            factory: Klasse of functie die de generator bouwt
+            **config: Keyword arguments voor de factory; bepalen ook de cache sleutel
+
+        Returns:
+            De gedeelde instantie
+
+        Raises:
+            Elke exception van de factory (er wordt dan niets gecachet)
+        """
+        key = config_key({"factory": f"{factory.__module__}.{factory.__qualname__}", **config})
+        with self._lock:
+            cached = self._instances.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+
+        with build_lock:
+            # Intussen door een andere sessie gebouwd?
+            with self._lock:
+                cached = self._instances.get(name)
+                if cached is not None and cached[0] == key:
+                    return cached[1]
+            instance = factory(**config)
+            with self._lock:
+                self._instances[name] = (key, instance)
+            return instance
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Geef de huidige instantie voor `name` zonder iets te bouwen."""
+        with self._lock:
+            cached = self._instances.get(name)
+            return cached[1] if cached else None
+
+    def clear(self, name: Optional[str] = None) -> None:
+        """Vergeet één generator (of alle), zodat die bij de volgende aanvraag opnieuw gebouwd wordt."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+_registry: Optional[GeneratorRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> GeneratorRegistry:
+    """Gedeelde GeneratorRegistry voor het proces."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GeneratorRegistry()
+        return _registry
+
+
+def get_generator(name: str, factory: Callable[..., Any], **config) -> Any:
+    """Kortere vorm van `get_registry().get(name, factory, **config)`."""
+    return get_registry().get(name, factory, **config)
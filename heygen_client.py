@@ -0,0 +1,268 @@
+import email.utils
+import hashlib
+import io
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import get_rate_limiter
+
+API_BASE_URL = "https://api.heygen.com"
+UPLOAD_URL = "https://upload.heygen.com/v1/asset"
+
+
+def account_key(api_key: str) -> str:
+    """Korte, niet-omkeerbare sleutel voor een HeyGen account; bewaar nooit de API key zelf."""
+    return hashlib.sha256(api_key.strip().encode()).hexdigest()[:16]
+
+
+def audio_buffer(audio) -> memoryview:
+    """
+    Geef een memoryview op de audio zonder de data te kopiëren.
+
+    Args:
+        audio: io.BytesIO, bytes/bytearray/memoryview, een ander bestandsobject of str
+
+    Returns:
+        memoryview (byte-formaat); roep release() aan na gebruik
+    """
+    if isinstance(audio, io.BytesIO):
+        return memoryview(audio.getbuffer())
+    if isinstance(audio, str):
+        audio = audio.encode('utf-8')
+    elif hasattr(audio, 'read'):
+        # Onbekend bestandsobject: eenmalig inlezen is onvermijdelijk
+        try:
+            audio.seek(0)
+        except (OSError, AttributeError):
+            pass
+        audio = audio.read()
+    return memoryview(audio or b"").cast('B')
+
+
+def audio_size(audio) -> int:
+    """Grootte van de audio in bytes, zonder de data te kopiëren."""
+    buffer = audio_buffer(audio)
+    try:
+        return buffer.nbytes
+    finally:
+        buffer.release()
+
+
+def audio_digest(audio) -> str:
+    """SHA-256 van de audio-inhoud, berekend op de buffer (zonder kopie)."""
+    buffer = audio_buffer(audio)
+    try:
+        return hashlib.sha256(buffer).hexdigest()
+    finally:
+        buffer.release()
+
+
+class BufferReader:
+    """Leesbaar bestandsobject over een memoryview; read() geeft slices terug in plaats van kopieën."""
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._buffer.nbytes
+
+    def read(self, size: int = -1) -> memoryview:
+        if size is None or size < 0:
+            size = self._buffer.nbytes - self._position
+        chunk = self._buffer[self._position:self._position + size]
+        self._position += chunk.nbytes
+        return chunk
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._buffer.nbytes
+        self._position = max(0, min(offset, self._buffer.nbytes))
+        return self._position
+
+
+class HeyGenClient:
+    """
+    Gedeelde HTTP client voor de HeyGen API.
+
+    Eén requests.Session met connection pooling en keep-alive, plus retries met
+    exponentiële backoff (met jitter) die Retry-After respecteren. Niet-idempotente
+    requests (video starten) worden enkel herhaald als HeyGen ze zeker niet
+    verwerkt heeft (connectie mislukt, 429 of 503).
+
+    Elk request neemt een token van de gedeelde "heygen-api" limiet; een 429
+    pauzeert die limiet voor alle processen.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+
+    def __init__(
+        self,
+        api_key: str,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        pool_size: int = 20
+    ):
+        """
+        Initialiseer de HeyGenClient.
+
+        Args:
+            api_key: HeyGen API key
+            max_retries: Maximum aantal herhalingen per request
+            backoff_base: Basiswachttijd in seconden voor de eerste herhaling
+            backoff_max: Maximale wachttijd tussen twee pogingen
+            pool_size: Aantal connecties per host in de pool
+        """
+        if not api_key:
+            raise ValueError("HeyGen API key is vereist")
+        self.api_key = api_key.strip()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        self.session.headers.update({"X-Api-Key": self.api_key})
+        # Retries doen we zelf (met kennis van idempotentie), niet in urllib3
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # --- HeyGen endpoints --------------------------------------------------
+
+    def list_avatars(self) -> requests.Response:
+        return self.request("GET", f"{API_BASE_URL}/v2/avatars", timeout=30)
+
+    def upload_asset(self, buffer: memoryview, content_type: str) -> requests.Response:
+        # Raw binary data in de body (geen multipart), gestreamd uit de buffer.
+        # Een herhaalde upload maakt hooguit een extra asset aan: veilig om te herhalen.
+        return self.request(
+            "POST",
+            UPLOAD_URL,
+            idempotent=True,
+            headers={"Content-Type": content_type},
+            data=BufferReader(buffer),
+            timeout=120
+        )
+
+    def generate_video(self, path: str, payload: dict, timeout: float = 30) -> requests.Response:
+        return self.request("POST", f"{API_BASE_URL}{path}", idempotent=False, json=payload, timeout=timeout)
+
+    def video_status(self, video_id: str) -> requests.Response:
+        return self.request(
+            "GET",
+            f"{API_BASE_URL}/v1/video_status.get",
+            params={"video_id": video_id},
+            timeout=30
+        )
+
+    # --- Retry logica -------------------------------------------------------
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """
+        Voer een request uit met retries.
+
+        Args:
+            method: HTTP methode
+            url: Volledige URL
+            idempotent: Of het request veilig herhaald mag worden (standaard: enkel GET/HEAD)
+            **kwargs: Doorgegeven aan requests.Session.request
+
+        Returns:
+            Het laatste requests.Response object
+
+        Raises:
+            requests.RequestException: Als de laatste poging een netwerkfout gaf
+        """
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD")
+        retry_statuses = self.RETRY_STATUSES if idempotent else self.NON_IDEMPOTENT_RETRY_STATUSES
+        body = kwargs.get("data")
+        limiter = get_rate_limiter()
+
+        attempt = 0
+        while True:
+            if hasattr(body, "seek"):
+                body.seek(0)
+            limiter.acquire("heygen-api")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Zonder connectie is het request zeker niet verwerkt; na een
+                # read timeout weten we dat niet, dus enkel herhalen als idempotent.
+                retriable = idempotent or isinstance(e, requests.ConnectTimeout) or _is_connect_error(e)
+                if not retriable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                response.close()
+                if response.status_code == 429:
+                    # Pauze voor alle processen; de volgende acquire wacht ze uit
+                    limiter.penalize("heygen-api", delay)
+                    delay = 0.0
+
+            attempt += 1
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponentiële backoff met 'full jitter'."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Lees de Retry-After header (seconden of HTTP datum)."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                moment = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            seconds = (moment - datetime.now(timezone.utc)).total_seconds()
+        # Nooit langer wachten dan 60 seconden op één herhaling
+        return max(0.0, min(seconds, 60.0))
+
+
+def _is_connect_error(error: requests.RequestException) -> bool:
+    """Of de fout optrad bij het opzetten van de connectie (request nog niet verstuurd)."""
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return type(reason).__name__ in ("NewConnectionError", "NameResolutionError", "ConnectTimeoutError")
+
+
+_clients: dict[str, HeyGenClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str) -> HeyGenClient:
+    """Gedeelde HeyGenClient per API key (één connection pool per proces)."""
+    api_key = (api_key or "").strip()
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = HeyGenClient(api_key)
+            _clients[api_key] = client
+        return client
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Maak verkleinde WebP/JPEG varianten van de afbeeldingen van de app (met cache op schijf).
+
+Afbeeldingen met transparantie houden hun alfakanaal: WebP als RGBA, en PNG in
+plaats van JPEG (dat geen alfakanaal kent).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from storage import data_path
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow ontbreekt: val terug op de originele bestanden
+    Image = None
+
+BASE_DIR = Path(__file__).parent
+
+# Beschikbare breedtes (in pixels); een weergave krijgt de kleinste breedte die
+# minstens zo breed is als nodig.
+WIDTH_LADDER = (320, 480, 720, 960, 1280, 1696)
+
+# Weergaveprofielen: gewenste breedte in pixels (None = volledige resolutie) en formaat.
+PROFILES = {
+    "thumbnail": (320, "webp"),
+    "column": (720, "webp"),         # st.image in de gecentreerde layout
+    "letter_preview": (960, "jpeg"),  # briefachtergrond in de browser
+    "print": (None, "jpeg"),          # briefachtergrond voor de PDF
+}
+
+# Afbeeldingen die bij het bouwen voorgegenereerd worden (`python image_variants.py`).
+ASSETS = {
+    "sint.png": ("thumbnail", "column"),
+    "sint-briefpapier.png": ("letter_preview", "print"),
+}
+
+_QUALITY = {"webp": 80, "jpeg": 85}
+_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg", "png": ".png"}
+
+_digests: dict[tuple[str, int, int], str] = {}
+_lock = threading.Lock()
+
+
+def _resolve(source) -> Path:
+    path = Path(source)
+    return path if path.is_absolute() else BASE_DIR / path
+
+
+def _source_digest(path: Path) -> str:
+    """Hash van de broninhoud, één keer berekend per (pad, grootte, mtime)."""
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:12]
+        _digests[key] = digest
+    return digest
+
+
+def _has_alpha(img) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+
+
+def pick_width(display_width: Optional[int], source_width: int) -> int:
+    """Kleinste breedte uit de ladder die volstaat, nooit breder dan de bron."""
+    if display_width is None:
+        return source_width
+    for width in WIDTH_LADDER:
+        if width >= display_width:
+            return min(width, source_width)
+    return source_width
+
+
+def image_variant(source, display_width: Optional[int] = None, fmt: str = "webp") -> Path:
+    """
+    Geef het pad naar een variant van een afbeelding voor een bepaalde weergavebreedte.
+
+    De variant wordt bij het eerste gebruik aangemaakt en op schijf bewaard.
+    Zonder Pillow (of bij een fout) wordt het originele bestand teruggegeven.
+
+    Args:
+        source: Pad naar de bronafbeelding (relatief t.o.v. de app map)
+        display_width: Benodigde breedte in pixels (None = volledige resolutie)
+        fmt: "webp" of "jpeg" (PNG voor een JPEG variant van een transparante bron)
+
+    Returns:
+        Pad naar de variant (of de bron)
+    """
+    path = _resolve(source)
+    if Image is None or not path.exists():
+        return path
+
+    try:
+        digest = _source_digest(path)
+        with Image.open(path) as img:
+            alpha = _has_alpha(img)
+            if alpha and fmt == "jpeg":
+                fmt = "png"
+            width = pick_width(display_width, img.width)
+            target = data_path("assets") / f"{path.stem}-{digest}-{width}w{_EXTENSIONS[fmt]}"
+            if target.exists():
+                return target
+
+            with _lock:
+                if target.exists():
+                    return target
+                variant = img.convert("RGBA" if alpha else "RGB")
+                if width < img.width:
+                    height = round(img.height * width / img.width)
+                    variant = variant.resize((width, height), Image.LANCZOS)
+
+                # Atomair wegschrijven zodat andere processen nooit een half bestand lezen
+                fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=target.suffix)
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        options = {"quality": _QUALITY[fmt]} if fmt in _QUALITY else {}
+                        variant.save(out, format=fmt.upper(), optimize=True, **options)
+                    os.replace(tmp_name, target)
+                finally:
+                    # Na een mislukte save geen half tijdelijk bestand achterlaten
+                    if os.path.exists(tmp_name):
+                        os.unlink(tmp_name)
+                return target
+    except Exception as e:
+        print(f"Waarschuwing: Kon geen variant maken van {path.name}: {e}")
+        return path
+
+
+def image_for(source, profile: str) -> Path:
+    """Geef de variant van een afbeelding voor een weergaveprofiel (zie PROFILES)."""
+    width, fmt = PROFILES[profile]
+    return image_variant(source, width, fmt)
+
+
+def build_all() -> None:
+    """Genereer alle varianten uit ASSETS vooraf (bouwstap)."""
+    for source, profiles in ASSETS.items():
+        if not _resolve(source).exists():
+            print(f"⏭️  {source} niet gevonden, overgeslagen")
+            continue
+        for profile in profiles:
+            variant = image_for(source, profile)
+            print(f"✅ {source} [{profile}] -> {variant} ({variant.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    build_all()
@@ -0,0 +1,425 @@
+"""
+Duurzame job queue voor al het generatiewerk (tekst, audio, video, PDF).
+
+De UI (of een andere client) zet jobs in de queue en volgt hun status; aparte
+worker processen (worker.py) voeren ze uit. Een job overleeft zo een rerun, een
+verbroken browser en een herstart van de app.
+
+Lokaal staat de queue in SQLite (`.sinterklaas/jobs.db`, WAL): meerdere processen
+kunnen tegelijk jobs nemen zonder dubbel werk. Een worker houdt een lease op zijn
+job en verlengt die; crasht de worker, dan verloopt de lease en neemt een andere
+worker de job over. Mislukte jobs worden met backoff opnieuw geprobeerd tot
+`max_attempts`.
+
+Status van een job:
+    queued → running → succeeded
+                     → failed     (na de laatste poging, of bij een PermanentJobError)
+                     → queued     (nieuwe poging na backoff)
+    queued/running → cancelled
+
+Een job kan afhangen van een andere job (`depends_on`): hij start pas als die
+geslaagd is en mislukt meteen als die mislukt of geannuleerd wordt.
+
+Resultaten zijn JSON; grotere uitvoer (audio, PDF) staat als artifact op schijf in
+`.sinterklaas/artifacts/<job id>/` en het resultaat verwijst ernaar.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from storage import connect, data_path
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Standaard aantal pogingen per soort job. Video's niet automatisch herhalen:
+# elke nieuwe render kost HeyGen credits.
+DEFAULT_MAX_ATTEMPTS = {"message": 3, "audio": 3, "pdf": 2, "video": 1}
+
+# Hoe lang een lease geldig blijft zonder heartbeat
+LEASE_SECONDS = 60.0
+
+
+class PermanentJobError(Exception):
+    """Fout waarbij opnieuw proberen geen zin heeft (bv. ontbrekende configuratie)."""
+
+
+@dataclass
+class Job:
+    """Eén job uit de queue."""
+
+    id: str
+    kind: str
+    payload: dict
+    status: str
+    attempts: int
+    max_attempts: int
+    owner: Optional[str]
+    depends_on: Optional[str]
+    worker: Optional[str]
+    progress: Optional[str]
+    result: Optional[dict]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        return cls(
+            id=row["id"],
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            owner=row["owner"],
+            depends_on=row["depends_on"],
+            worker=row["worker"],
+            progress=row["progress"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+
+def artifact_dir(job_id: str) -> Path:
+    """Map voor de uitvoerbestanden van een job."""
+    return data_path("artifacts", job_id)
+
+
+class JobQueue:
+    """SQLite-backed job queue, veilig te delen tussen threads en processen."""
+
+    def __init__(self, db_name: str = "jobs.db", lease_seconds: float = LEASE_SECONDS):
+        """
+        Initialiseer de JobQueue.
+
+        Args:
+            db_name: SQLite database in de data map
+            lease_seconds: Hoe lang een worker een job mag houden zonder heartbeat
+        """
+        self.lease_seconds = lease_seconds
+        self._db_name = db_name
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                owner TEXT,
+                depends_on TEXT,
+                worker TEXT,
+                lease_expires REAL,
+                run_after REAL NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_depends_on ON jobs (depends_on)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+        return conn
+
+    # --- Clients ------------------------------------------------------------
+
+    def submit(
+        self,
+        kind: str,
+        payload: dict,
+        owner: Optional[str] = None,
+        depends_on: Optional[str] = None,
+        max_attempts: Optional[int] = None
+    ) -> str:
+        """
+        Zet een job in de queue.
+
+        Args:
+            kind: Soort job ("message", "audio", "video", "pdf")
+            payload: JSON-serialiseerbare invoer voor de handler
+            owner: Wie de job aanvroeg (bv. de Streamlit sessie)
+            depends_on: Job die eerst moet slagen; zijn resultaat gaat mee naar de handler
+            max_attempts: Aantal pogingen (standaard per soort, zie DEFAULT_MAX_ATTEMPTS)
+
+        Returns:
+            ID van de nieuwe job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, owner, depends_on, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                kind,
+                json.dumps(payload),
+                QUEUED,
+                max_attempts or DEFAULT_MAX_ATTEMPTS.get(kind, 3),
+                owner,
+                depends_on,
+                now,
+                now,
+                now,
+            )
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def jobs_for(self, owner: str, limit: int = 50) -> list[Job]:
+        """Recentste jobs van een aanvrager."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?", (owner, limit)
+        )
+        return [Job.from_row(row) for row in rows]
+
+    def with_status_since(self, status: str, since: float) -> list[Job]:
+        """Jobs met deze status die sinds `since` bijgewerkt werden (oudste eerst)."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE status = ? AND updated_at >= ? ORDER BY updated_at", (status, since)
+        )
+        return [Job.from_row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Annuleer een job die nog niet klaar is.
+
+        Een lopende job ziet de annulering bij zijn volgende heartbeat.
+
+        Returns:
+            True als de job geannuleerd werd
+        """
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, interval: float = 0.5) -> Job:
+        """
+        Wacht tot een job klaar is (geslaagd, mislukt of geannuleerd).
+
+        Raises:
+            KeyError: Als de job niet bestaat
+            TimeoutError: Als de job na `timeout` seconden nog niet klaar is
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.finished:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} is na {timeout:.0f} seconden nog niet klaar ({job.status})")
+            time.sleep(interval)
+
+    def stats(self) -> dict[str, int]:
+        """Aantal jobs per status."""
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    # --- Workers ------------------------------------------------------------
+
+    def claim(self, worker: str, kinds: Optional[list[str]] = None) -> Optional[Job]:
+        """
+        Neem de oudste job die klaar is om te starten.
+
+        Jobs met een verlopen lease (gecrashte worker) komen eerst terug in de queue.
+        Jobs waarvan de afhankelijkheid mislukte, worden meteen als mislukt gemarkeerd.
+
+        Args:
+            worker: Naam van de worker (voor de lease)
+            kinds: Enkel deze soorten jobs (standaard alle)
+
+        Returns:
+            De job (status running, attempts al verhoogd) of None
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Verlopen leases: de worker is weg, de poging telt als mislukt
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, "
+                "error = 'Worker verdwenen (lease verlopen)', worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires < ?",
+                (FAILED, QUEUED, now, RUNNING, now)
+            )
+            # Afhankelijkheid mislukt of geannuleerd: deze job kan nooit meer starten
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Afhankelijke job mislukte', updated_at = ? "
+                "WHERE status = ? AND depends_on IN (SELECT id FROM jobs WHERE status IN (?, ?))",
+                (FAILED, now, QUEUED, FAILED, CANCELLED)
+            )
+
+            query = (
+                "SELECT j.* FROM jobs j LEFT JOIN jobs d ON d.id = j.depends_on "
+                "WHERE j.status = ? AND j.run_after <= ? AND (j.depends_on IS NULL OR d.status = ?)"
+            )
+            params: list[Any] = [QUEUED, now, SUCCEEDED]
+            if kinds:
+                query += f" AND j.kind IN ({', '.join('?' for _ in kinds)})"
+                params.extend(kinds)
+            query += " ORDER BY j.created_at LIMIT 1"
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, lease_expires = ?, "
+                "progress = NULL, updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker: str, progress: Optional[str] = None) -> bool:
+        """
+        Verleng de lease van een lopende job (en bewaar eventueel een voortgangsmelding).
+
+        Returns:
+            False als de job niet meer van deze worker is (geannuleerd of overgenomen)
+        """
+        now = time.time()
+        if progress is None:
+            cursor = self._conn().execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (now + self.lease_seconds, now, job_id, worker, RUNNING)
+            )
+        else:
+            cursor = self._conn().execute(
+                "UPDATE jobs SET lease_expires = ?, progress = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (now + self.lease_seconds, progress, now, job_id, worker, RUNNING)
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        """Markeer een job als geslaagd met zijn resultaat."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (SUCCEEDED, json.dumps(result), time.time(), job_id, worker, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, worker: str, error: str, retry: bool = True, backoff: float = 5.0) -> str:
+        """
+        Registreer een mislukte poging.
+
+        Args:
+            job_id: De job
+            worker: De worker die de job had
+            error: Foutmelding
+            retry: False voor fouten waarbij opnieuw proberen geen zin heeft
+            backoff: Basiswachttijd; verdubbelt per poging
+
+        Returns:
+            De nieuwe status (queued voor een nieuwe poging, anders failed)
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                (job_id, worker, RUNNING)
+            ).fetchone()
+            if row is None:
+                # Intussen geannuleerd of overgenomen
+                conn.execute("COMMIT")
+                job = self.get(job_id)
+                return job.status if job else FAILED
+            status = QUEUED if retry and row["attempts"] < row["max_attempts"] else FAILED
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, lease_expires = NULL, run_after = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, error, now + backoff * 2 ** (row["attempts"] - 1), now, job_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """
+        Verwijder afgewerkte jobs (en hun artifacts) ouder dan `older_than` seconden.
+
+        Workers roepen dit periodiek aan (zie worker.py); meerdere tegelijk is geen probleem.
+
+        Args:
+            older_than: Leeftijd in seconden (standaard SINTERKLAAS_JOB_RETENTION_HOURS, of 7 dagen)
+
+        Returns:
+            Aantal verwijderde jobs
+        """
+        if older_than is None:
+            older_than = float(os.getenv("SINTERKLAAS_JOB_RETENTION_HOURS", "168")) * 3600
+        cutoff = time.time() - older_than
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT id FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED)}) AND updated_at < ?",
+            (*FINISHED, cutoff)
+        ).fetchall()
+        for row in rows:
+            # ignore_errors: een andere worker kan dezelfde map tegelijk opruimen
+            shutil.rmtree(data_path("artifacts") / row["id"], ignore_errors=True)
+            conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        return len(rows)
+
+
+def queue_enabled() -> bool:
+    """Of de app zijn werk via de job queue laat doen (SINTERKLAAS_JOB_QUEUE=1)."""
+    return os.getenv("SINTERKLAAS_JOB_QUEUE", "").lower() in ("1", "true")
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Gedeelde JobQueue voor het proces."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
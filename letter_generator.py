@@ -2,27 +2,49 @@ from datetime import datetime
 import re
 from typing import Optional
 from pathlib import Path
-import base64
+
+from image_variants import image_for
+from letter_layout import fit_letter, group_paragraphs
+from letter_templates import DEFAULT_THEME, registry as template_registry
+
+# Melding voor een brief die zelfs op de kleinste lettergrootte niet op A4 past (en dus afgeknipt wordt)
+OVERFLOW_WARNING = "Brief past niet op één A4"
 
 
 class LetterGenerator:
     """Klasse voor het genereren van Sinterklaas brieven in HTML formaat."""
     
-    def __init__(self, background_image_path: str = "sint-briefpapier.png"):
+    def __init__(
+        self,
+        background_image_path: Optional[str] = None,
+        theme: str = DEFAULT_THEME,
+        font_scale: float = 1.0,
+        auto_fit: bool = True
+    ):
         """
         Initialiseer de LetterGenerator.
         
         Args:
-            background_image_path: Pad naar de achtergrondafbeelding
+            background_image_path: Pad naar de achtergrondafbeelding (standaard die van het thema)
+            theme: Naam van het perkament-thema (zie letter_templates.registry)
+            font_scale: (Maximale) schaalfactor voor de lettergrootte van de brieftekst
+            auto_fit: Verklein de tekst of voeg paragrafen samen zodat de brief op A4 past
         """
-        self.background_image_path = background_image_path
+        self.theme = theme
+        self.font_scale = font_scale
+        self.auto_fit = auto_fit
+        self.background_image_path = background_image_path or template_registry.theme(theme).background_image
     
-    def generate_html(self, text_content: str) -> str:
+    def generate_html(self, text_content: str, for_print: bool = False) -> str:
         """
         Genereer HTML voor de brief.
         
+        Een tekst die zelfs verkleind niet op A4 past wordt afgeknipt; controleer
+        dat vooraf met fits_on_page.
+        
         Args:
             text_content: De tekstinhoud van de brief
+            for_print: Gebruik de achtergrond in printresolutie (voor PDF) i.p.v. de webvariant
         
         Returns:
             HTML string
@@ -30,11 +52,28 @@ class LetterGenerator:
         # Get date
         date_str = self._get_dutch_date()
         
-        # Process text
-        greeting, paragraphs = self._process_text(text_content)
+        greeting, paragraphs, font_scale, _ = self._layout(text_content)
         
         # Build HTML
-        return self._build_html(date_str, greeting, paragraphs)
+        return self._build_html(date_str, greeting, paragraphs, for_print, font_scale)
+    
+    def fits_on_page(self, text_content: str) -> bool:
+        """
+        Of de brief op één A4 past (anders wordt de tekst onderaan afgeknipt).
+        
+        Zonder auto_fit wordt er niet gemeten en is het antwoord altijd True.
+        Toon anders OVERFLOW_WARNING aan de gebruiker, want generate_html knipt stil af.
+        """
+        return self._layout(text_content)[3]
+    
+    def _layout(self, text_content: str) -> tuple[Optional[str], list[str], float, bool]:
+        """Greeting, paragrafen, lettergrootte en of de brief op A4 past."""
+        greeting, sentences = self._split_text(text_content)
+        if not self.auto_fit:
+            return greeting, group_paragraphs(sentences), self.font_scale, True
+        # Meet de tekst op A4 en kies een lettergrootte/paragraafindeling die past
+        font_scale, paragraphs, fits = fit_letter(greeting, sentences, max_scale=self.font_scale)
+        return greeting, paragraphs, font_scale, fits
     
     def _get_dutch_date(self) -> str:
         """Krijg de huidige datum in Nederlands formaat."""
@@ -52,6 +91,11 @@ class LetterGenerator:
     
     def _process_text(self, text_content: str) -> tuple[Optional[str], list[str]]:
         """Verwerk tekst en split in greeting en paragrafen."""
+        greeting, body_sentences = self._split_text(text_content)
+        return greeting, group_paragraphs(body_sentences)
+    
+    def _split_text(self, text_content: str) -> tuple[Optional[str], list[str]]:
+        """Verwijder de afsluiting en split de tekst in greeting en losse zinnen."""
         # Remove closing
         closing_patterns = [
             r'[Tt]ot gauw[,\s]*[Hh]oogachtend[,\s]*[Ss]interklaas',
@@ -81,33 +125,25 @@ class LetterGenerator:
         greeting = combined_sentences[0].rstrip(',') if combined_sentences else None
         body_sentences = combined_sentences[1:] if len(combined_sentences) > 1 else []
         
-        # Group into paragraphs
-        paragraphs = []
-        if len(body_sentences) <= 2:
-            paragraphs.append(' '.join(body_sentences))
-        elif len(body_sentences) <= 4:
-            paragraphs.append(' '.join(body_sentences[:2]))
-            paragraphs.append(' '.join(body_sentences[2:]))
-        else:
-            paragraphs.append(' '.join(body_sentences[:2]))
-            paragraphs.append(' '.join(body_sentences[2:4]))
-            paragraphs.append(' '.join(body_sentences[4:]))
-        
-        return greeting, paragraphs
+        return greeting, body_sentences
     
-    def _build_html(self, date_str: str, greeting: Optional[str], paragraphs: list[str]) -> str:
-        """Bouw de HTML string."""
-        # Load background image as base64
+    def _build_html(
+        self,
+        date_str: str,
+        greeting: Optional[str],
+        paragraphs: list[str],
+        for_print: bool = False,
+        font_scale: Optional[float] = None
+    ) -> str:
+        """Bouw de HTML string door de slots van het gecompileerde sjabloon in te vullen."""
+        # Load background image as base64 (gecachet per bestand in het register)
         background_path = Path(self.background_image_path)
         if not background_path.is_absolute():
             # Relative path - assume it's relative to the script location
             background_path = Path(__file__).parent / self.background_image_path
-        
-        background_image_url = ""
-        if background_path.exists():
-            with open(background_path, "rb") as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
-                background_image_url = f"data:image/png;base64,{img_data}"
+        # Kleinste geschikte variant: webresolutie voor de preview, printresolutie voor PDF
+        background_path = image_for(background_path, "print" if for_print else "letter_preview")
+        background_image_url = template_registry.background_data_url(background_path)
         
         paragraphs_html = []
         if greeting:
@@ -123,169 +159,5 @@ class LetterGenerator:
         
         paragraphs_html_str = '\n'.join(paragraphs_html)
         
-        return f"""
-    <style>
-    /* Load Google Fonts with fallback */
-    @import url('https://fonts.googleapis.com/css2?family=Pinyon+Script&family=Herr+Von+Muellerhoff&display=swap');
-    
-    /* Ensure fonts are loaded before rendering */
-    .letter-container {{
-        font-display: swap;
-    }}
-    .letter-container {{
-        background-image: url('{background_image_url}');
-        background-size: 100% 100%;
-        background-repeat: no-repeat;
-        background-position: center;
-        width: 1696px;
-        height: auto;
-        aspect-ratio: 1696 / 2528;
-        padding: 200px 80px 60px 80px;
-        color: #3b2f2f;
-        font-family: 'Pinyon Script', 'Georgia', 'Times New Roman', serif;
-        font-size: 24px;
-        line-height: 1.4;
-        position: relative;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        border-radius: 2px;
-        margin: 2rem auto;
-        box-sizing: border-box;
-        overflow: hidden;
-        display: flex;
-        flex-direction: column;
-    }}
-    .letter-container p {{
-        margin-bottom: 0.8em;
-        text-align: justify;
-        font-size: 1em;
-        flex-shrink: 0;
-    }}
-    /* Responsive styling for web display only */
-    @media (max-width: 1800px) {{
-        .letter-container {{
-            width: min(1696px, 100%);
-            height: auto;
-            aspect-ratio: 1696 / 2528;
-            background-size: 100% 100%;
-            font-size: calc(24px * (100vw / 1696px));
-            padding: calc(200px * (100vw / 1696px)) calc(80px * (100vw / 1696px)) calc(60px * (100vw / 1696px)) calc(80px * (100vw / 1696px));
-        }}
-    }}
-    /* A4 Print styling - optimized for A4 paper */
-    @page {{
-        size: A4;
-        margin: 0;
-    }}
-    @media print {{
-        body {{
-            margin: 0;
-            padding: 0;
-        }}
-        .letter-container {{
-            width: 210mm !important;
-            height: 297mm !important;
-            max-width: 210mm !important;
-            max-height: 297mm !important;
-            padding: 25mm 20mm 15mm 20mm !important;
-            margin: 0 !important;
-            box-shadow: none !important;
-            overflow: hidden !important;
-            background-size: 100% 100% !important;
-            font-size: 24pt !important;
-            page-break-inside: avoid !important;
-        }}
-        .letter-container p {{
-            font-size: 24pt !important;
-            margin-bottom: 0.6em !important;
-            line-height: 1.5 !important;
-        }}
-        .greeting {{
-            font-size: 24pt !important;
-            margin-bottom: 1em !important;
-        }}
-        .closing {{
-            font-size: 24pt !important;
-            margin-top: 1.5em !important;
-        }}
-        .signature-line {{
-            font-size: 24pt !important;
-        }}
-        .signature-name {{
-            font-size: 30pt !important;
-        }}
-        .letter-date {{
-            top: 15mm !important;
-            right: 20mm !important;
-            font-size: 21pt !important;
-        }}
-    }}
-    .letter-date {{
-        position: absolute;
-        top: 120px;
-        right: 80px;
-        font-size: 18px;
-        color: #3b2f2f;
-        font-family: 'Pinyon Script', 'Georgia', 'Times New Roman', serif;
-    }}
-    /* Responsive date for web display */
-    @media (max-width: 1800px) {{
-        .letter-date {{
-            top: calc(120px * (100vw / 1696px));
-            right: calc(80px * (100vw / 1696px));
-            font-size: calc(18px * (100vw / 1696px));
-        }}
-    }}
-    /* PDF/Print: Force exact date position */
-    @media print {{
-        .letter-date {{
-            top: 120px !important;
-            right: 80px !important;
-            font-size: 18px !important;
-        }}
-    }}
-    .greeting {{
-        margin-bottom: 1.5em;
-    }}
-    .closing {{
-        margin-top: 2em;
-        margin-bottom: 0.5em;
-    }}
-    .signature-line {{
-        margin-bottom: 0.3em;
-        text-align: right;
-    }}
-    .signature-name {{
-        margin-bottom: 0;
-        text-align: right;
-        font-family: 'Herr Von Muellerhoff', 'Georgia', 'Times New Roman', serif;
-        font-size: 36px;
-        color: #8B0000;
-        font-weight: bold;
-    }}
-    .signature-area {{
-        margin-top: 40px;
-        text-align: right;
-        position: relative;
-    }}
-    .sint-signature {{
-        font-family: 'Herr Von Muellerhoff', 'Georgia', 'Times New Roman', serif;
-        font-size: 50px;
-        color: #8B0000;
-        margin-right: 20px;
-        font-weight: bold;
-    }}
-    .seal-image {{
-        position: absolute;
-        bottom: -20px;
-        right: 10px;
-        width: 120px;
-        opacity: 0.9;
-        transform: rotate(-10deg);
-    }}
-    </style>
-    <div class="letter-container">
-        <div class="letter-date">{date_str}</div>
-{paragraphs_html_str}
-    </div>
-    """
-
+        template = template_registry.get(self.theme, font_scale or self.font_scale)
+        return template.render(background_image_url, date_str, paragraphs_html_str)
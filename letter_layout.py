@@ -0,0 +1,185 @@
+"""
+Meet de brieftekst op A4 zonder browser, zodat lange brieven niet afgeknipt worden.
+
+De maten volgen de print-CSS uit letter_templates.py. Als de lettertypebestanden
+in de fonts map staan (`fonts/PinyonScript-Regular.ttf` en
+`fonts/HerrVonMuellerhoff-Regular.ttf`, of `SINTERKLAAS_FONT_DIR`) worden de echte
+glyph-breedtes gebruikt via Pillow; anders een (ruim genomen) breedtetabel.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+try:
+    from PIL import ImageFont
+except ImportError:
+    ImageFont = None
+
+MM_TO_PT = 72 / 25.4
+
+# Print layout (zie @media print in letter_templates.py)
+PAGE_WIDTH_PT = 210 * MM_TO_PT
+PAGE_HEIGHT_PT = 297 * MM_TO_PT
+CONTENT_WIDTH_PT = PAGE_WIDTH_PT - 2 * 20 * MM_TO_PT
+CONTENT_HEIGHT_PT = PAGE_HEIGHT_PT - (25 + 15) * MM_TO_PT
+
+BODY_FONT_PT = 24
+SIGNATURE_FONT_PT = 30
+LINE_HEIGHT = 1.5
+# Flex container: marges vallen niet samen. Standaard <p> bovenmarge is 1em.
+P_MARGIN_TOP_EM = 1.0
+P_MARGIN_BOTTOM_EM = 0.6
+GREETING_MARGIN_BOTTOM_EM = 1.0
+CLOSING_MARGIN_TOP_EM = 1.5
+
+# Probeer eerst de normale grootte, dan stapsgewijs kleiner
+FONT_SCALES = (1.0, 0.92, 0.85, 0.78, 0.72, 0.66, 0.6, 0.55)
+MAX_PARAGRAPHS = 3
+
+FONT_FILES = {
+    "body": "PinyonScript-Regular.ttf",
+    "signature": "HerrVonMuellerhoff-Regular.ttf",
+}
+
+# Geschatte breedtes (in em) voor Pinyon Script wanneer het fontbestand ontbreekt.
+# Bewust aan de ruime kant: liever iets te klein dan afgeknipt.
+_FALLBACK_WIDTHS = {
+    " ": 0.26, ".": 0.22, ",": 0.22, "!": 0.3, "?": 0.42, "'": 0.2, "-": 0.32,
+    "i": 0.3, "l": 0.32, "j": 0.3, "t": 0.34, "f": 0.34, "r": 0.4,
+    "m": 0.68, "w": 0.6,
+}
+_FALLBACK_LOWER = 0.46
+_FALLBACK_UPPER = 0.78
+_FALLBACK_OTHER = 0.5
+
+_fonts: dict[tuple[str, int], object] = {}
+_fonts_lock = threading.Lock()
+
+
+def _font_dir() -> Path:
+    configured = os.getenv("SINTERKLAAS_FONT_DIR")
+    return Path(configured) if configured else Path(__file__).parent / "fonts"
+
+
+def _load_font(kind: str, size_pt: float):
+    """Laad een TrueType font op een bepaalde grootte, of None als dat niet kan."""
+    if ImageFont is None:
+        return None
+    # Meet op 10x de puntgrootte voor nauwkeurigheid (Pillow werkt met gehele groottes)
+    key = (kind, round(size_pt * 10))
+    if key not in _fonts:
+        path = _font_dir() / FONT_FILES[kind]
+        font = None
+        if path.exists():
+            try:
+                font = ImageFont.truetype(str(path), key[1])
+            except OSError:
+                font = None
+        with _fonts_lock:
+            _fonts[key] = font
+    return _fonts[key]
+
+
+def text_width(text: str, size_pt: float, kind: str = "body") -> float:
+    """Breedte van een stuk tekst in punten."""
+    font = _load_font(kind, size_pt)
+    if font is not None:
+        return font.getlength(text) / 10
+    width_em = 0.0
+    for char in text:
+        if char in _FALLBACK_WIDTHS:
+            width_em += _FALLBACK_WIDTHS[char]
+        elif char.islower():
+            width_em += _FALLBACK_LOWER
+        elif char.isupper():
+            width_em += _FALLBACK_UPPER
+        else:
+            width_em += _FALLBACK_OTHER
+    return width_em * size_pt
+
+
+def count_lines(text: str, size_pt: float, max_width: float = CONTENT_WIDTH_PT, kind: str = "body") -> int:
+    """Aantal regels na greedy regelafbreking op woordgrenzen (zoals de browser doet)."""
+    words = text.split()
+    if not words:
+        return 0
+    space = text_width(" ", size_pt, kind)
+    lines = 1
+    line_width = 0.0
+    for word in words:
+        word_width = text_width(word, size_pt, kind)
+        if line_width == 0:
+            line_width = word_width
+        elif line_width + space + word_width <= max_width:
+            line_width += space + word_width
+        else:
+            lines += 1
+            line_width = word_width
+    return lines
+
+
+def _block_height(lines: int, size_pt: float, margin_top_em: float, margin_bottom_em: float) -> float:
+    return (margin_top_em + lines * LINE_HEIGHT + margin_bottom_em) * size_pt
+
+
+def letter_height(greeting: Optional[str], paragraphs: list[str], font_scale: float = 1.0) -> float:
+    """Totale hoogte (in punten) van de brieftekst op A4 bij een bepaalde schaal."""
+    body_pt = BODY_FONT_PT * font_scale
+    signature_pt = SIGNATURE_FONT_PT * font_scale
+
+    height = 0.0
+    if greeting:
+        height += _block_height(count_lines(greeting, body_pt), body_pt, P_MARGIN_TOP_EM, GREETING_MARGIN_BOTTOM_EM)
+    for paragraph in paragraphs:
+        if paragraph.strip():
+            height += _block_height(count_lines(paragraph, body_pt), body_pt, P_MARGIN_TOP_EM, P_MARGIN_BOTTOM_EM)
+
+    # Vaste afsluiting: "Tot gauw", "Hoogachtend", "Sinterklaas"
+    height += _block_height(1, body_pt, CLOSING_MARGIN_TOP_EM, P_MARGIN_BOTTOM_EM)
+    height += _block_height(1, body_pt, P_MARGIN_TOP_EM, P_MARGIN_BOTTOM_EM)
+    height += _block_height(1, signature_pt, P_MARGIN_TOP_EM, P_MARGIN_BOTTOM_EM)
+    return height
+
+
+def group_paragraphs(sentences: list[str], max_paragraphs: int = MAX_PARAGRAPHS) -> list[str]:
+    """Groepeer zinnen in paragrafen van twee zinnen, met de rest in de laatste paragraaf."""
+    if max_paragraphs <= 1 or len(sentences) <= 2:
+        return [' '.join(sentences)]
+    paragraphs = []
+    rest = sentences
+    while rest and len(paragraphs) < max_paragraphs - 1:
+        paragraphs.append(' '.join(rest[:2]))
+        rest = rest[2:]
+    if rest:
+        paragraphs.append(' '.join(rest))
+    return paragraphs
+
+
+def fit_letter(
+    greeting: Optional[str],
+    sentences: list[str],
+    max_scale: float = 1.0,
+    max_height: float = CONTENT_HEIGHT_PT
+) -> tuple[float, list[str], bool]:
+    """
+    Kies de grootste lettergrootte (en daarna de meeste paragrafen) waarbij de brief op A4 past.
+
+    Args:
+        greeting: De begroeting (eerste zin)
+        sentences: De overige zinnen van de brief
+        max_scale: Grootste toegestane schaal
+        max_height: Beschikbare hoogte in punten
+
+    Returns:
+        (font_scale, paragrafen, past) - past is False als zelfs de kleinste schaal te groot is
+    """
+    scales = [s for s in FONT_SCALES if s <= max_scale] or [max_scale]
+    groupings = [group_paragraphs(sentences, n) for n in range(MAX_PARAGRAPHS, 0, -1)]
+
+    for scale in scales:
+        for paragraphs in groupings:
+            if letter_height(greeting, paragraphs, scale) <= max_height:
+                return scale, paragraphs, True
+    return scales[-1], groupings[-1], False
@@ -0,0 +1,315 @@
+from dataclasses import dataclass
+from pathlib import Path
+from string import Template
+from typing import Optional
+import base64
+import re
+import threading
+
+
+@dataclass(frozen=True)
+class LetterTheme:
+    """Beschrijving van een perkament-thema voor de Sinterklaasbrief."""
+
+    name: str
+    background_image: str = "sint-briefpapier.png"
+    text_color: str = "#3b2f2f"
+    accent_color: str = "#8B0000"
+    body_font: str = "'Pinyon Script', 'Georgia', 'Times New Roman', serif"
+    signature_font: str = "'Herr Von Muellerhoff', 'Georgia', 'Times New Roman', serif"
+    font_import_url: str = (
+        "https://fonts.googleapis.com/css2?family=Pinyon+Script&family=Herr+Von+Muellerhoff&display=swap"
+    )
+
+
+# Statische CSS en skelet van de brief. `$naam` velden worden één keer per
+# thema/schaal ingevuld bij het compileren; `$background_image_url`, `$date`
+# en `$body` zijn de dynamische slots die per brief worden ingevuld.
+_LETTER_SKELETON = """
+    <style>
+    /* Load Google Fonts with fallback */
+    @import url('$font_import_url');
+
+    /* Ensure fonts are loaded before rendering */
+    .letter-container {
+        font-display: swap;
+    }
+    .letter-container {
+        background-image: url('$background_image_url');
+        background-size: 100% 100%;
+        background-repeat: no-repeat;
+        background-position: center;
+        width: 1696px;
+        height: auto;
+        aspect-ratio: 1696 / 2528;
+        padding: 200px 80px 60px 80px;
+        color: $text_color;
+        font-family: $body_font;
+        font-size: $body_px;
+        line-height: 1.4;
+        position: relative;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.3);
+        border-radius: 2px;
+        margin: 2rem auto;
+        box-sizing: border-box;
+        overflow: hidden;
+        display: flex;
+        flex-direction: column;
+    }
+    .letter-container p {
+        margin-bottom: 0.8em;
+        text-align: justify;
+        font-size: 1em;
+        flex-shrink: 0;
+    }
+    /* Responsive styling for web display only */
+    @media (max-width: 1800px) {
+        .letter-container {
+            width: min(1696px, 100%);
+            height: auto;
+            aspect-ratio: 1696 / 2528;
+            background-size: 100% 100%;
+            font-size: calc($body_px * (100vw / 1696px));
+            padding: calc(200px * (100vw / 1696px)) calc(80px * (100vw / 1696px)) calc(60px * (100vw / 1696px)) calc(80px * (100vw / 1696px));
+        }
+    }
+    /* A4 Print styling - optimized for A4 paper */
+    @page {
+        size: A4;
+        margin: 0;
+    }
+    @media print {
+        body {
+            margin: 0;
+            padding: 0;
+        }
+        .letter-container {
+            width: 210mm !important;
+            height: 297mm !important;
+            max-width: 210mm !important;
+            max-height: 297mm !important;
+            padding: 25mm 20mm 15mm 20mm !important;
+            margin: 0 !important;
+            box-shadow: none !important;
+            overflow: hidden !important;
+            background-size: 100% 100% !important;
+            font-size: $print_pt !important;
+            page-break-inside: avoid !important;
+        }
+        .letter-container p {
+            font-size: $print_pt !important;
+            margin-bottom: 0.6em !important;
+            line-height: 1.5 !important;
+        }
+        .greeting {
+            font-size: $print_pt !important;
+            margin-bottom: 1em !important;
+        }
+        .closing {
+            font-size: $print_pt !important;
+            margin-top: 1.5em !important;
+        }
+        .signature-line {
+            font-size: $print_pt !important;
+        }
+        .signature-name {
+            font-size: $print_signature_pt !important;
+        }
+        .letter-date {
+            top: 15mm !important;
+            right: 20mm !important;
+            font-size: 21pt !important;
+        }
+    }
+    .letter-date {
+        position: absolute;
+        top: 120px;
+        right: 80px;
+        font-size: 18px;
+        color: $text_color;
+        font-family: $body_font;
+    }
+    /* Responsive date for web display */
+    @media (max-width: 1800px) {
+        .letter-date {
+            top: calc(120px * (100vw / 1696px));
+            right: calc(80px * (100vw / 1696px));
+            font-size: calc(18px * (100vw / 1696px));
+        }
+    }
+    /* PDF/Print: Force exact date position */
+    @media print {
+        .letter-date {
+            top: 120px !important;
+            right: 80px !important;
+            font-size: 18px !important;
+        }
+    }
+    .greeting {
+        margin-bottom: 1.5em;
+    }
+    .closing {
+        margin-top: 2em;
+        margin-bottom: 0.5em;
+    }
+    .signature-line {
+        margin-bottom: 0.3em;
+        text-align: right;
+    }
+    .signature-name {
+        margin-bottom: 0;
+        text-align: right;
+        font-family: $signature_font;
+        font-size: $signature_px;
+        color: $accent_color;
+        font-weight: bold;
+    }
+    .signature-area {
+        margin-top: 40px;
+        text-align: right;
+        position: relative;
+    }
+    .sint-signature {
+        font-family: $signature_font;
+        font-size: 50px;
+        color: $accent_color;
+        margin-right: 20px;
+        font-weight: bold;
+    }
+    .seal-image {
+        position: absolute;
+        bottom: -20px;
+        right: 10px;
+        width: 120px;
+        opacity: 0.9;
+        transform: rotate(-10deg);
+    }
+    </style>
+    <div class="letter-container">
+        <div class="letter-date">$date</div>
+$body
+    </div>
+    """
+
+_DYNAMIC_SLOTS = ("background_image_url", "date", "body")
+_SLOT_PATTERN = re.compile(r"\$(" + "|".join(_DYNAMIC_SLOTS) + r")\b")
+
+
+def _scaled(value: float, scale: float, unit: str) -> str:
+    return f"{round(value * scale, 2):g}{unit}"
+
+
+class CompiledLetterTemplate:
+    """Een voorgecompileerd briefsjabloon: statische delen plus dynamische slots."""
+
+    def __init__(self, theme: LetterTheme, font_scale: float = 1.0):
+        """
+        Compileer het sjabloon voor een thema en lettergrootte-schaal.
+
+        Args:
+            theme: Het perkament-thema
+            font_scale: Schaalfactor voor de lettergrootte van de brieftekst
+        """
+        self.theme = theme
+        self.font_scale = font_scale
+
+        static_values = {
+            "font_import_url": theme.font_import_url,
+            "text_color": theme.text_color,
+            "accent_color": theme.accent_color,
+            "body_font": theme.body_font,
+            "signature_font": theme.signature_font,
+            "body_px": _scaled(24, font_scale, "px"),
+            "signature_px": _scaled(36, font_scale, "px"),
+            "print_pt": _scaled(24, font_scale, "pt"),
+            "print_signature_pt": _scaled(30, font_scale, "pt"),
+        }
+        source = Template(_LETTER_SKELETON).safe_substitute(static_values)
+
+        # Split op de dynamische slots: even indexen zijn statische tekst,
+        # oneven indexen zijn slotnamen.
+        pieces = _SLOT_PATTERN.split(source)
+        self._static_parts = pieces[0::2]
+        self._slot_order = pieces[1::2]
+
+    def render(self, background_image_url: str, date: str, body: str) -> str:
+        """Vul de dynamische slots in en geef de volledige HTML terug."""
+        values = {"background_image_url": background_image_url, "date": date, "body": body}
+        out = [self._static_parts[0]]
+        for slot, static_part in zip(self._slot_order, self._static_parts[1:]):
+            out.append(values[slot])
+            out.append(static_part)
+        return "".join(out)
+
+
+class LetterTemplateRegistry:
+    """Register van brief-thema's met gecompileerde sjablonen (thread-safe)."""
+
+    def __init__(self):
+        self._themes: dict[str, LetterTheme] = {}
+        self._compiled: dict[tuple[str, float], CompiledLetterTemplate] = {}
+        self._backgrounds: dict[tuple[str, float], str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, theme: LetterTheme) -> None:
+        """Registreer (of vervang) een thema en gooi oude compilaties weg."""
+        with self._lock:
+            self._themes[theme.name] = theme
+            for key in [k for k in self._compiled if k[0] == theme.name]:
+                del self._compiled[key]
+
+    def themes(self) -> list[str]:
+        """Namen van alle geregistreerde thema's."""
+        return sorted(self._themes)
+
+    def theme(self, name: str) -> LetterTheme:
+        """Geef een thema terug op naam."""
+        try:
+            return self._themes[name]
+        except KeyError:
+            raise ValueError(f"Onbekend brief-thema '{name}'. Beschikbaar: {', '.join(self.themes())}")
+
+    def get(self, name: str, font_scale: float = 1.0) -> CompiledLetterTemplate:
+        """Geef het gecompileerde sjabloon voor een thema en schaal (compileert hooguit één keer)."""
+        key = (name, round(font_scale, 3))
+        template = self._compiled.get(key)
+        if template is None:
+            theme = self.theme(name)
+            with self._lock:
+                template = self._compiled.get(key)
+                if template is None:
+                    template = CompiledLetterTemplate(theme, key[1])
+                    self._compiled[key] = template
+        return template
+
+    def background_data_url(self, image_path: Path) -> str:
+        """Lees een achtergrondafbeelding één keer in als data-URL (opnieuw als het bestand wijzigt)."""
+        if not image_path.exists():
+            return ""
+        key = (str(image_path), image_path.stat().st_mtime)
+        url = self._backgrounds.get(key)
+        if url is None:
+            mime = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}.get(
+                image_path.suffix.lower(), "image/png"
+            )
+            with open(image_path, "rb") as img_file:
+                img_data = base64.b64encode(img_file.read()).decode()
+            url = f"data:{mime};base64,{img_data}"
+            with self._lock:
+                for old_key in [k for k in self._backgrounds if k[0] == key[0]]:
+                    del self._backgrounds[old_key]
+                self._backgrounds[key] = url
+        return url
+
+
+DEFAULT_THEME = "klassiek"
+
+registry = LetterTemplateRegistry()
+registry.register(LetterTheme(name=DEFAULT_THEME))
+registry.register(LetterTheme(name="sepia", text_color="#4a3520", accent_color="#6b1e1e"))
+registry.register(LetterTheme(name="winter", text_color="#2c3e50", accent_color="#8B0000"))
+
+
+def get_template(theme: Optional[str] = None, font_scale: float = 1.0) -> CompiledLetterTemplate:
+    """Snelkoppeling naar het standaardregister."""
+    return registry.get(theme or DEFAULT_THEME, font_scale)
@@ -1,6 +1,9 @@
 import openai
 from typing import Optional
 
+from rate_limiter import get_rate_limiter
+from tracing import span
+
 
 class MessageGenerator:
     """Klasse voor het genereren van Sinterklaas boodschappen met GPT-4o."""
@@ -157,15 +160,22 @@ OPDRACHT:
 
 - Schrijf een volledige, complete boodschap van ongeveer 50-80 woorden. Zorg dat de boodschap NIET wordt afgesneden en volledig is."""
         
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=400,
-            temperature=0.9
-        )
+        with span("message.generate", labels={"provider": "openai", "model": "gpt-4o"}, slang=slang_toggle) as s:
+            # Gedeelde limiet over alle sessies en processen: bij drukte even wachten
+            response = get_rate_limiter().call(
+                "openai",
+                self.client.chat.completions.create,
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=400,
+                temperature=0.9
+            )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                s.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
         
         return response.choices[0].message.content
 
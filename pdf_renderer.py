@@ -0,0 +1,228 @@
+import contextvars
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from storage import data_path
+from tracing import span
+
+# Verhoog deze versie wanneer de rendering wijzigt (viewport, PDF opties, ...):
+# oude cache-items worden dan niet meer gebruikt.
+RENDERER_VERSION = "playwright-chromium-a4-v1"
+
+
+class PdfCache:
+    """Begrensde PDF cache op schijf, gesleuteld op de hash van de HTML + renderer versie."""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_entries: int = 500,
+        max_bytes: int = 250 * 1024 * 1024
+    ):
+        """
+        Initialiseer de PdfCache.
+
+        Args:
+            directory: Map voor de cache (standaard `<data dir>/pdf-cache`)
+            max_entries: Maximum aantal PDF's in de cache
+            max_bytes: Maximum totale grootte van de cache in bytes
+        """
+        self.directory = Path(directory) if directory else data_path("pdf-cache")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(html: str) -> str:
+        """Cachesleutel voor een stuk HTML."""
+        digest = hashlib.sha256()
+        digest.update(RENDERER_VERSION.encode())
+        digest.update(b"\0")
+        digest.update(html.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Geef de gecachte PDF terug, of None als die er niet is."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # mtime bijwerken zodat recent gebruikte items het langst blijven (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, pdf_bytes: bytes) -> None:
+        """
+        Bewaar een PDF en ruim de oudste items op als de cache te groot wordt.
+
+        Raises:
+            OSError: Als de PDF niet weggeschreven kon worden (bv. schijf vol)
+        """
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_name, self._path(key))
+        finally:
+            # Na een mislukte schrijfactie geen .tmp achterlaten (_evict kijkt enkel naar *.pdf)
+            Path(tmp_name).unlink(missing_ok=True)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.pdf"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort(reverse=True)
+
+            total = 0
+            for i, (_, size, path) in enumerate(entries):
+                total += size
+                if i >= self.max_entries or total > self.max_bytes:
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+
+
+def render_pdf(html: str) -> bytes:
+    """
+    Render HTML naar een A4 PDF met Playwright (Chromium).
+
+    Raises:
+        ImportError: Als playwright niet geïnstalleerd is
+    """
+    from playwright.sync_api import sync_playwright
+
+    # Create a temporary HTML file
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp_html:
+        tmp_html.write(html)
+        tmp_html_path = tmp_html.name
+
+    try:
+        # Use Playwright to generate PDF in A4 format
+        with span("pdf.render", html_chars=len(html)) as render, sync_playwright() as p:
+            with span("pdf.launch"):
+                browser = p.chromium.launch(headless=True)
+            with span("pdf.load"):
+                # Set viewport to A4 dimensions (210mm x 297mm at 96 DPI ≈ 794x1123px)
+                page = browser.new_page(viewport={'width': 794, 'height': 1123}, device_scale_factor=1)
+                page.goto(f"file://{tmp_html_path}")
+                # Wait for fonts and images to load
+                page.wait_for_load_state('networkidle')
+                page.wait_for_timeout(2000)  # Extra time for fonts to load
+            with span("pdf.print"):
+                # Generate PDF in A4 format with proper scaling
+                pdf_bytes = page.pdf(
+                    format='A4',
+                    print_background=True,
+                    margin={'top': '0', 'right': '0', 'bottom': '0', 'left': '0'},
+                    scale=1.0,
+                    prefer_css_page_size=True  # Use CSS @page size
+                )
+            browser.close()
+            render.set(bytes=len(pdf_bytes))
+        return pdf_bytes
+    finally:
+        # Clean up temp file
+        if os.path.exists(tmp_html_path):
+            os.unlink(tmp_html_path)
+
+
+_default_cache: Optional[PdfCache] = None
+
+# Achtergrond-rendering: gedeeld over alle sessies van het proces
+PDF_WORKERS = int(os.getenv("SINTERKLAAS_PDF_WORKERS", "2"))
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def _get_default_cache() -> PdfCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PdfCache()
+    return _default_cache
+
+
+def get_pdf(html: str, cache: Optional[PdfCache] = None) -> bytes:
+    """
+    Geef de PDF voor een stuk HTML, uit de cache indien mogelijk.
+
+    Args:
+        html: De finale HTML van de brief (zoals LetterGenerator.generate_html die maakt)
+        cache: Te gebruiken cache (standaard een gedeelde cache in de data map)
+
+    Returns:
+        PDF bytes
+    """
+    cache = cache or _get_default_cache()
+    key = cache.key(html)
+    pdf_bytes = cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = render_pdf(html)
+        try:
+            cache.put(key, pdf_bytes)
+        except OSError as e:
+            # De PDF is gerenderd; enkel de cache faalde
+            print(f"Waarschuwing: PDF kon niet gecachet worden: {e}")
+    return pdf_bytes
+
+
+def submit_pdf(html: str, cache: Optional[PdfCache] = None) -> Future:
+    """
+    Start het renderen van een PDF op een achtergrondthread.
+
+    Een PDF die al in de cache zit geeft meteen een afgewerkte Future terug;
+    dezelfde HTML die al gerenderd wordt deelt de lopende job.
+
+    Args:
+        html: De finale HTML van de brief
+        cache: Te gebruiken cache (standaard de gedeelde cache)
+
+    Returns:
+        Future met de PDF bytes als resultaat
+    """
+    global _executor
+    cache = cache or _get_default_cache()
+    key = cache.key(html)
+
+    cached = cache.get(key)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf-render")
+        # Met de context van de aanroeper: de render span hangt onder diens span
+        future = _executor.submit(contextvars.copy_context().run, get_pdf, html, cache)
+        _pending[key] = future
+
+    def _forget(_):
+        with _pending_lock:
+            _pending.pop(key, None)
+
+    future.add_done_callback(_forget)
+    return future
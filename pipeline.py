@@ -0,0 +1,160 @@
+"""
+Kleine pipeline engine: stappen met afhankelijkheden (een DAG) parallel uitvoeren.
+
+Elke stap start zodra al zijn afhankelijkheden klaar zijn en krijgt hun resultaten
+als keyword arguments mee. Onafhankelijke takken (bv. brief/PDF naast TTS → video)
+lopen zo tegelijk; de totale duur is die van de langste tak.
+
+    pipeline = Pipeline()
+    pipeline.add("audio", lambda: audio_gen.generate(tekst))
+    pipeline.add("video", lambda audio: video_gen.generate(audio), deps=["audio"])
+    pipeline.add("brief", lambda: letter_gen.generate_html(tekst))
+    results = pipeline.run(on_result=toon)
+
+De stappen draaien op worker threads; `on_result` en `on_tick` worden in de
+thread van de aanroeper uitgevoerd, zodat die veilig UI (Streamlit) kunnen aanpassen.
+"""
+
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+class PipelineError(Exception):
+    """Fout in de opbouw van een pipeline (onbekende of cyclische afhankelijkheid)."""
+
+
+class SkippedError(Exception):
+    """Een stap werd overgeslagen omdat een afhankelijkheid mislukte."""
+
+
+@dataclass
+class _Step:
+    name: str
+    fn: Callable[..., Any]
+    deps: tuple[str, ...]
+
+
+@dataclass
+class StepResult:
+    """Resultaat van één stap."""
+
+    name: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Pipeline:
+    """Voert stappen uit in afhankelijkheidsvolgorde, onafhankelijke stappen parallel."""
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Initialiseer de Pipeline.
+
+        Args:
+            max_workers: Maximum aantal stappen dat tegelijk loopt
+        """
+        self.max_workers = max_workers
+        self._steps: dict[str, _Step] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Optional[list[str]] = None) -> "Pipeline":
+        """
+        Voeg een stap toe.
+
+        Args:
+            name: Unieke naam van de stap
+            fn: Functie die de resultaten van `deps` als keyword arguments krijgt
+            deps: Namen van stappen die eerst klaar moeten zijn
+        """
+        if name in self._steps:
+            raise PipelineError(f"Stap '{name}' bestaat al")
+        self._steps[name] = _Step(name, fn, tuple(deps or ()))
+        return self
+
+    def _validate(self) -> None:
+        for step in self._steps.values():
+            for dep in step.deps:
+                if dep not in self._steps:
+                    raise PipelineError(f"Stap '{step.name}' hangt af van onbekende stap '{dep}'")
+        # Cycli opsporen (diepte-eerst)
+        state: dict[str, int] = {}
+
+        def visit(name: str, path: list[str]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise PipelineError(f"Cyclische afhankelijkheid: {' → '.join(path + [name])}")
+            state[name] = 1
+            for dep in self._steps[name].deps:
+                visit(dep, path + [name])
+            state[name] = 2
+
+        for name in self._steps:
+            visit(name, [])
+
+    def run(
+        self,
+        on_result: Optional[Callable[[StepResult], None]] = None,
+        on_tick: Optional[Callable[[], None]] = None,
+        tick: float = 0.2
+    ) -> dict[str, StepResult]:
+        """
+        Voer alle stappen uit.
+
+        Args:
+            on_result: Callback per afgewerkte (of overgeslagen) stap, zodra die klaar is
+            on_tick: Callback die tijdens het wachten om de `tick` seconden aangeroepen wordt
+                (bv. om voortgangsmeldingen van de workers te tonen)
+            tick: Interval voor on_tick in seconden
+
+        Returns:
+            Resultaat per stap
+        """
+        self._validate()
+        results: dict[str, StepResult] = {}
+        running: dict[Future, tuple[str, float]] = {}
+        pending = dict(self._steps)
+
+        def finish(result: StepResult) -> None:
+            results[result.name] = result
+            if on_result:
+                on_result(result)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                # Stappen starten (of overslaan) waarvan alle afhankelijkheden klaar zijn
+                for name, step in list(pending.items()):
+                    if not all(dep in results for dep in step.deps):
+                        continue
+                    del pending[name]
+                    failed = [dep for dep in step.deps if not results[dep].ok]
+                    if failed:
+                        finish(StepResult(name, error=SkippedError(f"Overgeslagen: '{failed[0]}' mislukte")))
+                        continue
+                    kwargs = {dep: results[dep].value for dep in step.deps}
+                    # Elke stap met de context van de aanroeper (o.a. de lopende span, zie tracing.py)
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, step.fn, **kwargs)] = (name, time.monotonic())
+
+                if not running:
+                    # Enkel overgeslagen stappen in deze ronde: opnieuw kijken wat klaar is
+                    continue
+
+                done, _ = wait(running, timeout=tick, return_when=FIRST_COMPLETED)
+                if on_tick:
+                    on_tick()
+                for future in done:
+                    name, started = running.pop(future)
+                    seconds = time.monotonic() - started
+                    try:
+                        finish(StepResult(name, value=future.result(), seconds=seconds))
+                    except Exception as e:
+                        finish(StepResult(name, error=e, seconds=seconds))
+        return results
@@ -0,0 +1,354 @@
+"""
+Gedeelde rate limits per provider, over threads en processen heen.
+
+OpenAI, ElevenLabs en HeyGen begrenzen het aantal requests per minuut en/of het
+aantal gelijktijdige calls per account. Elke provider krijgt hier een token bucket
+(requests per minuut) en/of een maximum aantal gelijktijdige leases. De toestand
+staat in `.sinterklaas/limits.db` (SQLite, WAL): alle sessies, workers en batch
+processen op dezelfde machine delen dezelfde limiet. Wie geen plaats krijgt,
+wacht; een piek wordt een korte wachtrij in plaats van een regen 429's.
+
+Komt er toch een 429 (limiet te ruim ingesteld, of een ander systeem op dezelfde
+key), dan pauzeert `penalize` de provider voor iedereen tot Retry-After voorbij is.
+
+    limiter = get_rate_limiter()
+    with limiter.limit("elevenlabs"):
+        ...
+    limiter.call("openai", client.chat.completions.create, model=..., messages=...)
+
+Providers (te overschrijven via `<PROVIDER>_RPM` en `<PROVIDER>_MAX_CONCURRENT`):
+    openai       GPT-4o completions
+    openai-tts   OpenAI TTS
+    elevenlabs   ElevenLabs TTS
+    heygen       gelijktijdige HeyGen renders (HEYGEN_MAX_CONCURRENT)
+    heygen-api   HTTP requests naar de HeyGen API
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from storage import connect
+from tracing import annotate
+
+
+class RateLimitTimeout(TimeoutError):
+    """Geen plaats gekregen binnen de timeout."""
+
+
+@dataclass(frozen=True)
+class ProviderLimit:
+    """Limieten van één provider; None betekent onbeperkt."""
+
+    per_minute: Optional[float] = None
+    max_concurrent: Optional[int] = None
+    # Tokens die zich mogen opsparen (standaard tien seconden aan requests)
+    burst: Optional[float] = None
+    # Een lease van een proces dat crasht op een andere machine vervalt na zoveel seconden
+    lease_seconds: float = 600.0
+
+    @property
+    def capacity(self) -> float:
+        if self.burst is not None:
+            return max(1.0, self.burst)
+        return max(1.0, (self.per_minute or 0) / 6)
+
+
+# Standaardlimieten van de kleinste betaalde plannen
+DEFAULT_LIMITS = {
+    "openai": ProviderLimit(per_minute=500),
+    "openai-tts": ProviderLimit(per_minute=500),
+    "elevenlabs": ProviderLimit(max_concurrent=5),
+    # Een render houdt zijn lease vast tot de video klaar is (zie video_scheduler.py)
+    "heygen": ProviderLimit(max_concurrent=3, lease_seconds=3600.0),
+    "heygen-api": ProviderLimit(per_minute=300),
+}
+
+
+def provider_limit(provider: str) -> ProviderLimit:
+    """Limiet van een provider: de standaard, aangepast met `<PROVIDER>_RPM` en `<PROVIDER>_MAX_CONCURRENT`."""
+    default = DEFAULT_LIMITS.get(provider, ProviderLimit())
+    prefix = provider.upper().replace("-", "_")
+    per_minute = os.getenv(f"{prefix}_RPM")
+    max_concurrent = os.getenv(f"{prefix}_MAX_CONCURRENT")
+    return ProviderLimit(
+        per_minute=float(per_minute) if per_minute else default.per_minute,
+        max_concurrent=int(max_concurrent) if max_concurrent else default.max_concurrent,
+        burst=default.burst,
+        lease_seconds=default.lease_seconds,
+    )
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Of een fout van een provider SDK een 429 is (OpenAI, ElevenLabs, requests)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Retry-After (seconden) uit de response van een fout, indien aanwezig."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, min(float(value), 60.0)) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+WaitCallback = Callable[[float], None]
+
+
+class RateLimiter:
+    """Token buckets en concurrency leases per provider, gedeeld via SQLite."""
+
+    def __init__(
+        self,
+        db_name: str = "limits.db",
+        limits: Optional[dict[str, ProviderLimit]] = None,
+        poll_interval: float = 0.25
+    ):
+        """
+        Initialiseer de RateLimiter.
+
+        Args:
+            db_name: SQLite database in de data map
+            limits: Vaste limieten per provider (standaard via provider_limit)
+            poll_interval: Hoe vaak een wachtende opnieuw kijkt of er een lease vrij is
+        """
+        self._db_name = db_name
+        self._local = threading.local()
+        self._limits = dict(limits or {})
+        self._limits_lock = threading.Lock()
+        self.poll_interval = poll_interval
+        self._host = socket.gethostname()
+
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                provider TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                id TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                acquired_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS leases_provider ON leases (provider);
+            """
+        )
+
+    def _conn(self):
+        # Eigen verbinding per thread, en opnieuw na een fork (batch en worker processen)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect(self._db_name)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def limit_for(self, provider: str) -> ProviderLimit:
+        with self._limits_lock:
+            limit = self._limits.get(provider)
+            if limit is None:
+                limit = self._limits[provider] = provider_limit(provider)
+            return limit
+
+    # --- Plaatsen nemen en vrijgeven ----------------------------------------
+
+    def _try_acquire(self, provider: str, limit: ProviderLimit) -> tuple[Optional[str], float]:
+        """
+        Eén poging, in één transactie.
+
+        Returns:
+            (lease id of None, wachttijd): wachttijd 0 betekent gelukt
+        """
+        conn = self._conn()
+        now = time.time()
+        capacity = limit.capacity
+        rate = limit.per_minute / 60 if limit.per_minute else None
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE provider = ?", (provider,)
+            ).fetchone()
+            if row is None:
+                tokens, blocked_until = capacity, 0.0
+            else:
+                blocked_until = row["blocked_until"]
+                elapsed = max(0.0, now - row["updated_at"])
+                tokens = min(capacity, row["tokens"] + elapsed * rate) if rate else capacity
+
+            wait = 0.0
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif rate and tokens < 1:
+                wait = (1 - tokens) / rate
+            elif limit.max_concurrent and self._running(conn, provider, now) >= limit.max_concurrent:
+                wait = self.poll_interval
+
+            lease_id = None
+            if wait == 0.0:
+                if rate:
+                    tokens -= 1
+                if limit.max_concurrent:
+                    lease_id = uuid.uuid4().hex
+                    conn.execute(
+                        "INSERT INTO leases (id, provider, host, pid, acquired_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (lease_id, provider, self._host, os.getpid(), now, now + limit.lease_seconds)
+                    )
+            conn.execute(
+                "INSERT INTO buckets (provider, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(provider) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (provider, tokens, now, blocked_until)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return lease_id, wait
+
+    def _running(self, conn, provider: str, now: float) -> int:
+        """Aantal geldige leases; ruimt verlopen leases en die van gecrashte processen op."""
+        conn.execute("DELETE FROM leases WHERE provider = ? AND expires_at < ?", (provider, now))
+        rows = conn.execute("SELECT id, host, pid FROM leases WHERE provider = ?", (provider,)).fetchall()
+        stale = [row["id"] for row in rows if row["host"] == self._host and not _pid_alive(row["pid"])]
+        conn.executemany("DELETE FROM leases WHERE id = ?", [(lease_id,) for lease_id in stale])
+        return len(rows) - len(stale)
+
+    def acquire(
+        self,
+        provider: str,
+        timeout: Optional[float] = None,
+        on_wait: Optional[WaitCallback] = None
+    ) -> Optional[str]:
+        """
+        Wacht op een token en, bij een concurrency limiet, een lease.
+
+        Args:
+            provider: Naam van de provider (zie DEFAULT_LIMITS)
+            timeout: Maximum aantal seconden wachten (None = onbeperkt)
+            on_wait: Callback met de geschatte wachttijd, telkens voor er gewacht wordt
+
+        Returns:
+            Lease id (geef vrij met release), of None als de provider geen concurrency limiet heeft
+
+        Raises:
+            RateLimitTimeout: Als er binnen de timeout geen plaats vrijkwam
+        """
+        limit = self.limit_for(provider)
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        while True:
+            lease_id, wait = self._try_acquire(provider, limit)
+            if wait == 0.0:
+                if time.monotonic() - started > 0.001:
+                    # Zichtbaar in de trace van de stap die moest wachten
+                    annotate(ratelimit_wait_seconds=round(time.monotonic() - started, 3))
+                return lease_id
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Geen plaats bij {provider} binnen {timeout:.0f} seconden")
+            if on_wait:
+                on_wait(wait)
+            # Wat jitter, zodat wachtende processen niet allemaal tegelijk terugkomen
+            time.sleep(min(wait, 5.0) * random.uniform(1.0, 1.2))
+
+    def release(self, lease_id: Optional[str]) -> None:
+        """Geef een lease vrij (None wordt genegeerd)."""
+        if lease_id is not None:
+            self._conn().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    @contextmanager
+    def limit(self, provider: str, timeout: Optional[float] = None, on_wait: Optional[WaitCallback] = None):
+        """Context manager rond acquire/release."""
+        lease_id = self.acquire(provider, timeout, on_wait)
+        try:
+            yield
+        finally:
+            self.release(lease_id)
+
+    def penalize(self, provider: str, seconds: float) -> None:
+        """Pauzeer een provider voor alle processen (na een 429), en leeg de bucket."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO buckets (provider, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?) "
+            "ON CONFLICT(provider) DO UPDATE SET tokens = 0, updated_at = excluded.updated_at, "
+            "blocked_until = MAX(blocked_until, excluded.blocked_until)",
+            (provider, now, now + seconds)
+        )
+
+    def call(self, provider: str, fn: Callable, *args, retries: int = 3, **kwargs):
+        """
+        Voer fn(*args, **kwargs) uit binnen de limiet van een provider.
+
+        Bij een 429 wordt de provider voor iedereen gepauzeerd (Retry-After, anders
+        exponentieel) en de call daarna opnieuw geprobeerd, tot `retries` keer.
+        """
+        attempt = 0
+        while True:
+            with self.limit(provider):
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt >= retries:
+                        raise
+                    delay = retry_after(e) or min(60.0, 2.0 * 2 ** attempt)
+            print(f"⏳ {provider} rate limit: {delay:.1f}s pauze voor alle sessies")
+            self.penalize(provider, delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Momentopname per provider (voor monitoring)."""
+        conn = self._conn()
+        now = time.time()
+        result = {}
+        for row in conn.execute("SELECT provider, tokens, blocked_until FROM buckets"):
+            result[row["provider"]] = {
+                "tokens": round(row["tokens"], 2),
+                "blocked_for": max(0.0, row["blocked_until"] - now),
+                "running": 0,
+            }
+        for row in conn.execute(
+            "SELECT provider, COUNT(*) AS running FROM leases WHERE expires_at >= ? GROUP BY provider", (now,)
+        ):
+            result.setdefault(row["provider"], {"tokens": None, "blocked_for": 0.0})["running"] = row["running"]
+        return result
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) beëindigt het proces op Windows: enkel op de vervaltijd vertrouwen
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Gedeelde RateLimiter voor het proces."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Sinterklaas zonder de Streamlit UI.
+
+    python sinterklaas.py batch klas.csv uitvoer/            # tekst → audio → brief PDF per kind
+    python sinterklaas.py batch klas.csv uitvoer/ --video    # ook een HeyGen video
+    python sinterklaas.py batch klas.csv uitvoer/ -j 8       # acht processen
+
+De roster is een CSV (komma, puntkomma of tab) met een kolom `naam` en optioneel
+`leeftijd`, `geslacht`, `anekdote`, `verlanglijstje`, `zeker_item`, `schoentje_gezet`,
+`slang` en `tekst` (een eigen tekst: dan wordt er geen tekst gegenereerd).
+
+Per kind komt er een map `uitvoer/<nr>_<naam>/` met `tekst.txt`, `audio.mp3`,
+`brief.pdf` en eventueel `video.mp4`. In `uitvoer/manifest.jsonl` staat per kind het
+resultaat; een onderbroken batch hervat daar: afgewerkte kinderen (met dezelfde
+invoer) worden overgeslagen en stappen waarvan het bestand al bestaat ook. Het
+bestand `.key` in de map onthoudt voor welke invoer die bestanden gemaakt werden:
+wijzigt de rij (of de opties), dan worden de oude bestanden eerst verwijderd.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+STAGES = ("tekst", "audio", "pdf", "video")
+STAGE_FILES = ("tekst.txt", "audio.mp3", "brief.pdf", "video.mp4")
+KEY_FILE = ".key"
+
+ROSTER_DEFAULTS = {
+    "leeftijd": "5",
+    "geslacht": "Jongen",
+    "anekdote": "(Geen specifieke notitie)",
+    "verlanglijstje": "(Geen verlanglijstje)",
+    "zeker_item": "(Geen specifiek item)",
+    "schoentje_gezet": "Nee",
+    "slang": "ja",
+}
+
+
+def read_roster(path: Path) -> list[dict]:
+    """
+    Lees de roster; kolomnamen zijn hoofdletterongevoelig.
+
+    Raises:
+        ValueError: Als de kolom `naam` ontbreekt
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        rows = []
+        for raw in reader:
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in raw.items()}
+            if any(row.values()):
+                rows.append(row)
+    if rows and "naam" not in rows[0]:
+        raise ValueError(f"Kolom 'naam' ontbreekt in {path} (gevonden: {', '.join(rows[0])})")
+    return [row for row in rows if row.get("naam")]
+
+
+def _slug(text: str) -> str:
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-zA-Z0-9]+", "-", ascii_text).strip("-").lower() or "kind"
+
+
+def row_key(row: dict, options: dict) -> str:
+    """Hash van de invoer van een kind: verandert de rij of de opties, dan wordt die opnieuw gemaakt."""
+    encoded = json.dumps({"row": row, "options": options}, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _message_args(row: dict) -> dict:
+    values = {**ROSTER_DEFAULTS, **{key: value for key, value in row.items() if value}}
+    return dict(
+        naam=values["naam"],
+        leeftijd=int(values["leeftijd"]),
+        geslacht=values["geslacht"],
+        anekdote=values["anekdote"],
+        verlanglijstje=values["verlanglijstje"],
+        zeker_item=values["zeker_item"],
+        schoentje_gezet="Ja" if values["schoentje_gezet"].lower() in ("ja", "yes", "1", "true") else "Nee",
+        slang_toggle=values["slang"].lower() in ("ja", "yes", "1", "true"),
+    )
+
+
+def _init_process() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def _reset_if_stale(out: Path, key: str) -> None:
+    """Verwijder bestanden die voor een andere invoer gemaakt werden en onthoud de huidige sleutel."""
+    marker = out / KEY_FILE
+    try:
+        if marker.read_text(encoding="utf-8").strip() == key:
+            return
+    except FileNotFoundError:
+        pass
+    for name in STAGE_FILES:
+        for path in (out / name, out / f"{name}.part"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    marker.write_text(key, encoding="utf-8")
+
+
+def process_row(index: int, row: dict, directory: str, options: dict, key: str) -> dict:
+    """
+    Maak alles voor één kind (draait in een worker proces).
+
+    Args:
+        key: row_key van de rij; bestanden van een andere sleutel worden niet hergebruikt
+
+    Returns:
+        Manifest record met status, bestanden en tijd per stap
+    """
+    import generator_config
+
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    _reset_if_stale(out, key)
+    timings: dict[str, float] = {}
+    files: dict[str, str] = {}
+    warnings: list[str] = []
+
+    def stage(name: str, path: Path, make) -> None:
+        if path.exists() and path.stat().st_size > 0:
+            files[name] = str(path)
+            return
+        started = time.perf_counter()
+        data = make()
+        tmp = path.with_suffix(path.suffix + ".part")
+        if isinstance(data, str):
+            tmp.write_text(data, encoding="utf-8")
+        else:
+            tmp.write_bytes(data)
+        os.replace(tmp, path)
+        timings[name] = time.perf_counter() - started
+        files[name] = str(path)
+
+    try:
+        text_path = out / "tekst.txt"
+        if row.get("tekst"):
+            stage("tekst", text_path, lambda: row["tekst"])
+        else:
+            message_gen = generator_config.message_generator()
+            if message_gen is None:
+                raise RuntimeError("OPENAI_API_KEY ontbreekt")
+            stage("tekst", text_path, lambda: message_gen.generate(**_message_args(row)))
+        text = text_path.read_text(encoding="utf-8")
+
+        if options["audio"]:
+            audio_gen = generator_config.audio_generator()
+            if audio_gen is None:
+                raise RuntimeError("Geen ElevenLabs of OpenAI API key voor audio")
+            stage("audio", out / "audio.mp3", lambda: audio_gen.generate(text).getvalue())
+
+        if options["pdf"]:
+            from pdf_renderer import get_pdf
+
+            from letter_generator import OVERFLOW_WARNING
+
+            letter_gen = generator_config.letter_generator()
+            stage("pdf", out / "brief.pdf", lambda: get_pdf(letter_gen.generate_html(text, for_print=True)))
+            if not letter_gen.fits_on_page(text):
+                # De PDF is gemaakt maar afgeknipt: wel klaar, niet stil
+                warnings.append(OVERFLOW_WARNING)
+
+        if options["video"]:
+            stage("video", out / "video.mp4", lambda: _make_video(text, out / "audio.mp3", f"batch-{index}"))
+    except Exception as e:
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}", "files": files, "timings": timings,
+                "warnings": warnings}
+    return {"status": "done", "files": files, "timings": timings, "warnings": warnings}
+
+
+def _make_video(text: str, audio_path: Path, owner: str) -> bytes:
+    import generator_config
+    from heygen_client import audio_digest
+    from video_archive import get_video_archive
+    from video_jobs import request_key
+    from video_scheduler import get_scheduler
+
+    video_gen = generator_config.video_generator()
+    if video_gen is None:
+        raise RuntimeError("HEYGEN_API_KEY of HEYGEN_AVATAR_ID ontbreekt")
+    archive = get_video_archive()
+    audio_bytes = audio_path.read_bytes()
+    # Zelfde sleutel als de app: een video die daar al gemaakt werd komt uit het archief
+    key = request_key(text, video_gen.avatar_id, audio_digest(audio_bytes), type(video_gen).__name__)
+    video_path = archive.lookup(key)
+    if video_path is None:
+        with get_scheduler().slot(owner):
+            video_url = video_gen.generate(io.BytesIO(audio_bytes), request_key=key)
+        video_path = archive.store(key, video_url)
+    return video_path.read_bytes()
+
+
+def load_manifest(path: Path) -> dict[str, dict]:
+    """Laatste record per kind (op sleutel) uit het manifest."""
+    records: dict[str, dict] = {}
+    if not path.exists():
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Afgebroken laatste regel na een crash
+                continue
+            records[record["key"]] = record
+    return records
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def print_summary(records: list[dict], wall_seconds: float, skipped: int) -> None:
+    done = [record for record in records if record["status"] == "done"]
+    failed = [record for record in records if record["status"] == "failed"]
+    print("\n" + "=" * 60)
+    print(f"✅ {len(done)} klaar, ❌ {len(failed)} mislukt, ⏭️ {skipped} overgeslagen (al klaar)")
+    if records:
+        print(f"⏱️ {wall_seconds:.1f}s totaal, {len(records) / wall_seconds * 60:.1f} kinderen/minuut")
+    print(f"\n{'stap':<8} {'aantal':>6} {'gem.':>8} {'p95':>8} {'totaal':>9}")
+    for stage in STAGES:
+        values = [record["timings"][stage] for record in records if stage in record.get("timings", {})]
+        if values:
+            print(
+                f"{stage:<8} {len(values):>6} {statistics.mean(values):>7.1f}s "
+                f"{_percentile(values, 0.95):>7.1f}s {sum(values):>8.1f}s"
+            )
+    for record in failed[:10]:
+        print(f"\n❌ {record['naam']}: {record['error']}")
+    warned = [record for record in records if record.get("warnings")]
+    for record in warned[:10]:
+        print(f"\n⚠️ {record['naam']}: {'; '.join(record['warnings'])}")
+    if len(warned) > 10:
+        print(f"\n... en nog {len(warned) - 10} kinderen met een waarschuwing (zie manifest.jsonl)")
+    if len(failed) > 10:
+        print(f"\n... en nog {len(failed) - 10} mislukte kinderen (zie manifest.jsonl)")
+
+
+def batch(args) -> int:
+    roster = read_roster(Path(args.roster))
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    manifest_path = output / "manifest.jsonl"
+    previous = load_manifest(manifest_path)
+    options = {"audio": not args.no_audio or args.video, "pdf": not args.no_pdf, "video": args.video}
+
+    todo = []
+    skipped = skipped_failed = 0
+    for index, row in enumerate(roster, 1):
+        key = row_key(row, options)
+        record = previous.get(key)
+        if record and record["status"] == "done":
+            skipped += 1
+            continue
+        if record and record["status"] == "failed" and not args.retry_failed:
+            skipped_failed += 1
+            continue
+        directory = output / f"{index:03d}_{_slug(row['naam'])}"
+        todo.append((index, row, key, directory))
+
+    print(f"🎅 {len(roster)} kinderen in de roster, {len(todo)} te maken, {skipped} al gedaan")
+    if skipped_failed:
+        print(f"⚠️ {skipped_failed} eerder mislukte kinderen overgeslagen (opnieuw proberen met --retry-failed)")
+    if not todo:
+        return 0
+
+    records = []
+    started = time.perf_counter()
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_process) as pool:
+        futures = {
+            pool.submit(process_row, index, row, str(directory), options, key): (index, row, key)
+            for index, row, key, directory in todo
+        }
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, row, key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Worker proces gecrasht
+                    result = {"status": "failed", "error": f"{type(e).__name__}: {e}", "files": {}, "timings": {}}
+                record = {"key": key, "index": index, "naam": row["naam"], "finished_at": time.time(), **result}
+                manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+                manifest.flush()
+                records.append(record)
+                icon = "✅" if record["status"] == "done" else "❌"
+                warning = f" ⚠️ {'; '.join(record['warnings'])}" if record.get("warnings") else ""
+                print(f"{icon} [{len(records)}/{len(todo)}] {row['naam']}{warning}", flush=True)
+
+    print_summary(records, time.perf_counter() - started, skipped)
+    return 0 if all(record["status"] == "done" for record in records) else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sinterklaas boodschappen zonder de UI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="Audio, brieven (en video's) voor een hele roster")
+    batch_parser.add_argument("roster", help="CSV met minstens een kolom 'naam'")
+    batch_parser.add_argument("output", help="Uitvoermap (met manifest.jsonl)")
+    batch_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                              help="Aantal processen (standaard één per CPU core)")
+    batch_parser.add_argument("--video", action="store_true", help="Ook een HeyGen video per kind")
+    batch_parser.add_argument("--no-audio", action="store_true", help="Geen audio (enkel zonder --video)")
+    batch_parser.add_argument("--no-pdf", action="store_true", help="Geen brief PDF")
+    batch_parser.add_argument("--retry-failed", action="store_true", help="Mislukte kinderen opnieuw proberen")
+    batch_parser.set_defaults(func=batch)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Snelle koude start: browsercontrole zonder installatie en een opsplitsing van de opstarttijd.
+
+De Playwright browser wordt geïnstalleerd als build stap (`playwright install chromium`,
+zie .devcontainer/devcontainer.json en de README), niet meer bij het importeren van
+app.py. Bij het opstarten wordt enkel gekeken of Chromium op schijf staat; dat kost
+een paar stat() calls in plaats van een subprocess en een download.
+
+Waar geen build stap mogelijk is (bv. Streamlit Community Cloud) kan
+SINTERKLAAS_INSTALL_BROWSER=1 gezet worden: ontbreekt de browser, dan wordt die op een
+achtergrondthread geïnstalleerd zonder de opstart op te houden.
+
+    python startup.py            # browsercontrole + importtijden per module
+    python startup.py --check    # enkel browsercontrole (exit code 1 als die ontbreekt)
+"""
+
+import glob
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class BrowserStatus:
+    """Resultaat van de browsercontrole."""
+
+    available: bool
+    detail: str
+
+
+def _playwright_browsers_dir() -> Optional[Path]:
+    """Map waarin Playwright zijn browsers zet (zelfde regels als Playwright zelf)."""
+    custom = os.getenv("PLAYWRIGHT_BROWSERS_PATH")
+    if custom == "0":
+        # Browsers in het playwright package zelf
+        spec = importlib.util.find_spec("playwright")
+        if spec is None or not spec.submodule_search_locations:
+            return None
+        return Path(list(spec.submodule_search_locations)[0]) / "driver" / "package" / ".local-browsers"
+    if custom:
+        return Path(custom)
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "ms-playwright"
+    if sys.platform == "win32":
+        return Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / "ms-playwright"
+    return Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "ms-playwright"
+
+
+def check_browser() -> BrowserStatus:
+    """
+    Kijk of PDF rendering mogelijk is, zonder Playwright te importeren of Chromium te starten.
+
+    Returns:
+        BrowserStatus met een korte uitleg
+    """
+    if importlib.util.find_spec("playwright") is None:
+        return BrowserStatus(False, "playwright is niet geïnstalleerd (`pip install playwright`)")
+    browsers_dir = _playwright_browsers_dir()
+    if browsers_dir is None or not browsers_dir.is_dir():
+        return BrowserStatus(False, "Chromium ontbreekt (`playwright install chromium`)")
+    found = sorted(
+        glob.glob(str(browsers_dir / "chromium-*")) + glob.glob(str(browsers_dir / "chromium_headless_shell-*"))
+    )
+    if not found:
+        return BrowserStatus(False, f"Chromium ontbreekt in {browsers_dir} (`playwright install chromium`)")
+    return BrowserStatus(True, found[-1])
+
+
+_install_thread: Optional[threading.Thread] = None
+_install_lock = threading.Lock()
+
+
+def install_browser_in_background() -> Optional[threading.Thread]:
+    """
+    Installeer Chromium op een achtergrondthread (hooguit één keer per proces).
+
+    Enkel bedoeld voor omgevingen zonder build stap; PDF's lukken pas als die klaar is.
+    """
+    global _install_thread
+    with _install_lock:
+        if _install_thread is not None:
+            return _install_thread
+
+        def run():
+            print("Installing Playwright Chromium (achtergrond)...")
+            # We installeren alleen chromium om ruimte te besparen
+            subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"], check=False)
+
+        _install_thread = threading.Thread(target=run, name="playwright-install", daemon=True)
+        _install_thread.start()
+        return _install_thread
+
+
+class StartupTimer:
+    """Meet hoe lang de opeenvolgende fasen van de opstart duren."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """Sluit een fase af: de tijd sinds de vorige mark (of de start) telt voor `phase`."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        """Leesbare opsplitsing, bv. voor de logs."""
+        lines = [f"Opstart: {self.total * 1000:.0f} ms"]
+        for phase, seconds in self.phases:
+            lines.append(f"  {phase:<30} {seconds * 1000:7.0f} ms")
+        return "\n".join(lines)
+
+
+_reported = False
+_reported_lock = threading.Lock()
+
+
+def log_once(timer: StartupTimer) -> bool:
+    """
+    Print de opsplitsing van de eerste (koude) run van het proces.
+
+    Streamlit voert het script bij elke interactie opnieuw uit; enkel de eerste
+    run zegt iets over de koude start.
+
+    Returns:
+        True als er gelogd werd
+    """
+    global _reported
+    with _reported_lock:
+        if _reported:
+            return False
+        _reported = True
+    print(timer.report(), flush=True)
+    return True
+
+
+# Modules die app.py laadt, in dezelfde volgorde (voor `python startup.py`)
+APP_MODULES = [
+    "streamlit",
+    "dotenv",
+    "tracing",
+    "rate_limiter",
+    "message_generator",
+    "audio_generator",
+    "video_generator",
+    "video_generator_v1",
+    "letter_generator",
+    "image_variants",
+    "pdf_renderer",
+    "webhook_receiver",
+    "video_scheduler",
+    "video_events",
+    "streamlit_progress",
+    "avatar_catalog",
+    "artifact_store",
+    "video_archive",
+    "video_jobs",
+    "pipeline",
+    "generator_registry",
+    "generator_config",
+    "job_queue",
+]
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Browsercontrole en opstarttijden")
+    parser.add_argument("--check", action="store_true", help="Enkel de browsercontrole (voor build/health checks)")
+    args = parser.parse_args(argv)
+
+    status = check_browser()
+    print(f"{'✅' if status.available else '❌'} PDF browser: {status.detail}")
+    if args.check:
+        return 0 if status.available else 1
+
+    timer = StartupTimer()
+    for module in APP_MODULES:
+        try:
+            __import__(module)
+        except ImportError as e:
+            print(f"⚠️ {module}: {e}")
+        timer.mark(f"import {module}")
+    print(timer.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+from pathlib import Path
+
+
+def data_dir() -> Path:
+    """
+    Map voor lokale caches en opslag van de app.
+    
+    Standaard `.sinterklaas/` naast de code, te overschrijven met
+    de omgevingsvariabele `SINTERKLAAS_DATA_DIR`.
+    """
+    configured = os.getenv("SINTERKLAAS_DATA_DIR")
+    return Path(configured) if configured else Path(__file__).parent / ".sinterklaas"
+
+
+def data_path(*parts: str) -> Path:
+    """Geef een submap van de data map terug en maak die aan indien nodig."""
+    path = data_dir().joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def connect(name: str) -> sqlite3.Connection:
+    """
+    Open een SQLite database in de data map.
+    
+    WAL modus laat lezers en één schrijver tegelijk toe, ook over processen heen;
+    de busy timeout vangt korte schrijfconflicten op.
+    
+    Args:
+        name: Bestandsnaam van de database (bv. "heygen.db")
+    """
+    conn = sqlite3.connect(data_path() / name, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
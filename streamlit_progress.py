@@ -0,0 +1,82 @@
+"""
+Streamlit weergave voor de VideoEvents van de video generators.
+
+Gebruik in de Streamlit thread:
+
+    progress = StreamlitVideoProgress()
+    try:
+        video_url = video_gen.generate(audio_bytes, on_event=progress)
+    except VideoGenerationError as e:
+        progress.show_error(e)
+
+Streamlit elementen mogen enkel vanuit de script thread aangepast worden. Draait
+de generator elders (thread, worker), verzamel de events dan in een queue en
+geef ze in de script thread door aan deze klasse.
+"""
+
+from typing import Optional
+
+import streamlit as st
+
+from video_events import (
+    CANCELLED,
+    COMPLETED,
+    POLL_ERROR,
+    STATUS,
+    AssetUploadError,
+    EmptyAudioError,
+    VideoEvent,
+    VideoStartError,
+)
+from video_polling import VideoPollCancelled, VideoPollTimeout, VideoRenderFailed
+
+
+class StreamlitVideoProgress:
+    """Callback die VideoEvents toont als Streamlit meldingen en een voortgangsbalk."""
+
+    def __init__(self):
+        self._progress_bar = None
+        self._status_text = None
+        self._last_status: Optional[str] = None
+
+    def __call__(self, event: VideoEvent) -> None:
+        if event.kind in (STATUS, POLL_ERROR, CANCELLED):
+            self._ensure_progress()
+            if event.progress is not None:
+                self._progress_bar.progress(event.progress)
+            status = event.data.get("status", event.kind)
+            if status != self._last_status or event.kind == POLL_ERROR:
+                # Enkel echte statusovergangen tonen
+                self._last_status = status
+                self._status_text.text(event.message)
+            return
+
+        if event.kind == COMPLETED and self._progress_bar is not None:
+            self._progress_bar.progress(100)
+            self._status_text.text("Status: Klaar!")
+
+        show = {"success": st.success, "warning": st.warning, "error": st.error}.get(event.level, st.info)
+        show(event.message)
+
+    def show_error(self, error: Exception) -> None:
+        """Toon een VideoGenerationError zoals de generators dat vroeger zelf deden."""
+        if isinstance(error, VideoPollCancelled):
+            self._ensure_progress()
+            self._status_text.text("Status: geannuleerd")
+        elif isinstance(error, VideoPollTimeout):
+            st.error(f"⌛ {error}. De video wordt mogelijk later nog klaar (video ID: {error.video_id}).")
+        elif isinstance(error, VideoRenderFailed):
+            st.error(f"❌ Renderen mislukt: {error}")
+        elif isinstance(error, EmptyAudioError):
+            st.error(f"❌ {error}")
+        elif isinstance(error, AssetUploadError):
+            st.error(f"❌ Audio upload mislukt, kan niet starten met genereren. {error}")
+        elif isinstance(error, VideoStartError):
+            st.error(f"❌ Video generatie kon niet starten: {error}")
+        else:
+            st.error(f"❌ {error}")
+
+    def _ensure_progress(self) -> None:
+        if self._progress_bar is None:
+            self._progress_bar = st.progress(0)
+            self._status_text = st.empty()
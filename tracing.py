@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Lichte tracing per stap: waar gaat de tijd van een aanvraag naartoe?
+
+Elke stap (GPT-4o, ElevenLabs, pydub padding, HeyGen upload/start/wachtrij/polling,
+Chromium starten, PDF printen, ...) wordt een span met een naam, een duur, een status
+en attributen. Spans binnen een span worden kinderen ervan (via contextvars, dus ook
+per thread en over `copy_context()` heen), zodat één aanvraag als boom te volgen is.
+
+Afgewerkte spans komen als één JSON regel in `<data dir>/traces.jsonl` (te wijzigen met
+SINTERKLAAS_TRACE_FILE). Alle processen (Streamlit, workers, API) schrijven naar
+hetzelfde bestand; de Prometheus metrics worden daaruit opgebouwd, zodat één endpoint
+de tijden van alle processen toont. SINTERKLAAS_TRACING=0 zet alles uit.
+
+    with span("audio.elevenlabs", labels={"provider": "elevenlabs"}, chars=len(text)) as s:
+        ...
+        s.set(bytes=size)
+
+    @traced("audio.padding")
+    def _add_silence_padding(...): ...
+
+`labels` worden Prometheus labels (houd ze klein in aantal waarden), gewone attributen
+komen enkel in het trace bestand.
+
+    python tracing.py summary             # p50/p95/p99 per stap
+    python tracing.py metrics             # Prometheus tekstformaat
+    python tracing.py serve --port 9464   # /metrics voor Prometheus
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from storage import data_path
+
+DEFAULT_METRICS_PORT = 9464
+
+# Grenzen van de histogram buckets (seconden): van een credit check tot een HeyGen render
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+OK = "ok"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+class Span:
+    """Eén gemeten stap."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "labels", "attributes",
+                 "start_time", "_started", "duration", "status", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], labels: dict, attributes: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(8)
+        self.span_id = secrets.token_hex(4)
+        self.parent_id = parent.span_id if parent else None
+        self.labels = labels
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = OK
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> "Span":
+        """Voeg attributen toe (enkel in het trace bestand)."""
+        self.attributes.update(attributes)
+        return self
+
+    def label(self, **labels) -> "Span":
+        """Voeg labels toe (ook in de metrics), bv. welke engine het uiteindelijk werd."""
+        self.labels.update({key: str(value) for key, value in labels.items()})
+        return self
+
+    def to_record(self) -> dict:
+        return {
+            "ts": datetime.fromtimestamp(self.start_time, timezone.utc).isoformat(timespec="milliseconds"),
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "labels": self.labels,
+            "attributes": self.attributes,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("sinterklaas_span", default=None)
+
+
+class Tracer:
+    """Maakt spans en schrijft afgewerkte spans naar het trace bestand."""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        enabled: Optional[bool] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Initialiseer de Tracer.
+
+        Args:
+            path: Trace bestand (standaard SINTERKLAAS_TRACE_FILE of `<data dir>/traces.jsonl`)
+            enabled: Of er getraced wordt (standaard SINTERKLAAS_TRACING, aan tenzij "0")
+            max_bytes: Grootte waarboven het bestand naar `.1` geroteerd wordt
+                (standaard SINTERKLAAS_TRACE_MAX_MB, of 50 MB)
+        """
+        configured = os.getenv("SINTERKLAAS_TRACE_FILE")
+        self.path = Path(path or configured or data_path() / "traces.jsonl")
+        self.enabled = os.getenv("SINTERKLAAS_TRACING", "1") != "0" if enabled is None else enabled
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("SINTERKLAAS_TRACE_MAX_MB", "50")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, labels: Optional[dict] = None, **attributes) -> Iterator[Span]:
+        """
+        Meet een stap; een exception zet de status op "error" en wordt gewoon doorgegeven.
+
+        Args:
+            name: Naam van de stap, bv. "video.upload"
+            labels: Labels voor de metrics (weinig verschillende waarden)
+            **attributes: Extra informatie voor het trace bestand
+
+        Yields:
+            De Span (ook als tracing uit staat, dan wordt die enkel niet weggeschreven)
+        """
+        current = Span(name, _current.get(), {key: str(value) for key, value in (labels or {}).items()}, attributes)
+        token = _current.set(current)
+        try:
+            yield current
+        except Exception as e:
+            current.status = ERROR
+            current.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        except BaseException as e:
+            # Onderbreking (rerun, Ctrl+C): geen fout van de stap zelf
+            current.status = CANCELLED
+            current.error = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - current._started
+            _current.reset(token)
+            if self.enabled:
+                self._write(current)
+
+    def _write(self, finished: Span) -> None:
+        line = (json.dumps(finished.to_record(), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        try:
+            with self._lock:
+                # O_APPEND met één write per regel: processen lopen elkaar niet voor de voeten
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                    size = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+                if size > self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+        except OSError as e:
+            # Tracing mag een aanvraag nooit laten mislukken
+            print(f"⚠️ Span niet weggeschreven: {e}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Gedeelde Tracer voor het proces."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def span(name: str, labels: Optional[dict] = None, **attributes):
+    """Span op de gedeelde Tracer (zie Tracer.span)."""
+    return get_tracer().span(name, labels, **attributes)
+
+
+def traced(name: str, labels: Optional[dict] = None, **attributes) -> Callable:
+    """Decorator: elke aanroep van de functie wordt een span."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, labels, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    """De span die nu loopt in deze context, of None."""
+    return _current.get()
+
+
+def annotate(**attributes) -> None:
+    """Voeg attributen toe aan de lopende span, als er een is (bv. wachttijd bij een rate limit)."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+# --- Metrics ----------------------------------------------------------------
+
+
+class MetricsAggregator:
+    """
+    Bouwt Prometheus metrics op uit het trace bestand.
+
+    Leest incrementeel (enkel nieuwe regels sinds de vorige keer) en merkt een
+    rotatie op aan een ander inode of een kleiner bestand. Zoals bij Prometheus
+    gebruikelijk tellen de waarden enkel op zolang dit proces leeft.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else get_tracer().path
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+        # (naam, status, labels) -> [aantal per bucket, som, aantal]
+        self._series: dict[tuple, list] = {}
+
+    def refresh(self) -> None:
+        """Verwerk de spans die bijgeschreven werden sinds de vorige refresh."""
+        with self._lock:
+            try:
+                stat = self.path.stat()
+            except FileNotFoundError:
+                return
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode = stat.st_ino
+                self._offset = 0
+            with open(self.path, "rb") as file:
+                file.seek(self._offset)
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        # Regel wordt nog geschreven: volgende keer
+                        break
+                    self._offset += len(line)
+                    try:
+                        self.add(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+
+    def add(self, record: dict) -> None:
+        seconds = record["duration_ms"] / 1000
+        key = (record["name"], record["status"], tuple(sorted((record.get("labels") or {}).items())))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[0][i] += 1
+        series[1] += seconds
+        series[2] += 1
+
+    def prometheus(self) -> str:
+        """Alle series in het Prometheus tekstformaat."""
+        self.refresh()
+        lines = [
+            "# HELP sinterklaas_stage_duration_seconds Duur per stap van een aanvraag",
+            "# TYPE sinterklaas_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (name, status, labels), (buckets, total, count) in sorted(self._series.items()):
+                base = {"stage": name, "status": status, **dict(labels)}
+                for bound, value in zip(BUCKETS, buckets):
+                    lines.append(f"sinterklaas_stage_duration_seconds_bucket{_labels(base, le=bound)} {value}")
+                lines.append(f"sinterklaas_stage_duration_seconds_bucket{_labels(base, le='+Inf')} {count}")
+                lines.append(f"sinterklaas_stage_duration_seconds_sum{_labels(base)} {total:.6f}")
+                lines.append(f"sinterklaas_stage_duration_seconds_count{_labels(base)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict, **extra) -> str:
+    merged = {**labels, **{key: str(value) for key, value in extra.items()}}
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in merged.items()) + "}"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    aggregator: MetricsAggregator = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.aggregator.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(
+    port: int = DEFAULT_METRICS_PORT,
+    host: str = "0.0.0.0",
+    path: Optional[Path] = None
+) -> ThreadingHTTPServer:
+    """Start /metrics op een achtergrondthread (hooguit één keer per proces)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            handler = type("MetricsHandler", (_MetricsHandler,), {"aggregator": MetricsAggregator(path)})
+            _server = ThreadingHTTPServer((host, port), handler)
+            thread = threading.Thread(target=_server.serve_forever, name="metrics", daemon=True)
+            thread.start()
+        return _server
+
+
+# --- CLI --------------------------------------------------------------------
+
+
+def read_spans(path: Optional[Path] = None) -> Iterator[dict]:
+    """Alle spans uit het trace bestand (en de geroteerde `.1`), oudste eerst."""
+    path = Path(path) if path else get_tracer().path
+    for candidate in (path.with_name(path.name + ".1"), path):
+        try:
+            with open(candidate, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records: Iterator[dict]) -> list[dict]:
+    """Aantal, fouten en percentielen per stap, traagste (p95) eerst."""
+    durations: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for record in records:
+        durations.setdefault(record["name"], []).append(record["duration_ms"] / 1000)
+        if record["status"] == ERROR:
+            errors[record["name"]] = errors.get(record["name"], 0) + 1
+    rows = [
+        {
+            "name": name,
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "total": sum(values),
+        }
+        for name, values in durations.items()
+    ]
+    return sorted(rows, key=lambda row: row["p95"], reverse=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tijden per stap uit het trace bestand")
+    parser.add_argument("--file", type=Path, help="Trace bestand (standaard het gedeelde traces.jsonl)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary", help="Percentielen per stap")
+    summary.add_argument("--stage", help="Enkel stappen die met deze naam beginnen (bv. video.)")
+    sub.add_parser("metrics", help="Prometheus tekstformaat (bv. voor de node_exporter textfile collector)")
+    serve = sub.add_parser("serve", help="Serveer /metrics voor Prometheus")
+    serve.add_argument("--port", type=int, default=int(os.getenv("SINTERKLAAS_METRICS_PORT") or DEFAULT_METRICS_PORT))
+
+    args = parser.parse_args(argv)
+    if args.command == "summary":
+        records = (record for record in read_spans(args.file) if record["name"].startswith(args.stage or ""))
+        rows = summarize(records)
+        print(f"{'stap':<24} {'aantal':>7} {'fout':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'totaal':>10}")
+        for row in rows:
+            print(f"{row['name']:<24} {row['count']:>7} {row['errors']:>5} {row['p50']:>8.2f}s "
+                  f"{row['p95']:>8.2f}s {row['p99']:>8.2f}s {row['total']:>9.1f}s")
+        if not rows:
+            print("(nog geen spans)")
+        return 0
+    if args.command == "metrics":
+        aggregator = MetricsAggregator(args.file)
+        sys.stdout.write(aggregator.prometheus())
+        return 0
+
+    server = start_metrics_server(args.port, path=args.file)
+    print(f"📈 Metrics op poort {args.port}/metrics")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
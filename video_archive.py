@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Lokaal archief van afgewerkte HeyGen video's.
+
+De `video_url` van HeyGen verloopt na een tijd. Een afgewerkte video wordt daarom
+één keer gestreamd gedownload en op schijf bewaard onder de sha256 van de inhoud.
+Een index (SQLite) koppelt de aanvraag (tekst + avatar, zie video_jobs.request_key)
+aan die inhoud, zodat dezelfde video later zonder nieuwe render (en zonder HeyGen
+credits) terug te tonen is. Retentie: maximale leeftijd en maximale totale grootte (LRU).
+
+De bestanden kunnen geserveerd worden met HTTP Range ondersteuning (spoelen in
+de videospeler zonder alles te downloaden); dezelfde server serveert ook de audio
+en PDF's uit de artifact store (zie artifact_store.py):
+    python video_archive.py serve [--port 8766]
+    python video_archive.py list
+    python video_archive.py gc
+"""
+
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+from artifact_store import ARTIFACT_PATH_PREFIX, get_artifact_store
+from storage import connect, data_path
+
+CHUNK_SIZE = 1024 * 1024
+VIDEO_PATH_PREFIX = "/videos/"
+DEFAULT_PORT = 8766
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class VideoArchive:
+    """Content-addressed opslag van video's met een index en retentielimieten."""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        db_name: str = "videos.db",
+        max_bytes: Optional[int] = None,
+        max_age_seconds: Optional[float] = None
+    ):
+        """
+        Initialiseer het VideoArchive.
+
+        Args:
+            directory: Map voor de videobestanden (standaard `<data dir>/videos`)
+            db_name: SQLite database met de index
+            max_bytes: Maximum totale grootte (standaard SINTERKLAAS_VIDEO_MAX_GB, of 5 GB)
+            max_age_seconds: Hoe lang een video bewaard wordt
+                (standaard SINTERKLAAS_VIDEO_RETENTION_DAYS, of 30 dagen)
+        """
+        self.directory = Path(directory) if directory else data_path("videos")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("SINTERKLAAS_VIDEO_MAX_GB", "5")) * 1024 ** 3)
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("SINTERKLAAS_VIDEO_RETENTION_DAYS", "30")) * 24 * 3600
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()
+        self._db_name = db_name
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS videos (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                video_id TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS videos_digest ON videos (digest)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+        return conn
+
+    def path_for(self, digest: str) -> Path:
+        """Pad van een video op schijf (twee tekens als submap, zoals git objects)."""
+        return self.directory / digest[:2] / f"{digest}.mp4"
+
+    # --- Opzoeken en bewaren ------------------------------------------------
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Geef het bestand van een gearchiveerde video, of None."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT digest FROM videos WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.max_age_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        path = self.path_for(row["digest"])
+        if not path.exists():
+            conn.execute("DELETE FROM videos WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE videos SET last_access = ? WHERE key = ?", (time.time(), key))
+        return path
+
+    def store(self, key: str, video_url: str, video_id: Optional[str] = None) -> Path:
+        """
+        Download een video gestreamd (in blokken, nooit volledig in het geheugen) en archiveer ze.
+
+        Args:
+            key: Sleutel van de video (zie video_jobs.request_key)
+            video_url: Tijdelijke download URL van HeyGen
+            video_id: HeyGen video ID (enkel ter info)
+
+        Returns:
+            Pad van de video in het archief
+        """
+        import requests
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp, requests.get(video_url, stream=True, timeout=(10, 60)) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    tmp.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            path = self.path_for(digest.hexdigest())
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                # Zelfde inhoud al aanwezig (bv. een andere sleutel): niet dubbel bewaren
+                os.unlink(tmp_name)
+            else:
+                os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO videos (key, digest, size, video_id, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, digest.hexdigest(), size, video_id, now, now)
+        )
+        self.collect_garbage()
+        return path
+
+    # --- Retentie -----------------------------------------------------------
+
+    def collect_garbage(self) -> int:
+        """
+        Verwijder te oude video's en daarna de minst recent bekeken tot onder max_bytes.
+
+        Returns:
+            Aantal verwijderde bestanden
+        """
+        conn = self._conn()
+        cutoff = time.time() - self.max_age_seconds
+        expired = conn.execute("SELECT digest FROM videos WHERE created_at <= ?", (cutoff,)).fetchall()
+        conn.execute("DELETE FROM videos WHERE created_at <= ?", (cutoff,))
+        dropped = {row["digest"] for row in expired}
+
+        rows = conn.execute(
+            "SELECT digest, MAX(size) AS size, MAX(last_access) AS last_access "
+            "FROM videos GROUP BY digest ORDER BY last_access"
+        ).fetchall()
+        total = sum(row["size"] for row in rows)
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM videos WHERE digest = ?", (row["digest"],))
+            dropped.add(row["digest"])
+            total -= row["size"]
+
+        # Bestanden zonder index-item opruimen (ook halve downloads van gecrashte processen).
+        # Recente bestanden overslaan: een ander proces kan net een video aan het bewaren zijn.
+        referenced = {row["digest"] for row in conn.execute("SELECT DISTINCT digest FROM videos")}
+        orphan_cutoff = time.time() - 3600
+        removed = 0
+        for path in [*self.directory.glob("*/*.mp4"), *self.directory.glob("*.part")]:
+            if path.stem in referenced:
+                continue
+            try:
+                if path.stem in dropped or path.stat().st_mtime < orphan_cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def entries(self) -> list[dict]:
+        """Alle items in de index, meest recent bekeken eerst."""
+        rows = self._conn().execute("SELECT * FROM videos ORDER BY last_access DESC").fetchall()
+        return [dict(row) for row in rows]
+
+
+_archive: Optional[VideoArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_video_archive() -> VideoArchive:
+    """Gedeeld VideoArchive voor het proces."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = VideoArchive()
+        return _archive
+
+
+# --- HTTP serving met Range ondersteuning -----------------------------------
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Lees een `Range: bytes=...` header (één bereik).
+
+    Returns:
+        (start, end) inclusief, of None voor de volledige inhoud
+
+    Raises:
+        ValueError: Als het bereik niet voldaan kan worden (HTTP 416)
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        # Meerdere bereiken of onbekende eenheid: volledige inhoud sturen mag volgens RFC 9110
+        return None
+    start_text, end_text = match.groups()
+    if not start_text:
+        if not end_text:
+            return None
+        # Suffix: de laatste N bytes
+        length = int(end_text)
+        if length == 0:
+            raise ValueError("Leeg bereik")
+        return max(0, size - length), size - 1
+    start = int(start_text)
+    end = min(int(end_text), size - 1) if end_text else size - 1
+    if start >= size or start > end:
+        raise ValueError("Bereik buiten het bestand")
+    return start, end
+
+
+class _VideoHandler(BaseHTTPRequestHandler):
+    archive: VideoArchive = None
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _resolve(self, name: str) -> Optional[tuple[Path, str, str]]:
+        """(pad, content type, ETag) voor een video of artifact, of None."""
+        if name.startswith(VIDEO_PATH_PREFIX):
+            digest = name[len(VIDEO_PATH_PREFIX):].removesuffix(".mp4")
+            if not re.fullmatch(r"[0-9a-f]{64}", digest):
+                return None
+            return self.archive.path_for(digest), "video/mp4", digest
+        if name.startswith(ARTIFACT_PATH_PREFIX):
+            artifact_id = name[len(ARTIFACT_PATH_PREFIX):]
+            path = get_artifact_store().get(artifact_id)
+            if path is None:
+                return None
+            content_type = mimetypes.guess_type(artifact_id)[0] or "application/octet-stream"
+            return path, content_type, artifact_id.split(".")[0]
+        return None
+
+    def _serve(self, send_body: bool):
+        name = self.path.split("?")[0]
+        resolved = self._resolve(name)
+        if resolved is None:
+            self.send_error(404)
+            return
+        path, content_type, digest = resolved
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = end - start + 1 if size else 0
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(length))
+            # Inhoud verandert nooit onder dezelfde naam
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.send_header("ETag", f'"{digest}"')
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            query = parse_qs(urlsplit(self.path).query, keep_blank_values=True)
+            if "download" in query:
+                # ?download=<bestandsnaam> (ASCII), anders een naam op basis van de hash
+                filename = unicodedata.normalize("NFKD", query["download"][0]).encode("ascii", "ignore").decode()
+                filename = re.sub(r"[^A-Za-z0-9._-]", "_", filename).strip("._")
+                filename = filename or f"sinterklaas-{digest[:12]}{path.suffix}"
+                self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+            self.end_headers()
+            if not send_body:
+                return
+
+            file.seek(start)
+            remaining = length
+            try:
+                while remaining > 0:
+                    chunk = file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # Speler sprong naar een ander bereik en sloot de connectie
+                pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_video_server(
+    port: int = DEFAULT_PORT,
+    host: str = "0.0.0.0",
+    archive: Optional[VideoArchive] = None
+) -> ThreadingHTTPServer:
+    """Start de video server op een achtergrondthread (hooguit één keer per proces)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            handler = type("VideoHandler", (_VideoHandler,), {"archive": archive or get_video_archive()})
+            _server = ThreadingHTTPServer((host, port), handler)
+            thread = threading.Thread(target=_server.serve_forever, name="video-archive", daemon=True)
+            thread.start()
+        return _server
+
+
+def video_url_for(path: Path, base_url: Optional[str] = None, download: Optional[str] = None) -> Optional[str]:
+    """
+    Publieke URL van een gearchiveerde video via de video server.
+
+    Geeft None als SINTERKLAAS_VIDEO_BASE_URL niet gezet is; toon het bestand dan
+    rechtstreeks (Streamlit laadt het daarvoor wel volledig in het geheugen).
+
+    Args:
+        download: Bestandsnaam voor een download link (Content-Disposition: attachment)
+    """
+    base_url = base_url or os.getenv("SINTERKLAAS_VIDEO_BASE_URL")
+    if not base_url:
+        return None
+    query = f"?download={quote(download)}" if download else ""
+    return f"{base_url.rstrip('/')}{VIDEO_PATH_PREFIX}{path.stem}.mp4{query}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lokaal archief van Sinterklaas video's")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Serveer het archief over HTTP (met Range)")
+    serve.add_argument("--port", type=int, default=int(os.getenv("SINTERKLAAS_VIDEO_PORT") or DEFAULT_PORT))
+    sub.add_parser("list", help="Toon de gearchiveerde video's")
+    sub.add_parser("gc", help="Pas de retentielimieten toe")
+
+    args = parser.parse_args(argv)
+    archive = get_video_archive()
+    if args.command == "serve":
+        server = start_video_server(args.port, archive=archive)
+        print(f"🎞️ Video archief op poort {args.port}{VIDEO_PATH_PREFIX}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    if args.command == "list":
+        entries = archive.entries()
+        for entry in entries:
+            last_access = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_access"]))
+            print(f"{entry['digest'][:12]}  {entry['size'] / 1024 / 1024:7.1f} MB  {last_access}  {entry['video_id'] or ''}")
+        print(f"\n{len(entries)} video('s)")
+        return 0
+
+    removed = archive.collect_garbage()
+    print(f"🧹 {removed} bestand(en) verwijderd")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Voortgangsmeldingen en fouten van de video generators, los van een UI.
+
+De generators roepen een `on_event` callback aan met een VideoEvent en gooien
+een VideoGenerationError (of subklasse) als het misloopt. Zo kunnen ze draaien
+in Streamlit (zie streamlit_progress.py), een worker, een CLI of een API.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Soorten events
+AUDIO_CHECKED = "audio_checked"
+REATTACHED = "reattached"
+ASSET_REUSED = "asset_reused"
+UPLOAD_STARTED = "upload_started"
+UPLOAD_RESPONSE = "upload_response"
+UPLOAD_COMPLETED = "upload_completed"
+GENERATION_STARTING = "generation_starting"
+GENERATION_RESPONSE = "generation_response"
+JOB_STARTED = "job_started"
+RETRYING = "retrying"
+STATUS = "status"
+POLL_ERROR = "poll_error"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class VideoEvent:
+    """Eén voortgangsmelding van een video job."""
+
+    kind: str
+    message: str
+    level: str = "info"  # info, success, warning of error
+    progress: Optional[int] = None  # 0-100, enkel bij STATUS/COMPLETED
+    data: dict = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+EventCallback = Callable[[VideoEvent], None]
+
+
+def emit(
+    on_event: Optional[EventCallback],
+    kind: str,
+    message: str,
+    level: str = "info",
+    progress: Optional[int] = None,
+    **data
+) -> None:
+    """Stuur een event naar de callback (als die er is)."""
+    if on_event is not None:
+        on_event(VideoEvent(kind, message, level, progress, data))
+
+
+class VideoGenerationError(Exception):
+    """Basis voor alle fouten bij het maken van een video."""
+
+    def __init__(self, message: str, video_id: Optional[str] = None):
+        super().__init__(message)
+        self.video_id = video_id
+
+
+class EmptyAudioError(VideoGenerationError):
+    """Er is geen audio om een video mee te maken."""
+
+
+class HeyGenAPIError(VideoGenerationError):
+    """HeyGen gaf een foutcode of een onverwacht antwoord."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, response_text: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+class AssetUploadError(HeyGenAPIError):
+    """De audio kon niet naar HeyGen geüpload worden."""
+
+
+class VideoStartError(HeyGenAPIError):
+    """HeyGen weigerde de video job te starten."""
+
+    @property
+    def asset_rejected(self) -> bool:
+        """
+        True als HeyGen het audio asset expliciet afwees (4xx die het asset ongeldig of onbekend noemt).
+
+        Enkel dan is zeker dat er geen render gestart werd; bij een timeout, 5xx, 429 of
+        een onverwacht antwoord kan de job toch lopen en mag er niet opnieuw gestart worden.
+        """
+        if self.status_code is None or not 400 <= self.status_code < 500 or self.status_code == 429:
+            return False
+        text = (self.response_text or "").lower()
+        return "asset" in text and any(
+            word in text for word in ("not found", "invalid", "not exist", "expired", "does not")
+        )
@@ -1,210 +1,284 @@
-import os
-import tempfile
 import time
-import json
-import requests
+import threading
 from typing import Optional
-import streamlit as st
+
+from asset_cache import get_asset_cache
+from avatar_catalog import fetch_avatars
+from heygen_client import account_key, audio_buffer, audio_digest, audio_size, get_client
+from tracing import annotate, traced
+from video_events import (
+    ASSET_REUSED,
+    AUDIO_CHECKED,
+    COMPLETED,
+    GENERATION_RESPONSE,
+    GENERATION_STARTING,
+    JOB_STARTED,
+    POLL_ERROR,
+    REATTACHED,
+    RETRYING,
+    STATUS,
+    UPLOAD_COMPLETED,
+    UPLOAD_RESPONSE,
+    UPLOAD_STARTED,
+    AssetUploadError,
+    EmptyAudioError,
+    EventCallback,
+    VideoStartError,
+    emit,
+)
+from video_jobs import job_store
+from video_polling import (
+    PollPolicy,
+    audio_seconds_from_size,
+    expected_render_seconds,
+    record_render,
+    wait_for_video,
+)
 
 class VideoGenerator:
-    """Klasse voor het genereren van video met HeyGen API V2."""
-    
-    def __init__(self, api_key: str, avatar_id: str):
+    """
+    Klasse voor het genereren van video met HeyGen API V2.
+
+    Bevat geen UI code: voortgang gaat via een `on_event` callback (VideoEvent),
+    fouten als VideoGenerationError. Zie streamlit_progress.py voor de weergave.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        avatar_id: str,
+        poll_timeout: float = 900.0,
+        callback_url: Optional[str] = None
+    ):
         """
         Initialiseer de VideoGenerator.
-        
+
         Args:
             api_key: HeyGen API key
             avatar_id: De ID van de avatar die je wilt gebruiken (Verplicht).
+            poll_timeout: Maximum aantal seconden wachten op een video
+            callback_url: Publieke URL van de webhook receiver; pollen wordt dan enkel een traag vangnet
         """
         if not api_key:
             raise ValueError("HeyGen API key is vereist")
         if not avatar_id:
             raise ValueError("Avatar ID is vereist voor deze V2 implementatie")
-            
+
         self.api_key = api_key.strip()
         self.avatar_id = avatar_id.strip()
-    
-    def list_avatars(self) -> Optional[list]:
+        self.poll_timeout = poll_timeout
+        self.callback_url = callback_url
+        # Gedeelde client: connection pool + retries voor alle HeyGen calls
+        self.client = get_client(self.api_key)
+
+    def list_avatars(self) -> list:
         """
         Haal een lijst op van alle beschikbare avatars in je HeyGen account.
-        
+
+        Rechtstreeks bij HeyGen; voor snel (offline) opzoeken zie avatar_catalog.py.
+
         Returns:
-            List van avatar dictionaries met details, of None bij fout
+            List van avatar dictionaries met details
+
+        Raises:
+            HeyGenAPIError: Als HeyGen een fout of onverwacht antwoord geeft
         """
-        avatars_url = "https://api.heygen.com/v2/avatars"
-        headers = {"X-Api-Key": self.api_key}
-        
-        try:
-            response = requests.get(avatars_url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                json_data = response.json()
-                if "data" in json_data and "avatars" in json_data["data"]:
-                    avatars = json_data["data"]["avatars"]
-                    return avatars
-                else:
-                    st.error(f"❌ Onverwacht API formaat: {json_data}")
-                    return None
-            else:
-                st.error(f"❌ Fout bij ophalen avatars ({response.status_code}): {response.text}")
-                return None
-                
-        except Exception as e:
-            st.error(f"❌ Exception bij ophalen avatars: {e}")
-            return None
-    
-    def generate(self, audio_bytes) -> Optional[str]:
+        return fetch_avatars(self.client)["avatars"]
+
+    def generate(
+        self,
+        audio_bytes,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None,
+        request_key: Optional[str] = None
+    ) -> str:
         """
         Genereer video met HeyGen V2 (Avatar + Audio).
-        
+
         Args:
             audio_bytes: Audio bytes (io.BytesIO of bytes)
-        
+            cancel_event: Optioneel event om het wachten op de video af te breken
+            on_event: Optionele callback die elke VideoEvent (voortgang) ontvangt
+            request_key: Sleutel van de aanvraag (video_jobs.request_key); loopt er al een
+                render voor, dan wordt daarop aangehaakt in plaats van opnieuw te renderen
+
         Returns:
-            Video URL als string, of None bij fout
+            Video URL als string
+
+        Raises:
+            EmptyAudioError: Als er geen audio is
+            AssetUploadError: Als de audio upload mislukt
+            VideoStartError: Als HeyGen de job niet wil starten
+            VideoPollError: Als renderen mislukt, te lang duurt of geannuleerd wordt
         """
-        # Debug: Check audio data
-        if hasattr(audio_bytes, 'getvalue'):
-            data = audio_bytes.getvalue()
-        elif hasattr(audio_bytes, 'read'):
+        # Debug: Check audio data (zonder een kopie te maken)
+        size = audio_size(audio_bytes)
+        if size == 0:
+            raise EmptyAudioError("Audio data is leeg!")
+
+        emit(on_event, AUDIO_CHECKED, f"📊 Audio grootte: {size} bytes", size=size)
+
+        audio_hash = audio_digest(audio_bytes)
+        job = {
+            "request_key": request_key,
+            "account": account_key(self.api_key),
+            "audio_hash": audio_hash,
+            "avatar_id": self.avatar_id,
+            "variant": type(self).__name__,
+        }
+        job_id = None
+        if request_key:
+            # Loopt deze aanvraag al (rerun, refresh, andere sessie)? Dan aanhaken, niet opnieuw renderen
+            job_id, existing = job_store.claim(**job)
+            if existing is not None:
+                return self.resume(existing, cancel_event, on_event)
+
+        try:
+            # Stap 1: Asset ID voor de audio (hergebruik van een eerdere upload indien mogelijk)
+            audio_asset_id, reused = self._audio_asset_id(audio_bytes, audio_hash, on_event=on_event)
+
+            # Stap 2: Start Video Generatie (V2)
             try:
-                audio_bytes.seek(0)
-            except (OSError, AttributeError):
-                pass
-            data = audio_bytes.read()
-        else:
-            data = audio_bytes
-        
-        if not data or len(data) == 0:
-            st.error("❌ Audio data is leeg!")
-            return None
-        
-        st.info(f"📊 Audio grootte: {len(data)} bytes")
-        
-        # Stap 1: Upload audio om een Asset ID te krijgen
-        audio_asset_id = self._upload_asset(audio_bytes, "audio/mpeg")
-        
-        if not audio_asset_id:
-            st.error("❌ Audio upload mislukt, kan niet starten met genereren.")
-            return None
-        
-        # Stap 2: Start Video Generatie (V2)
-        video_id = self._start_generation_v2(audio_asset_id)
-        
-        if not video_id:
-            return None
-        
-        # Stap 3: Poll status tot voltooiing
-        return self._poll_for_completion(video_id)
-    
-    def _upload_asset(self, file_data, content_type: str) -> Optional[str]:
-        """Upload audio bytes naar HeyGen."""
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_filename = temp_file.name
-        
+                video_id = self._start_generation_v2(audio_asset_id, on_event)
+            except VideoStartError as e:
+                # Enkel bij een expliciete weigering van het asset: anders kan de eerste
+                # render toch gestart zijn en zou een tweede start dubbel betalen
+                if not reused or not e.asset_rejected:
+                    raise
+                # Het hergebruikte asset is mogelijk niet meer geldig: één keer opnieuw uploaden
+                get_asset_cache().invalidate(self.api_key, audio_hash)
+                emit(on_event, RETRYING, "♻️ Hergebruikt asset geweigerd, audio opnieuw uploaden", "warning")
+                audio_asset_id, _ = self._audio_asset_id(audio_bytes, audio_hash, reuse=False, on_event=on_event)
+                video_id = self._start_generation_v2(audio_asset_id, on_event)
+        except BaseException as e:
+            # Ook bij een onderbreking (rerun): de claim vrijgeven, er loopt geen render
+            if job_id is not None:
+                job_store.release(job_id, str(e) or type(e).__name__)
+            raise
+        job_store.register(video_id, job_id=job_id, **job)
+
+        # Stap 3: Poll status tot voltooiing (verwachte rendertijd volgt uit de audioduur)
+        audio_seconds = audio_seconds_from_size(size)
+        start = time.monotonic()
+        video_url = self._poll_for_completion(
+            video_id, expected_render_seconds(audio_seconds), cancel_event, on_event
+        )
+        record_render(audio_seconds, time.monotonic() - start)
+        return video_url
+
+    def resume(
+        self,
+        job: dict,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
+        """
+        Haak aan op een bestaande job in plaats van opnieuw te renderen.
+
+        Gebruikt na een rerun, herstart of dubbele aanvraag: wacht (indien nodig) tot
+        de job een video ID heeft en pollt dan tot de video klaar is.
+
+        Args:
+            job: Job uit de VideoJobStore
+            cancel_event: Optioneel event om het wachten af te breken
+            on_event: Optionele callback die elke VideoEvent (voortgang) ontvangt
+
+        Returns:
+            Video URL als string
+        """
+        if not job.get("video_id"):
+            emit(on_event, REATTACHED, "⏳ Deze video wordt al gestart, even geduld...", job_id=job["id"])
+            job = job_store.wait_for_start(job["id"]) or job
+            if not job.get("video_id"):
+                raise VideoStartError(job.get("error") or "De eerder aangevraagde video kon niet starten")
+
+        video_id = job["video_id"]
+        if job["status"] == "completed" and job.get("video_url"):
+            return job["video_url"]
+        emit(on_event, REATTACHED, f"🔁 Deze video wordt al gemaakt, we wachten mee (video ID: {video_id})",
+             video_id=video_id)
+        return self._poll_for_completion(video_id, None, cancel_event, on_event)
+
+    def _audio_asset_id(
+        self,
+        audio_bytes,
+        audio_hash: str,
+        reuse: bool = True,
+        on_event: Optional[EventCallback] = None
+    ) -> tuple[str, bool]:
+        """
+        Geef een HeyGen asset ID voor de audio: uit de cache of via een nieuwe upload.
+
+        Returns:
+            (asset ID, of het ID uit de cache kwam)
+        """
+        cache = get_asset_cache()
+        if reuse:
+            asset_id = cache.get(self.api_key, audio_hash)
+            if asset_id:
+                emit(on_event, ASSET_REUSED, f"♻️ Audio al eerder geüpload, asset {asset_id} wordt hergebruikt",
+                     asset_id=asset_id)
+                return asset_id, True
+
+        asset_id = self._upload_asset(audio_bytes, "audio/mpeg", on_event)
+        cache.put(self.api_key, audio_hash, asset_id)
+        return asset_id, False
+
+    def _upload_asset(self, file_data, content_type: str, on_event: Optional[EventCallback] = None) -> str:
+        """Upload audio bytes naar HeyGen, rechtstreeks vanuit de buffer (geen temp file)."""
+        buffer = audio_buffer(file_data)
         try:
-            # Bytes wegschrijven naar temp file
-            if hasattr(file_data, 'getvalue'):
-                data = file_data.getvalue()
-            elif hasattr(file_data, 'read'):
-                try:
-                    file_data.seek(0)
-                except (OSError, AttributeError):
-                    pass
-                data = file_data.read()
-            else:
-                data = file_data
-            
-            if isinstance(data, str):
-                data = data.encode('utf-8')
-            
-            if not data or len(data) == 0:
-                st.error("❌ Geen audiogegevens beschikbaar om te uploaden.")
-                return None
-            
-            temp_file.write(data)
-            temp_file.close()
-            
-            st.info(f"💾 Temp bestand aangemaakt: {len(data)} bytes")
-            
-            return self._upload_file_to_api(temp_filename, content_type)
+            if buffer.nbytes == 0:
+                raise EmptyAudioError("Geen audiogegevens beschikbaar om te uploaden.")
+
+            return self._upload_buffer_to_api(buffer, content_type, on_event)
         finally:
-            # Opruimen
-            if os.path.exists(temp_filename):
-                try:
-                    os.remove(temp_filename)
-                except:
-                    pass
-    
-    def _upload_file_to_api(self, file_path: str, content_type: str) -> Optional[str]:
+            # Geef de buffer vrij zodat de BytesIO weer aangepast mag worden
+            buffer.release()
+
+    @traced("video.upload", labels={"api": "v2"})
+    def _upload_buffer_to_api(
+        self,
+        buffer: memoryview,
+        content_type: str,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
         """Fysieke upload naar de HeyGen Upload Endpoint."""
-        if not os.path.exists(file_path):
-            st.error(f"❌ Bestand niet gevonden: {file_path}")
-            return None
-        
-        file_size = os.path.getsize(file_path)
-        if file_size == 0:
-            st.error("❌ Bestand is leeg!")
-            return None
-        
-        st.info(f"📤 Bestandsgrootte: {file_size} bytes")
-        
-        # HeyGen Upload Asset endpoint
-        upload_url = "https://upload.heygen.com/v1/asset"
-        
-        # BELANGRIJK: Volgens HeyGen documentatie moet de file als RAW BINARY DATA
-        # in de request body gestuurd worden, NIET als multipart/form-data!
-        headers = {
-            'X-Api-Key': self.api_key,
-            'Content-Type': content_type  # Dit specificeert het bestandstype
-        }
-        
+        emit(on_event, UPLOAD_STARTED, f"📤 Audio uploaden naar HeyGen ({buffer.nbytes} bytes)...",
+             size=buffer.nbytes)
+        annotate(bytes=buffer.nbytes)
+
         try:
-            st.info(f"🛠️ Audio uploaden naar HeyGen...")
-            
-            # Lees het bestand als binary data
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-            
-            st.info(f"📦 {len(file_content)} bytes geladen")
-            
-            # Stuur de raw binary data direct in de body
-            response = requests.post(
-                upload_url,
-                headers=headers,
-                data=file_content,  # Raw binary data, GEEN files parameter!
-                timeout=120
-            )
-            
-            st.info(f"📡 Response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                json_data = response.json()
-                st.info(f"📋 Response data: {json.dumps(json_data, indent=2)}")
-                
-                # HeyGen response format: {"code": 100, "data": {"id": "...", ...}}
-                if "data" in json_data and "id" in json_data["data"]:
-                    asset_id = json_data["data"]["id"]
-                    st.success(f"✅ Audio geüpload! Asset ID: {asset_id}")
-                    return asset_id
-                else:
-                    st.error(f"❌ Onverwacht response format: {json_data}")
-                    return None
-            else:
-                st.error(f"❌ Upload Error ({response.status_code}): {response.text}")
-                return None
-                
+            # BELANGRIJK: Volgens HeyGen documentatie moet de file als RAW BINARY DATA
+            # in de request body gestuurd worden, NIET als multipart/form-data!
+            # De client streamt de memoryview zonder de audio te kopiëren.
+            response = self.client.upload_asset(buffer, content_type)
         except Exception as e:
-            st.error(f"❌ Exception bij upload: {str(e)}")
-            import traceback
-            st.error(traceback.format_exc())
-            return None
+            raise AssetUploadError(f"Exception bij upload: {e}") from e
+
+        emit(on_event, UPLOAD_RESPONSE, f"📡 Response status: {response.status_code}",
+             status_code=response.status_code)
+
+        if response.status_code != 200:
+            raise AssetUploadError(
+                f"Upload Error ({response.status_code}): {response.text}",
+                response.status_code,
+                response.text
+            )
+
+        json_data = response.json()
 
-    def _start_generation_v2(self, audio_asset_id: str) -> Optional[str]:
+        # HeyGen response format: {"code": 100, "data": {"id": "...", ...}}
+        if "data" in json_data and "id" in json_data["data"]:
+            asset_id = json_data["data"]["id"]
+            emit(on_event, UPLOAD_COMPLETED, f"✅ Audio geüpload! Asset ID: {asset_id}", "success",
+                 asset_id=asset_id)
+            return asset_id
+        raise AssetUploadError(f"Onverwacht response format: {json_data}", response.status_code)
+
+    @traced("video.start", labels={"api": "v2"})
+    def _start_generation_v2(self, audio_asset_id: str, on_event: Optional[EventCallback] = None) -> str:
         """Start de V2 Video Generatie met Avatar + Audio ID."""
-        generate_url = "https://api.heygen.com/v2/video/generate"
-        
         # Correcte V2 Payload volgens documentatie
         payload = {
             "video_inputs": [
@@ -229,87 +303,64 @@ class VideoGenerator:
                 "height": 720
             }
         }
-        
-        headers = {
-            "X-Api-Key": self.api_key,
-            "Content-Type": "application/json"
-        }
-        
+        if self.callback_url:
+            payload["callback_url"] = self.callback_url
+
+        emit(on_event, GENERATION_STARTING, "🛠️ Video generatie starten...", payload=payload)
         try:
-            st.info("🛠️ Video generatie starten...")
-            st.info(f"📋 Payload: {json.dumps(payload, indent=2)}")
-            
-            response = requests.post(generate_url, headers=headers, json=payload, timeout=30)
-            
-            st.info(f"📡 Response status: {response.status_code}")
-            st.info(f"📋 Response: {response.text}")
-            
-            if response.status_code == 200:
-                json_data = response.json()
-                if "data" in json_data and "video_id" in json_data["data"]:
-                    video_id = json_data["data"]["video_id"]
-                    st.success(f"✅ Job gestart! Video ID: {video_id}")
-                    return video_id
-                else:
-                    st.error(f"❌ Onverwacht response format: {json_data}")
-            else:
-                st.error(f"❌ Generatie mislukt ({response.status_code}): {response.text}")
-            
-            return None
-            
+            response = self.client.generate_video("/v2/video/generate", payload)
         except Exception as e:
-            st.error(f"❌ Fout bij aanroep: {str(e)}")
-            import traceback
-            st.error(traceback.format_exc())
-            return None
-    
-    def _poll_for_completion(self, video_id: str) -> Optional[str]:
-        """Wacht tot de video klaar is."""
-        status_url = f"https://api.heygen.com/v1/video_status.get?video_id={video_id}"
-        headers = {"X-Api-Key": self.api_key}
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        progress_value = 0
-        
-        while True:
-            try:
-                response = requests.get(status_url, headers=headers)
-                json_data = response.json()
-                
-                if "data" not in json_data:
-                    st.warning("⏳ Wachten op data...")
-                    time.sleep(5)
-                    continue
-
-                data = json_data["data"]
-                status = data.get("status")
-                
-                if status == "completed":
-                    progress_bar.progress(100)
-                    status_text.text("Status: Klaar!")
-                    video_url = data.get("video_url")
-                    st.success(f"🎥 Video is klaar!")
-                    return video_url
-                
-                elif status == "failed":
-                    error_msg = data.get('error', 'Onbekende fout')
-                    st.error(f"❌ Renderen mislukt: {error_msg}")
-                    return None
-                
-                elif status in ["processing", "pending", "waiting"]:
-                    status_text.text(f"Status: {status}... (even geduld)")
-                    # Fake progress voor UX
-                    progress_value = min(progress_value + 5, 90)
-                    progress_bar.progress(progress_value)
-                    time.sleep(5)
-                
-                else:
-                    status_text.text(f"Status: {status}")
-                    time.sleep(5)
-                    
-            except Exception as e:
-                st.error(f"Polling fout: {e}")
-                time.sleep(5)
-                continue
\ No newline at end of file
+            raise VideoStartError(f"Fout bij aanroep: {e}") from e
+
+        emit(on_event, GENERATION_RESPONSE, f"📡 Response status: {response.status_code}",
+             status_code=response.status_code, response=response.text)
+
+        if response.status_code != 200:
+            raise VideoStartError(
+                f"Generatie mislukt ({response.status_code}): {response.text}",
+                response.status_code,
+                response.text
+            )
+
+        json_data = response.json()
+        if "data" in json_data and "video_id" in json_data["data"]:
+            video_id = json_data["data"]["video_id"]
+            emit(on_event, JOB_STARTED, f"✅ Job gestart! Video ID: {video_id}", "success", video_id=video_id)
+            return video_id
+        raise VideoStartError(f"Onverwacht response format: {json_data}", response.status_code)
+
+    @traced("video.poll", labels={"api": "v2"})
+    def _poll_for_completion(
+        self,
+        video_id: str,
+        expected_seconds: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
+        """
+        Wacht tot de video klaar is.
+
+        Pollt snel in het begin en trager naarmate het langer duurt, met een harde
+        deadline (self.poll_timeout) en optionele annulatie via cancel_event.
+        """
+        def on_status(status: str, elapsed: float, progress: int):
+            emit(on_event, STATUS, f"Status: {status}... ({int(elapsed)}s)", progress=progress,
+                 video_id=video_id, status=status, elapsed=elapsed)
+
+        def on_error(error: Exception):
+            emit(on_event, POLL_ERROR, f"⏳ Polling fout, opnieuw proberen: {error}", "warning",
+                 video_id=video_id, error=str(error))
+
+        if self.callback_url:
+            # Voltooiing komt via de webhook; pollen is enkel nog een traag vangnet
+            policy = PollPolicy.safety_net(expected_seconds or 60.0, timeout=self.poll_timeout)
+        else:
+            policy = PollPolicy(expected_seconds=expected_seconds or 60.0, timeout=self.poll_timeout)
+        data = wait_for_video(
+            self.client, video_id, policy, cancel_event, on_status, on_error, job_store=job_store
+        )
+
+        video_url = data.get("video_url")
+        emit(on_event, COMPLETED, "🎥 Video is klaar!", "success", progress=100,
+             video_id=video_id, video_url=video_url)
+        return video_url
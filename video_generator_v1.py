@@ -1,14 +1,45 @@
-import os
-import tempfile
 import time
-import json
-import requests
+import threading
+import warnings
 from typing import Optional
-import streamlit as st
+
+from asset_cache import get_asset_cache
+from heygen_client import account_key, audio_buffer, audio_digest, audio_size, get_client
+from tracing import annotate, traced
+from video_events import (
+    ASSET_REUSED,
+    AUDIO_CHECKED,
+    COMPLETED,
+    JOB_STARTED,
+    POLL_ERROR,
+    REATTACHED,
+    RETRYING,
+    STATUS,
+    UPLOAD_COMPLETED,
+    UPLOAD_STARTED,
+    AssetUploadError,
+    EmptyAudioError,
+    EventCallback,
+    VideoStartError,
+    emit,
+)
+from video_jobs import job_store
+from video_polling import (
+    PollPolicy,
+    audio_seconds_from_size,
+    expected_render_seconds,
+    record_render,
+    wait_for_video,
+)
 
 
 class VideoGeneratorV1:
-    """Video generator gebaseerd op de HeyGen API v1 (geschikt voor photo avatars)."""
+    """
+    Video generator gebaseerd op de HeyGen API v1 (geschikt voor photo avatars).
+
+    Net als VideoGenerator zonder UI code: voortgang via `on_event`, fouten als
+    VideoGenerationError.
+    """
 
     def __init__(
         self,
@@ -21,6 +52,8 @@ class VideoGeneratorV1:
         width: int = 1280,
         height: int = 720,
         test_mode: bool = False,
+        poll_timeout: float = 900.0,
+        callback_url: Optional[str] = None,
     ):
         if not api_key:
             raise ValueError("HeyGen API key is vereist")
@@ -29,10 +62,12 @@ class VideoGeneratorV1:
 
         self.api_key = api_key.strip()
         self.avatar_id = avatar_id.strip()
+        self.client = get_client(self.api_key)
         self.avatar_type = avatar_type.lower()
         if self.avatar_type not in {"avatar", "photo"}:
-            st.warning(
-                f"Onbekend avatar_type '{avatar_type}', fallback naar 'avatar'"
+            warnings.warn(
+                f"Onbekend avatar_type '{avatar_type}', fallback naar 'avatar'",
+                stacklevel=2
             )
             self.avatar_type = "avatar"
 
@@ -40,126 +75,154 @@ class VideoGeneratorV1:
         self.aspect_ratio = aspect_ratio
         self.dimension = {"width": width, "height": height}
         self.test_mode = test_mode
+        self.poll_timeout = poll_timeout
+        self.callback_url = callback_url
 
-    def generate(self, audio_bytes) -> Optional[str]:
-        """Genereer een video met de HeyGen v1 API."""
-        data = self._peek_audio(audio_bytes)
-        if not data:
-            st.error("❌ Audio data is leeg!")
-            return None
-
-        st.info(f"📊 Audio grootte: {len(data)} bytes")
-
-        audio_asset_id = self._upload_asset(audio_bytes, "audio/mpeg")
-        if not audio_asset_id:
-            st.error("❌ Audio upload mislukt, kan niet starten met genereren.")
-            return None
-
-        video_id = self._start_generation_v1(audio_asset_id)
-        if not video_id:
-            return None
-
-        return self._poll_for_completion(video_id)
-
-    # --- Helpers -----------------------------------------------------------
+    def generate(
+        self,
+        audio_bytes,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None,
+        request_key: Optional[str] = None
+    ) -> str:
+        """
+        Genereer een video met de HeyGen v1 API.
+
+        Geeft de video URL terug; parameters en fouten zoals VideoGenerator.generate.
+        """
+        size = audio_size(audio_bytes)
+        if size == 0:
+            raise EmptyAudioError("Audio data is leeg!")
+
+        emit(on_event, AUDIO_CHECKED, f"📊 Audio grootte: {size} bytes", size=size)
+
+        audio_hash = audio_digest(audio_bytes)
+        job = {
+            "request_key": request_key,
+            "account": account_key(self.api_key),
+            "audio_hash": audio_hash,
+            "avatar_id": self.avatar_id,
+            "variant": type(self).__name__,
+        }
+        job_id = None
+        if request_key:
+            # Loopt deze aanvraag al? Dan aanhaken, niet opnieuw renderen
+            job_id, existing = job_store.claim(**job)
+            if existing is not None:
+                return self.resume(existing, cancel_event, on_event)
 
-    def _peek_audio(self, audio_bytes):
-        if hasattr(audio_bytes, "getvalue"):
-            return audio_bytes.getvalue()
-        if hasattr(audio_bytes, "read"):
+        try:
+            audio_asset_id, reused = self._audio_asset_id(audio_bytes, audio_hash, on_event=on_event)
             try:
-                audio_bytes.seek(0)
-            except (OSError, AttributeError):
-                pass
-            data = audio_bytes.read()
-            audio_bytes.seek(0)
-            return data
-        return audio_bytes
-
-    def _upload_asset(self, file_data, content_type: str) -> Optional[str]:
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        temp_filename = temp_file.name
+                video_id = self._start_generation_v1(audio_asset_id, on_event)
+            except VideoStartError as e:
+                # Enkel bij een expliciete weigering van het asset: anders kan de eerste
+                # render toch gestart zijn en zou een tweede start dubbel betalen
+                if not reused or not e.asset_rejected:
+                    raise
+                # Hergebruikt asset mogelijk verlopen: één keer opnieuw uploaden
+                get_asset_cache().invalidate(self.api_key, audio_hash)
+                emit(on_event, RETRYING, "♻️ Hergebruikt asset geweigerd, audio opnieuw uploaden", "warning")
+                audio_asset_id, _ = self._audio_asset_id(audio_bytes, audio_hash, reuse=False, on_event=on_event)
+                video_id = self._start_generation_v1(audio_asset_id, on_event)
+        except BaseException as e:
+            if job_id is not None:
+                job_store.release(job_id, str(e) or type(e).__name__)
+            raise
+        job_store.register(video_id, job_id=job_id, **job)
+
+        audio_seconds = audio_seconds_from_size(size)
+        start = time.monotonic()
+        video_url = self._poll_for_completion(
+            video_id, expected_render_seconds(audio_seconds), cancel_event, on_event
+        )
+        record_render(audio_seconds, time.monotonic() - start)
+        return video_url
 
-        try:
-            if hasattr(file_data, "getvalue"):
-                data = file_data.getvalue()
-            elif hasattr(file_data, "read"):
-                try:
-                    file_data.seek(0)
-                except (OSError, AttributeError):
-                    pass
-                data = file_data.read()
-            else:
-                data = file_data
-
-            if isinstance(data, str):
-                data = data.encode("utf-8")
-
-            if not data:
-                st.error("❌ Geen audiogegevens beschikbaar om te uploaden.")
-                return None
-
-            temp_file.write(data)
-            temp_file.close()
-
-            st.info(f"💾 Temp bestand aangemaakt: {len(data)} bytes")
-
-            return self._upload_file_to_api(temp_filename, content_type)
-        finally:
-            if os.path.exists(temp_filename):
-                try:
-                    os.remove(temp_filename)
-                except Exception:
-                    pass
-
-    def _upload_file_to_api(self, file_path: str, content_type: str) -> Optional[str]:
-        if not os.path.exists(file_path):
-            st.error(f"❌ Bestand niet gevonden: {file_path}")
-            return None
-
-        file_size = os.path.getsize(file_path)
-        if file_size == 0:
-            st.error("❌ Bestand is leeg!")
-            return None
-
-        st.info(f"📤 Bestandsgrootte: {file_size} bytes")
-
-        upload_url = "https://upload.heygen.com/v1/asset"
-        headers = {
-            "X-Api-Key": self.api_key,
-            "Content-Type": content_type,
-        }
+    # --- Helpers -----------------------------------------------------------
 
+    def resume(
+        self,
+        job: dict,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
+        """Haak aan op een bestaande job (zie VideoGenerator.resume)."""
+        if not job.get("video_id"):
+            emit(on_event, REATTACHED, "⏳ Deze video wordt al gestart, even geduld...", job_id=job["id"])
+            job = job_store.wait_for_start(job["id"]) or job
+            if not job.get("video_id"):
+                raise VideoStartError(job.get("error") or "De eerder aangevraagde video kon niet starten")
+
+        video_id = job["video_id"]
+        if job["status"] == "completed" and job.get("video_url"):
+            return job["video_url"]
+        emit(on_event, REATTACHED, f"🔁 Deze video wordt al gemaakt, we wachten mee (video ID: {video_id})",
+             video_id=video_id)
+        return self._poll_for_completion(video_id, None, cancel_event, on_event)
+
+    def _audio_asset_id(
+        self,
+        audio_bytes,
+        audio_hash: str,
+        reuse: bool = True,
+        on_event: Optional[EventCallback] = None
+    ) -> tuple[str, bool]:
+        cache = get_asset_cache()
+        if reuse:
+            asset_id = cache.get(self.api_key, audio_hash)
+            if asset_id:
+                emit(on_event, ASSET_REUSED, f"♻️ Audio al eerder geüpload, asset {asset_id} wordt hergebruikt",
+                     asset_id=asset_id)
+                return asset_id, True
+
+        asset_id = self._upload_asset(audio_bytes, "audio/mpeg", on_event)
+        cache.put(self.api_key, audio_hash, asset_id)
+        return asset_id, False
+
+    def _upload_asset(self, file_data, content_type: str, on_event: Optional[EventCallback] = None) -> str:
+        buffer = audio_buffer(file_data)
         try:
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-
-            response = requests.post(
-                upload_url,
-                headers=headers,
-                data=file_content,
-                timeout=120,
-            )
+            if buffer.nbytes == 0:
+                raise EmptyAudioError("Geen audiogegevens beschikbaar om te uploaden.")
 
-            if response.status_code == 200:
-                json_data = response.json()
-                if "data" in json_data and "id" in json_data["data"]:
-                    asset_id = json_data["data"]["id"]
-                    st.success(f"✅ Audio geüpload! Asset ID: {asset_id}")
-                    return asset_id
+            return self._upload_buffer_to_api(buffer, content_type, on_event)
+        finally:
+            buffer.release()
 
-                st.error(f"❌ Onverwacht response format: {json_data}")
-                return None
+    @traced("video.upload", labels={"api": "v1"})
+    def _upload_buffer_to_api(
+        self,
+        buffer: memoryview,
+        content_type: str,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
+        emit(on_event, UPLOAD_STARTED, f"📤 Audio uploaden naar HeyGen ({buffer.nbytes} bytes)...",
+             size=buffer.nbytes)
+        annotate(bytes=buffer.nbytes)
 
-            st.error(f"❌ Upload Error ({response.status_code}): {response.text}")
-            return None
+        try:
+            response = self.client.upload_asset(buffer, content_type)
         except Exception as e:
-            st.error(f"❌ Exception bij upload: {str(e)}")
-            return None
+            raise AssetUploadError(f"Exception bij upload: {e}") from e
 
-    def _start_generation_v1(self, audio_asset_id: str) -> Optional[str]:
-        generate_url = "https://api.heygen.com/v1/video.generate"
+        if response.status_code != 200:
+            raise AssetUploadError(
+                f"Upload Error ({response.status_code}): {response.text}",
+                response.status_code,
+                response.text
+            )
+
+        json_data = response.json()
+        if "data" in json_data and "id" in json_data["data"]:
+            asset_id = json_data["data"]["id"]
+            emit(on_event, UPLOAD_COMPLETED, f"✅ Audio geüpload! Asset ID: {asset_id}", "success",
+                 asset_id=asset_id)
+            return asset_id
+        raise AssetUploadError(f"Onverwacht response format: {json_data}", response.status_code)
 
+    @traced("video.start", labels={"api": "v1"})
+    def _start_generation_v1(self, audio_asset_id: str, on_event: Optional[EventCallback] = None) -> str:
         character_payload = (
             {"type": "photo", "photo_id": self.avatar_id}
             if self.avatar_type == "photo"
@@ -180,76 +243,60 @@ class VideoGeneratorV1:
             "dimension": self.dimension,
             "test": self.test_mode,
         }
-
-        headers = {
-            "X-Api-Key": self.api_key,
-            "Content-Type": "application/json",
-        }
+        if self.callback_url:
+            payload["callback_url"] = self.callback_url
 
         try:
-            response = requests.post(
-                generate_url,
-                headers=headers,
-                json=payload,
-                timeout=60,
-            )
-
-            if response.status_code == 200:
-                json_data = response.json()
-                if "data" in json_data and "video_id" in json_data["data"]:
-                    video_id = json_data["data"]["video_id"]
-                    st.success(f"✅ v1 job gestart! Video ID: {video_id}")
-                    return video_id
-
-                st.error(f"❌ Onverwacht response format: {json_data}")
-                return None
-
-            st.error(f"❌ Generatie mislukt ({response.status_code}): {response.text}")
-            return None
+            response = self.client.generate_video("/v1/video.generate", payload, timeout=60)
         except Exception as e:
-            st.error(f"❌ Fout bij v1 video generatie: {str(e)}")
-            return None
+            raise VideoStartError(f"Fout bij v1 video generatie: {e}") from e
 
-    def _poll_for_completion(self, video_id: str) -> Optional[str]:
-        status_url = f"https://api.heygen.com/v1/video_status.get?video_id={video_id}"
-        headers = {"X-Api-Key": self.api_key}
+        if response.status_code != 200:
+            raise VideoStartError(
+                f"Generatie mislukt ({response.status_code}): {response.text}",
+                response.status_code,
+                response.text
+            )
 
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        progress_value = 0
+        json_data = response.json()
+        if "data" in json_data and "video_id" in json_data["data"]:
+            video_id = json_data["data"]["video_id"]
+            emit(on_event, JOB_STARTED, f"✅ v1 job gestart! Video ID: {video_id}", "success", video_id=video_id)
+            return video_id
+        raise VideoStartError(f"Onverwacht response format: {json_data}", response.status_code)
 
-        while True:
-            try:
-                response = requests.get(status_url, headers=headers)
-                json_data = response.json()
-
-                if "data" not in json_data:
-                    status_text.text("⏳ Wachten op data...")
-                    time.sleep(5)
-                    continue
-
-                data = json_data["data"]
-                status = data.get("status")
-
-                if status == "completed":
-                    progress_bar.progress(100)
-                    status_text.text("Status: Klaar!")
-                    video_url = data.get("video_url")
-                    st.success("🎥 Video is klaar!")
-                    return video_url
-
-                if status == "failed":
-                    error_msg = data.get("error", "Onbekende fout")
-                    st.error(f"❌ Renderen mislukt: {error_msg}")
-                    return None
-
-                status_text.text(f"Status: {status}... (even geduld)")
-                progress_value = min(progress_value + 5, 90)
-                progress_bar.progress(progress_value)
-                time.sleep(5)
-
-            except Exception as e:
-                st.error(f"Polling fout: {e}")
-                time.sleep(5)
-                continue
+    @traced("video.poll", labels={"api": "v1"})
+    def _poll_for_completion(
+        self,
+        video_id: str,
+        expected_seconds: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+        on_event: Optional[EventCallback] = None
+    ) -> str:
+        """
+        Wacht tot de video klaar is.
+
+        Pollt snel in het begin en trager naarmate het langer duurt, met een harde
+        deadline (self.poll_timeout) en optionele annulatie via cancel_event.
+        """
+        def on_status(status: str, elapsed: float, progress: int):
+            emit(on_event, STATUS, f"Status: {status}... ({int(elapsed)}s)", progress=progress,
+                 video_id=video_id, status=status, elapsed=elapsed)
+
+        def on_error(error: Exception):
+            emit(on_event, POLL_ERROR, f"⏳ Polling fout, opnieuw proberen: {error}", "warning",
+                 video_id=video_id, error=str(error))
+
+        if self.callback_url:
+            # Voltooiing komt via de webhook; pollen is enkel nog een traag vangnet
+            policy = PollPolicy.safety_net(expected_seconds or 60.0, timeout=self.poll_timeout)
+        else:
+            policy = PollPolicy(expected_seconds=expected_seconds or 60.0, timeout=self.poll_timeout)
+        data = wait_for_video(
+            self.client, video_id, policy, cancel_event, on_status, on_error, job_store=job_store
+        )
 
+        video_url = data.get("video_url")
+        emit(on_event, COMPLETED, "🎥 Video is klaar!", "success", progress=100,
+             video_id=video_id, video_url=video_url)
+        return video_url
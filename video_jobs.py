@@ -0,0 +1,332 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from storage import connect
+
+# Een claim zonder video ID (start bij HeyGen liep vast of het proces crashte)
+# blokkeert nieuwe aanvragen hooguit zo lang
+_CLAIM_TIMEOUT_SECONDS = 5 * 60
+# Actieve jobs die langer dan dit niets meer van zich lieten horen, gelden als verlopen
+_JOB_EXPIRY_SECONDS = 2 * 3600
+
+_COLUMNS = (
+    "video_id", "request_key", "account", "audio_hash", "avatar_id", "variant",
+    "status", "video_url", "error", "source", "created_at", "updated_at",
+)
+
+
+def request_key(text: str, avatar_id: str, audio_hash: str, *variant: str) -> str:
+    """
+    Sleutel voor een video aanvraag: dezelfde tekst, avatar en audio is dezelfde video.
+
+    De audio hash hoort erbij: dezelfde tekst met een andere stem (ELEVENLABS_VOICE_ID)
+    of via de OpenAI fallback is een andere video.
+
+    Args:
+        text: De (definitieve) tekst van de brief
+        avatar_id: HeyGen avatar of photo ID
+        audio_hash: heygen_client.audio_digest van de audio
+        *variant: Extra instellingen die het resultaat bepalen (bv. API versie)
+    """
+    parts = [text.strip(), avatar_id.strip(), audio_hash, *variant]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class VideoJobStore:
+    """
+    Duurzame opslag van HeyGen video jobs (SQLite, gedeeld over processen).
+
+    Elke job bewaart video ID, aanvraagsleutel, audio hash, avatar, status en
+    tijdstippen. Zo kan na een rerun of herstart opnieuw aangehaakt worden op een
+    lopende render, en claimt een aanvraag zijn sleutel zodat dezelfde video
+    niet twee keer tegelijk gerenderd wordt. Binnen het proces worden wachtende
+    sessies via een Condition meteen gewekt; updates van andere processen (bv.
+    een aparte webhook receiver) worden binnen een seconde opgemerkt.
+    """
+
+    FINISHED = ("completed", "failed")
+    ACTIVE = ("starting", "pending", "waiting", "processing")
+    # Daarnaast "expired": opgegeven claim of job, niet meer actief maar ook geen resultaat
+
+    def __init__(self, db_name: str = "heygen.db"):
+        """
+        Initialiseer de VideoJobStore.
+
+        Args:
+            db_name: SQLite database in de data map
+        """
+        self._local = threading.local()
+        self._db_name = db_name
+        self._condition = threading.Condition()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self._db_name)
+            self._local.conn = conn
+            # Schema pas bij het eerste gebruik: importeren raakt de schijf niet
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _create_schema(conn) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS video_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT UNIQUE,
+                request_key TEXT,
+                account TEXT,
+                audio_hash TEXT,
+                avatar_id TEXT,
+                variant TEXT,
+                status TEXT NOT NULL,
+                video_url TEXT,
+                error TEXT,
+                source TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        # Hooguit één actieve job per aanvraag: de basis voor deduplicatie
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS video_jobs_active_request ON video_jobs (request_key) "
+            "WHERE status IN ('starting', 'pending', 'waiting', 'processing')"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS video_jobs_status ON video_jobs (status, updated_at)")
+
+    @staticmethod
+    def _known(details: dict) -> dict:
+        return {k: v for k, v in details.items() if k in _COLUMNS}
+
+    # --- Aanvragen claimen --------------------------------------------------
+
+    def claim(self, request_key: str, **details) -> tuple[Optional[int], Optional[dict]]:
+        """
+        Claim een aanvraag voor er een render gestart wordt.
+
+        Returns:
+            (job ID, None) als deze aanvraag de render mag starten, of
+            (None, bestaande job) als er al een actieve job voor deze sleutel loopt
+        """
+        self.expire_stale()
+        now = time.time()
+        fields = {**self._known(details), "request_key": request_key, "status": "starting",
+                  "created_at": now, "updated_at": now}
+        conn = self._conn()
+        try:
+            cursor = conn.execute(
+                f"INSERT INTO video_jobs ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                tuple(fields.values())
+            )
+            return cursor.lastrowid, None
+        except sqlite3.IntegrityError:
+            row = conn.execute(
+                f"SELECT * FROM video_jobs WHERE request_key = ? AND status IN ({', '.join('?' * len(self.ACTIVE))})",
+                (request_key, *self.ACTIVE)
+            ).fetchone()
+            if row is None:
+                # Net afgewerkt tussen INSERT en SELECT: opnieuw proberen
+                return self.claim(request_key, **details)
+            return None, dict(row)
+
+    def release(self, job_id: int, error: str) -> None:
+        """Geef een claim vrij als de render niet gestart kon worden."""
+        self._conn().execute(
+            "UPDATE video_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ? AND video_id IS NULL",
+            (error, time.time(), job_id)
+        )
+        with self._condition:
+            self._condition.notify_all()
+
+    def expire_stale(self) -> None:
+        """Markeer vastgelopen claims en vergeten jobs als verlopen."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE video_jobs SET status = 'expired', updated_at = ? "
+            "WHERE (status = 'starting' AND updated_at < ?) "
+            "OR (status IN ('pending', 'waiting', 'processing') AND updated_at < ?)",
+            (now, now - _CLAIM_TIMEOUT_SECONDS, now - _JOB_EXPIRY_SECONDS)
+        )
+
+    # --- Jobs bijwerken -----------------------------------------------------
+
+    def register(self, video_id: str, job_id: Optional[int] = None, **details) -> None:
+        """Registreer een gestarte job (eventueel op een eerder geclaimde aanvraag)."""
+        now = time.time()
+        fields = self._known(details)
+        conn = self._conn()
+        if job_id is not None:
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            conn.execute(
+                f"UPDATE video_jobs SET video_id = ?, status = 'pending', updated_at = ?"
+                f"{', ' + assignments if assignments else ''} WHERE id = ?",
+                (video_id, now, *fields.values(), job_id)
+            )
+        else:
+            fields = {"status": "pending", **fields, "video_id": video_id, "created_at": now, "updated_at": now}
+            conn.execute(
+                f"INSERT OR IGNORE INTO video_jobs ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                tuple(fields.values())
+            )
+        with self._condition:
+            self._condition.notify_all()
+
+    def update(self, video_id: str, status: str, **details) -> None:
+        """Werk de status van een job bij en wek wachtende sessies."""
+        now = time.time()
+        fields = {**self._known(details), "status": status, "updated_at": now}
+        conn = self._conn()
+        cursor = conn.execute(
+            f"UPDATE video_jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE video_id = ?",
+            (*fields.values(), video_id)
+        )
+        if cursor.rowcount == 0:
+            # Onbekende job (bv. gestart vóór deze opslag bestond): toch bijhouden
+            fields.update(video_id=video_id, created_at=now)
+            conn.execute(
+                f"INSERT OR IGNORE INTO video_jobs ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                tuple(fields.values())
+            )
+        with self._condition:
+            self._condition.notify_all()
+
+    def mark_completed(self, video_id: str, video_url: str, **details) -> None:
+        self.update(video_id, "completed", video_url=video_url, **details)
+
+    def mark_failed(self, video_id: str, error: str, **details) -> None:
+        self.update(video_id, "failed", error=error, **details)
+
+    # --- Opvragen -----------------------------------------------------------
+
+    def get(self, video_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM video_jobs WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_job(self, job_id: int) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM video_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest(self, request_key: str) -> Optional[dict]:
+        """Meest recente job voor een aanvraag (in eender welke status)."""
+        row = self._conn().execute(
+            "SELECT * FROM video_jobs WHERE request_key = ? ORDER BY id DESC LIMIT 1", (request_key,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def active_jobs(self, account: Optional[str] = None) -> list[dict]:
+        """Lopende jobs met een video ID (om na een herstart op aan te haken)."""
+        self.expire_stale()
+        query = "SELECT * FROM video_jobs WHERE video_id IS NOT NULL AND status IN ('pending', 'waiting', 'processing')"
+        params: tuple = ()
+        if account is not None:
+            query += " AND account = ?"
+            params = (account,)
+        return [dict(row) for row in self._conn().execute(query + " ORDER BY created_at", params)]
+
+    # --- Wachten ------------------------------------------------------------
+
+    def wait(
+        self,
+        video_id: str,
+        timeout: float,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Optional[dict]:
+        """
+        Wacht tot een job klaar of mislukt is.
+
+        Args:
+            video_id: De ID van de video
+            timeout: Maximum aantal seconden wachten
+            cancel_event: Stop vroeger als dit event gezet wordt
+
+        Returns:
+            De job als die afgewerkt is, anders None (timeout of annulatie)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(video_id)
+            if job and job.get("status") in self.FINISHED:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (cancel_event is not None and cancel_event.is_set()):
+                return None
+            # In korte stappen wachten zodat annulatie en updates van andere processen snel opgemerkt worden
+            with self._condition:
+                self._condition.wait(min(remaining, 1.0))
+
+    def wait_for_start(self, job_id: int, timeout: float = _CLAIM_TIMEOUT_SECONDS) -> Optional[dict]:
+        """
+        Wacht tot een geclaimde aanvraag een video ID heeft (of mislukt is).
+
+        Returns:
+            De job, of None als er binnen de timeout niets gebeurde
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job is None or job["video_id"] or job["status"] not in self.ACTIVE:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._condition:
+                self._condition.wait(min(remaining, 1.0))
+
+
+job_store = VideoJobStore()
+
+_resumed: set[str] = set()
+_resumed_lock = threading.Lock()
+
+
+def resume_pending_jobs(api_key: str, store: VideoJobStore = job_store, poll_timeout: float = 900.0) -> int:
+    """
+    Haak na een (her)start aan op renders die nog liepen.
+
+    Per lopende job pollt een achtergrondthread tot de video klaar is en bewaart
+    die in het video archief onder de aanvraagsleutel. Een sessie die dezelfde
+    video later opnieuw vraagt, krijgt hem dan zonder nieuwe render.
+
+    Returns:
+        Aantal jobs waarop aangehaakt werd
+    """
+    from heygen_client import account_key, get_client
+    from video_archive import get_video_archive
+    from video_polling import PollPolicy, VideoPollError, wait_for_video
+
+    client = get_client(api_key)
+    started = 0
+    for job in store.active_jobs(account_key(api_key)):
+        video_id = job["video_id"]
+        with _resumed_lock:
+            if video_id in _resumed:
+                continue
+            _resumed.add(video_id)
+
+        def run(job=job):
+            try:
+                data = wait_for_video(client, job["video_id"], PollPolicy(timeout=poll_timeout), job_store=store)
+                if job["request_key"] and data.get("video_url"):
+                    get_video_archive().store(job["request_key"], data["video_url"], job["video_id"])
+            except VideoPollError:
+                pass
+            except Exception:
+                # Archiveren mislukt: de job staat wel op klaar, met de HeyGen URL
+                pass
+            finally:
+                with _resumed_lock:
+                    _resumed.discard(job["video_id"])
+
+        threading.Thread(target=run, name=f"video-resume-{video_id}", daemon=True).start()
+        started += 1
+    return started
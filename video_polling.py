@@ -0,0 +1,203 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from tracing import annotate
+from video_events import VideoGenerationError
+
+# MP3 van ElevenLabs/OpenAI: 128 kbps
+MP3_BYTES_PER_SECOND = 128_000 / 8
+
+# Rendertijd ≈ vaste opstart + factor × audioduur; de factor wordt bijgeleerd
+# uit afgewerkte jobs (exponentieel voortschrijdend gemiddelde).
+_RENDER_OVERHEAD_SECONDS = 20.0
+_render_factor = 3.0
+_render_factor_lock = threading.Lock()
+
+
+class VideoPollError(VideoGenerationError):
+    """Basis voor fouten tijdens het wachten op een HeyGen video."""
+
+
+class VideoRenderFailed(VideoPollError):
+    """HeyGen meldt dat het renderen mislukt is."""
+
+
+class VideoPollTimeout(VideoPollError):
+    """De video was niet klaar voor de deadline."""
+
+
+class VideoPollCancelled(VideoPollError):
+    """Het wachten werd geannuleerd."""
+
+
+def audio_seconds_from_size(num_bytes: int) -> float:
+    """Schat de duur van een MP3 op basis van de grootte."""
+    return num_bytes / MP3_BYTES_PER_SECOND
+
+
+def expected_render_seconds(audio_seconds: float) -> float:
+    """Verwachte rendertijd voor een video met audio van deze duur."""
+    return _RENDER_OVERHEAD_SECONDS + _render_factor * audio_seconds
+
+
+def record_render(audio_seconds: float, render_seconds: float) -> None:
+    """Leer van een afgewerkte job zodat volgende schattingen beter kloppen."""
+    global _render_factor
+    if audio_seconds <= 0:
+        return
+    observed = max(0.5, (render_seconds - _RENDER_OVERHEAD_SECONDS) / audio_seconds)
+    with _render_factor_lock:
+        _render_factor = 0.8 * _render_factor + 0.2 * observed
+
+
+class PollPolicy:
+    """
+    Bepaalt hoe vaak de status opgevraagd wordt.
+
+    Eerst snel (min_interval), daarna telkens iets trager. Zolang de verwachte
+    rendertijd niet verstreken is blijft het interval klein (≤ 1/4 van de
+    verwachte tijd), nadien loopt het op tot max_interval. Na timeout seconden
+    wordt gestopt.
+    """
+
+    def __init__(
+        self,
+        expected_seconds: float = 60.0,
+        min_interval: float = 1.0,
+        max_interval: float = 15.0,
+        growth: float = 1.3,
+        timeout: float = 15 * 60.0
+    ):
+        self.expected_seconds = expected_seconds
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.timeout = timeout
+
+    def next_interval(self, previous: Optional[float], elapsed: float) -> float:
+        """Wachttijd tot de volgende poll."""
+        if previous is None:
+            return self.min_interval
+        cap = self.max_interval
+        if elapsed < self.expected_seconds:
+            cap = min(cap, max(self.min_interval, self.expected_seconds / 4))
+        return min(cap, max(self.min_interval, previous * self.growth))
+
+    @classmethod
+    def safety_net(cls, expected_seconds: float = 60.0, timeout: float = 15 * 60.0) -> "PollPolicy":
+        """Traag pollen als vangnet wanneer de voltooiing via een webhook binnenkomt."""
+        return cls(
+            expected_seconds=expected_seconds,
+            min_interval=max(30.0, expected_seconds),
+            max_interval=120.0,
+            timeout=timeout,
+        )
+
+    def progress(self, status: str, elapsed: float) -> int:
+        """Geschatte voortgang (0-100) op basis van status en verstreken tijd."""
+        if status == "completed":
+            return 100
+        if status in ("pending", "waiting"):
+            return 5
+        if status == "processing":
+            fraction = min(1.0, elapsed / max(self.expected_seconds, 1.0))
+            return min(95, 10 + int(85 * fraction))
+        return 0
+
+
+StatusCallback = Callable[[str, float, int], None]
+
+
+def wait_for_video(
+    client,
+    video_id: str,
+    policy: Optional[PollPolicy] = None,
+    cancel_event: Optional[threading.Event] = None,
+    on_status: Optional[StatusCallback] = None,
+    on_error: Optional[Callable[[Exception], None]] = None,
+    job_store=None
+) -> dict:
+    """
+    Wacht tot een HeyGen video klaar is.
+
+    Args:
+        client: HeyGenClient
+        video_id: De ID van de video
+        policy: Pollingbeleid (standaard PollPolicy())
+        cancel_event: Zet dit event om het wachten af te breken
+        on_status: Callback (status, verstreken seconden, voortgang) bij elke poll
+        on_error: Callback bij een (tijdelijke) fout tijdens het pollen
+        job_store: VideoJobStore die door de webhook receiver bijgewerkt wordt; tussen
+            twee polls wordt daarop gewacht zodat een callback meteen doorkomt
+
+    Aantal polls en de tijd in de HeyGen wachtrij (tot de eerste "processing") komen
+    als attributen op de lopende span (zie tracing.py).
+
+    Returns:
+        De `data` van de status response (met o.a. `video_url`)
+
+    Raises:
+        VideoRenderFailed: Als HeyGen de video als mislukt meldt
+        VideoPollTimeout: Als de deadline verstreken is
+        VideoPollCancelled: Als cancel_event gezet werd
+    """
+    policy = policy or PollPolicy()
+    cancel_event = cancel_event or threading.Event()
+    start = time.monotonic()
+    deadline = start + policy.timeout
+    interval = None
+    polls = 0
+    queued_seconds = None
+
+    while True:
+        elapsed = time.monotonic() - start
+        status = None
+        try:
+            polls += 1
+            response = client.video_status(video_id)
+            json_data = response.json()
+            data = json_data.get("data")
+            if data:
+                status = data.get("status")
+                if status not in (None, "pending", "waiting") and queued_seconds is None:
+                    queued_seconds = round(elapsed, 3)
+                annotate(polls=polls, queue_seconds=queued_seconds)
+                if status == "completed":
+                    if job_store is not None:
+                        job_store.mark_completed(video_id, data.get("video_url"), source="poll")
+                    if on_status:
+                        on_status(status, elapsed, 100)
+                    annotate(completed_via="poll")
+                    return data
+                if status == "failed":
+                    if job_store is not None:
+                        job_store.mark_failed(video_id, data.get("error") or "Onbekende fout", source="poll")
+                    raise VideoRenderFailed(data.get("error") or "Onbekende fout", video_id)
+            if on_status:
+                # Nog geen data betekent dat de job nog in de wachtrij staat
+                shown = status or "waiting"
+                on_status(shown, elapsed, policy.progress(shown, elapsed))
+        except VideoPollError:
+            raise
+        except Exception as e:
+            if on_error:
+                on_error(e)
+
+        interval = policy.next_interval(interval, elapsed)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise VideoPollTimeout(f"Video {video_id} niet klaar na {int(policy.timeout)} seconden", video_id)
+        if job_store is not None:
+            job = job_store.wait(video_id, min(interval, remaining), cancel_event)
+            if job is not None:
+                if job["status"] == "failed":
+                    raise VideoRenderFailed(job.get("error") or "Onbekende fout", video_id)
+                if on_status:
+                    on_status("completed", time.monotonic() - start, 100)
+                annotate(completed_via="webhook")
+                return {"status": "completed", "video_url": job.get("video_url"), "video_id": video_id}
+            if cancel_event.is_set():
+                raise VideoPollCancelled(f"Wachten op video {video_id} geannuleerd", video_id)
+        elif cancel_event.wait(min(interval, remaining)):
+            raise VideoPollCancelled(f"Wachten op video {video_id} geannuleerd", video_id)
@@ -0,0 +1,208 @@
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from rate_limiter import get_rate_limiter
+from tracing import span
+
+
+class VideoTicket:
+    """Plaats in de wachtrij voor één video job."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user: str):
+        self.id = next(self._ids)
+        self.user = user
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.cancelled = False
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None
+
+
+WaitCallback = Callable[[int, float], None]
+
+
+class VideoJobScheduler:
+    """
+    Centrale planner voor HeyGen video jobs.
+
+    Laat nooit meer dan `max_concurrent` renders tegelijk toe (de limiet van het
+    HeyGen account). Een vrijgekomen plaats gaat naar de wachtende gebruiker met
+    de minste lopende jobs (bij gelijkstand round-robin), zodat één gebruiker met
+    veel video's de anderen niet blokkeert.
+
+    De planner verdeelt de plaatsen binnen één proces; `slot` neemt daarnaast een
+    lease van de gedeelde "heygen" limiet (rate_limiter.py), zodat de accountlimiet
+    ook over workers en batch processen heen geldt.
+    """
+
+    def __init__(self, max_concurrent: int = 3, default_duration: float = 90.0):
+        """
+        Initialiseer de VideoJobScheduler.
+
+        Args:
+            max_concurrent: Maximum aantal gelijktijdige video jobs
+            default_duration: Geschatte duur van een job (seconden) zolang er geen metingen zijn
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self._avg_duration = default_duration
+        self._queues: "OrderedDict[str, deque[VideoTicket]]" = OrderedDict()
+        self._running: set[int] = set()
+        self._running_per_user: Counter = Counter()
+        self._condition = threading.Condition()
+
+    # --- Wachtrij -----------------------------------------------------------
+
+    def submit(self, user: str) -> VideoTicket:
+        """Zet een job van een gebruiker in de wachtrij."""
+        ticket = VideoTicket(user)
+        with self._condition:
+            self._queues.setdefault(user, deque()).append(ticket)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self) -> None:
+        # De gekozen gebruiker krijgt zijn oudste job en schuift daarna achteraan
+        # als hij er nog heeft.
+        while len(self._running) < self.max_concurrent and self._queues:
+            user = self._next_user(self._queues, self._running_per_user)
+            queue = self._queues[user]
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            ticket.started_at = time.monotonic()
+            self._running.add(ticket.id)
+            self._running_per_user[user] += 1
+        self._condition.notify_all()
+
+    @staticmethod
+    def _next_user(queues: "OrderedDict[str, deque]", running_per_user: Counter) -> str:
+        # Minste lopende jobs eerst; min() houdt bij gelijkstand de rij-volgorde aan
+        return min(queues, key=lambda user: running_per_user[user])
+
+    def _waiting_order(self) -> list[VideoTicket]:
+        """Volgorde waarin de wachtende jobs een plaats zullen krijgen."""
+        queues = OrderedDict((user, deque(queue)) for user, queue in self._queues.items())
+        running = Counter(self._running_per_user)
+        order = []
+        while queues:
+            user = self._next_user(queues, running)
+            order.append(queues[user].popleft())
+            running[user] += 1
+            if queues[user]:
+                queues.move_to_end(user)
+            else:
+                del queues[user]
+        return order
+
+    def position(self, ticket: VideoTicket) -> int:
+        """Positie in de wachtrij (1 = volgende), 0 als de job al loopt."""
+        with self._condition:
+            if ticket.running:
+                return 0
+            for i, waiting in enumerate(self._waiting_order(), 1):
+                if waiting.id == ticket.id:
+                    return i
+            return 0
+
+    def eta(self, ticket: VideoTicket) -> float:
+        """Geschatte wachttijd (seconden) tot de job kan starten."""
+        position = self.position(ticket)
+        if position == 0:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self._avg_duration
+
+    def stats(self) -> dict:
+        """Momentopname van de planner (voor monitoring)."""
+        with self._condition:
+            return {
+                "running": len(self._running),
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "max_concurrent": self.max_concurrent,
+                "avg_duration": self._avg_duration,
+            }
+
+    # --- Plaatsen nemen en vrijgeven ----------------------------------------
+
+    def wait(self, ticket: VideoTicket, timeout: Optional[float] = None) -> bool:
+        """Wacht tot de job mag starten. Geeft False terug bij timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: ticket.running, timeout)
+
+    def release(self, ticket: VideoTicket) -> None:
+        """Geef de plaats van een job vrij (of haal hem uit de wachtrij)."""
+        with self._condition:
+            if ticket.running:
+                if ticket.id in self._running:
+                    self._running.discard(ticket.id)
+                    self._running_per_user[ticket.user] -= 1
+                    duration = time.monotonic() - ticket.started_at
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            else:
+                ticket.cancelled = True
+                queue = self._queues.get(ticket.user)
+                if queue is not None:
+                    try:
+                        queue.remove(ticket)
+                    except ValueError:
+                        pass
+                    if not queue:
+                        del self._queues[ticket.user]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user: str, on_wait: Optional[WaitCallback] = None, poll_interval: float = 1.0):
+        """
+        Context manager: wacht op een vrije plaats, voer de job uit en geef de plaats vrij.
+
+        Args:
+            user: Gebruiker/sessie (voor eerlijke verdeling)
+            on_wait: Callback (positie, eta in seconden) zolang de job wacht
+            poll_interval: Hoe vaak on_wait aangeroepen wordt
+        """
+        ticket = self.submit(user)
+        limiter = get_rate_limiter()
+        lease_id = None
+        try:
+            with span("video.queue", position=self.position(ticket)):
+                while not self.wait(ticket, poll_interval):
+                    if on_wait:
+                        on_wait(self.position(ticket), self.eta(ticket))
+                # Eerste in dit proces; wacht nog op een vrije render bij de andere processen
+                lease_id = limiter.acquire(
+                    "heygen",
+                    on_wait=(lambda wait: on_wait(1, self._avg_duration / self.max_concurrent)) if on_wait else None
+                )
+            yield ticket
+        finally:
+            limiter.release(lease_id)
+            self.release(ticket)
+
+    def run(self, user: str, fn: Callable, *args, on_wait: Optional[WaitCallback] = None, **kwargs):
+        """Voer fn(*args, **kwargs) uit zodra er een plaats vrij is."""
+        with self.slot(user, on_wait):
+            return fn(*args, **kwargs)
+
+
+_scheduler: Optional[VideoJobScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> VideoJobScheduler:
+    """Gedeelde planner voor het proces (limiet via HEYGEN_MAX_CONCURRENT, standaard 3)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = VideoJobScheduler(int(os.getenv("HEYGEN_MAX_CONCURRENT", "3")))
+        return _scheduler
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Kleine HTTP receiver voor HeyGen webhooks.
+
+HeyGen roept na het renderen de callback URL aan met een `avatar_video.success`
+of `avatar_video.fail` event. De receiver zet de job in de gedeelde job store
+op klaar/mislukt, waardoor de wachtende sessie meteen verder kan.
+
+Zonder HEYGEN_WEBHOOK_SECRET start de receiver niet: elke callback moet gesigneerd
+zijn, anders kan wie de poort bereikt een willekeurige `video_url` als klaar melden
+(die het archief dan server-side downloadt en aan de familie toont).
+
+Lokaal testen zonder HeyGen:
+    python webhook_receiver.py simulate <video_id> <video_url> [--port 8765]
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from video_jobs import VideoJobStore, job_store
+
+WEBHOOK_PATH = "/heygen/webhook"
+DEFAULT_PORT = 8765
+
+SUCCESS_EVENTS = ("avatar_video.success",)
+FAILURE_EVENTS = ("avatar_video.fail",)
+
+
+def handle_event(event: dict, store: VideoJobStore = job_store) -> bool:
+    """
+    Verwerk een HeyGen webhook event.
+
+    Returns:
+        True als het event een gekende video job bijwerkte
+    """
+    event_type = event.get("event_type", "")
+    data = event.get("event_data") or {}
+    video_id = data.get("video_id")
+    if not video_id:
+        return False
+
+    if event_type in SUCCESS_EVENTS:
+        store.mark_completed(video_id, data.get("url") or data.get("video_url"), source="webhook")
+        return True
+    if event_type in FAILURE_EVENTS:
+        store.mark_failed(video_id, data.get("msg") or data.get("error") or "Onbekende fout", source="webhook")
+        return True
+    return False
+
+
+def _valid_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+
+class WebhookSecretMissing(RuntimeError):
+    """De receiver wordt niet gestart zonder HEYGEN_WEBHOOK_SECRET."""
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    store: VideoJobStore = job_store
+    secret: str = ""
+
+    def do_POST(self):
+        if self.path.split("?")[0] != WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        if not self.secret or not _valid_signature(body, self.headers.get("Signature"), self.secret):
+            self.send_error(401, "Ongeldige handtekening")
+            return
+        try:
+            event = json.loads(body or b"{}")
+        except ValueError:
+            self.send_error(400, "Ongeldige JSON")
+            return
+
+        handle_event(event, self.store)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"ok": true}')
+
+    def log_message(self, format, *args):
+        # Geen request logging op stderr voor elke callback
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_receiver(
+    port: int = DEFAULT_PORT,
+    host: Optional[str] = None,
+    store: VideoJobStore = job_store,
+    secret: Optional[str] = None
+) -> ThreadingHTTPServer:
+    """
+    Start de receiver op een achtergrondthread (hooguit één keer per proces).
+
+    Args:
+        port: Poort om op te luisteren
+        host: Interface (standaard HEYGEN_WEBHOOK_HOST, of 127.0.0.1 achter een reverse proxy)
+        store: Job store die bijgewerkt wordt
+        secret: Secret voor de handtekening (standaard HEYGEN_WEBHOOK_SECRET)
+
+    Raises:
+        WebhookSecretMissing: Als er geen secret is
+    """
+    global _server
+    secret = secret if secret is not None else os.getenv("HEYGEN_WEBHOOK_SECRET")
+    if not secret:
+        raise WebhookSecretMissing("HEYGEN_WEBHOOK_SECRET ontbreekt: ongesigneerde callbacks worden niet aanvaard")
+    host = host or os.getenv("HEYGEN_WEBHOOK_HOST") or "127.0.0.1"
+    with _server_lock:
+        if _server is None:
+            handler = type("WebhookHandler", (_WebhookHandler,), {"store": store, "secret": secret})
+            _server = ThreadingHTTPServer((host, port), handler)
+            thread = threading.Thread(target=_server.serve_forever, name="heygen-webhook", daemon=True)
+            thread.start()
+        return _server
+
+
+def simulate_callback(
+    video_id: str,
+    video_url: Optional[str] = None,
+    error: Optional[str] = None,
+    url: str = f"http://127.0.0.1:{DEFAULT_PORT}{WEBHOOK_PATH}",
+    secret: Optional[str] = None
+) -> int:
+    """Stuur een nagemaakte HeyGen callback naar een receiver (lokale stand-in voor HeyGen)."""
+    if error:
+        event = {"event_type": "avatar_video.fail", "event_data": {"video_id": video_id, "msg": error}}
+    else:
+        event = {"event_type": "avatar_video.success", "event_data": {"video_id": video_id, "url": video_url}}
+    body = json.dumps(event).encode()
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    if secret:
+        request.add_header("Signature", hmac.new(secret.encode(), body, hashlib.sha256).hexdigest())
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="HeyGen webhook receiver")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Start de receiver (voorgrond)")
+    serve.add_argument("--port", type=int, default=int(os.getenv("HEYGEN_WEBHOOK_PORT") or DEFAULT_PORT))
+
+    simulate = sub.add_parser("simulate", help="Stuur een nagemaakte callback")
+    simulate.add_argument("video_id")
+    simulate.add_argument("video_url", nargs="?")
+    simulate.add_argument("--error", help="Simuleer een mislukte render met deze foutmelding")
+    simulate.add_argument("--port", type=int, default=int(os.getenv("HEYGEN_WEBHOOK_PORT") or DEFAULT_PORT))
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        try:
+            server = start_receiver(args.port)
+        except WebhookSecretMissing as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"📡 HeyGen webhook receiver luistert op poort {args.port}{WEBHOOK_PATH}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    status = simulate_callback(
+        args.video_id,
+        args.video_url,
+        args.error,
+        url=f"http://127.0.0.1:{args.port}{WEBHOOK_PATH}",
+        secret=os.getenv("HEYGEN_WEBHOOK_SECRET"),
+    )
+    print(f"✅ Callback verstuurd (HTTP {status})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
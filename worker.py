@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Worker processen voor de job queue (job_queue.py).
+
+Elke worker neemt jobs uit de queue en voert ze uit met dezelfde generators als de
+app (generator_config.py). Zo loopt het werk los van de Streamlit sessie die het
+aanvroeg en schaalt de doorvoer met het aantal workers.
+
+    python worker.py                  # één worker per CPU core
+    python worker.py -n 4             # vier worker processen
+    python worker.py --kinds video    # enkel video jobs
+    python worker.py --once           # één job uitvoeren (indien aanwezig) en stoppen
+    python worker.py --purge          # oude afgewerkte jobs (en hun artifacts) opruimen
+
+Elke worker ruimt ook zelf om het uur afgewerkte jobs ouder dan
+SINTERKLAAS_JOB_RETENTION_HOURS (standaard 7 dagen) op.
+
+Soorten jobs en hun resultaat:
+    message  payload: argumenten van MessageGenerator.generate  → {"text": ...}
+    audio    payload: {"text"}                                  → {"audio": <pad naar mp3>}
+    video    payload: {"text"}, depends_on: audio job           → {"video_url", "video_path"}
+    pdf      payload: {"text"}                                  → {"pdf": <pad naar pdf>}
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Optional
+
+import generator_config
+from job_queue import Job, JobQueue, PermanentJobError, artifact_dir, get_job_queue
+from tracing import span
+
+# Hoe vaak een worker oude afgewerkte jobs opruimt (seconden)
+PURGE_INTERVAL = 3600.0
+
+
+class JobContext:
+    """Wat een handler van zijn job mag weten en doen."""
+
+    def __init__(self, queue: JobQueue, job: Job, worker: str):
+        self.queue = queue
+        self.job = job
+        self.worker = worker
+        # Gezet als de job geannuleerd of door een andere worker overgenomen werd
+        self.cancelled = threading.Event()
+        self.dependency: Optional[dict] = None
+        if job.depends_on:
+            parent = queue.get(job.depends_on)
+            self.dependency = parent.result if parent else None
+
+    def progress(self, message: str) -> None:
+        """Bewaar een voortgangsmelding (zichtbaar voor de aanvrager)."""
+        if not self.queue.heartbeat(self.job.id, self.worker, message):
+            self.cancelled.set()
+
+    def artifact(self, name: str) -> Path:
+        """Pad voor een uitvoerbestand van deze job."""
+        return artifact_dir(self.job.id) / name
+
+
+def _require(generator, what: str):
+    if generator is None:
+        raise PermanentJobError(f"{what} is niet geconfigureerd (API keys ontbreken)")
+    return generator
+
+
+def run_message(job: Job, ctx: JobContext) -> dict:
+    message_gen = _require(generator_config.message_generator(), "MessageGenerator")
+    ctx.progress("Sinterklaas schrijft zijn boodschap...")
+    return {"text": message_gen.generate(**job.payload)}
+
+
+def run_audio(job: Job, ctx: JobContext) -> dict:
+    audio_gen = _require(generator_config.audio_generator(), "AudioGenerator")
+    ctx.progress("Sinterklaas spreekt...")
+    audio = audio_gen.generate(job.payload["text"], prefer_elevenlabs=job.payload.get("prefer_elevenlabs", True))
+    path = ctx.artifact("audio.mp3")
+    path.write_bytes(audio.getvalue())
+    return {"audio": str(path)}
+
+
+def run_video(job: Job, ctx: JobContext) -> dict:
+    from heygen_client import audio_digest
+    from video_archive import get_video_archive
+    from video_jobs import request_key
+    from video_scheduler import get_scheduler
+
+    video_gen = _require(generator_config.video_generator(), "VideoGenerator")
+    if not ctx.dependency or not ctx.dependency.get("audio"):
+        raise PermanentJobError("Geen audio voor de video (audio job zonder resultaat)")
+
+    audio_bytes = io.BytesIO(Path(ctx.dependency["audio"]).read_bytes())
+    archive = get_video_archive()
+    # Met de audio in de sleutel: een andere stem of engine is een andere video
+    key = request_key(job.payload["text"], video_gen.avatar_id, audio_digest(audio_bytes), type(video_gen).__name__)
+    video_path = archive.lookup(key)
+    if video_path is not None:
+        return {"video_url": None, "video_path": str(video_path), "from_archive": True}
+
+    # Zelfde eerlijke verdeling als in de app, per aanvrager
+    with get_scheduler().slot(job.owner or job.id, on_wait=lambda position, eta: ctx.progress(
+        f"In de wachtrij: positie {position}, nog ±{int(eta)} seconden"
+    )):
+        video_url = video_gen.generate(
+            audio_bytes,
+            cancel_event=ctx.cancelled,
+            on_event=lambda event: ctx.progress(event.message),
+            request_key=key
+        )
+    try:
+        video_path = archive.store(key, video_url)
+    except Exception as e:
+        ctx.progress(f"Video kon niet lokaal bewaard worden: {e}")
+        video_path = None
+    return {
+        "video_url": video_url,
+        "video_path": str(video_path) if video_path else None,
+        "from_archive": False,
+    }
+
+
+def run_pdf(job: Job, ctx: JobContext) -> dict:
+    from pdf_renderer import get_pdf
+
+    letter_gen = _require(generator_config.letter_generator(), "LetterGenerator")
+    ctx.progress("Brief wordt als PDF gezet...")
+    html = letter_gen.generate_html(job.payload["text"], for_print=True)
+    try:
+        pdf_bytes = get_pdf(html)
+    except ImportError as e:
+        raise PermanentJobError(f"playwright is niet geïnstalleerd: {e}") from e
+    path = ctx.artifact("brief.pdf")
+    path.write_bytes(pdf_bytes)
+    return {"pdf": str(path)}
+
+
+HANDLERS: dict[str, Callable[[Job, JobContext], dict]] = {
+    "message": run_message,
+    "audio": run_audio,
+    "video": run_video,
+    "pdf": run_pdf,
+}
+
+
+class Worker:
+    """Neemt jobs uit de queue en voert ze één voor één uit."""
+
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        name: Optional[str] = None,
+        kinds: Optional[list[str]] = None,
+        poll_interval: float = 1.0
+    ):
+        """
+        Initialiseer de Worker.
+
+        Args:
+            queue: De job queue (standaard de gedeelde queue)
+            name: Naam voor de lease (standaard host:pid)
+            kinds: Enkel deze soorten jobs (standaard alle met een handler)
+            poll_interval: Wachttijd in seconden als de queue leeg is
+        """
+        self.queue = queue or get_job_queue()
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds or list(HANDLERS)
+        self.poll_interval = poll_interval
+        # Eerste opruimronde kort na de start, daarna om de PURGE_INTERVAL seconden
+        self._next_purge = 0.0
+
+    def _heartbeat(self, ctx: JobContext, done: threading.Event) -> None:
+        # Lease verlengen zolang de handler loopt
+        interval = self.queue.lease_seconds / 3
+        while not done.wait(interval):
+            if not self.queue.heartbeat(ctx.job.id, self.name):
+                ctx.cancelled.set()
+                return
+
+    def run_once(self) -> bool:
+        """
+        Voer één job uit.
+
+        Returns:
+            False als er geen job klaar stond
+        """
+        self._maybe_purge()
+        job = self.queue.claim(self.name, self.kinds)
+        if job is None:
+            return False
+
+        ctx = JobContext(self.queue, job, self.name)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(ctx, done), daemon=True)
+        heartbeat.start()
+        started = time.monotonic()
+        try:
+            with span("job.run", labels={"kind": job.kind}, job_id=job.id, worker=self.name):
+                result = HANDLERS[job.kind](job, ctx)
+        except PermanentJobError as e:
+            status = self.queue.fail(job.id, self.name, str(e), retry=False)
+        except Exception as e:
+            traceback.print_exc()
+            status = self.queue.fail(job.id, self.name, f"{type(e).__name__}: {e}")
+        else:
+            status = "succeeded" if self.queue.complete(job.id, self.name, result) else "cancelled"
+        finally:
+            done.set()
+        print(f"[{self.name}] {job.kind} {job.id} → {status} ({time.monotonic() - started:.1f}s)", flush=True)
+        return True
+
+    def _maybe_purge(self) -> None:
+        # Afgewerkte jobs en hun artifacts niet eindeloos laten groeien (ook voor de API workers)
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + PURGE_INTERVAL
+        try:
+            purged = self.queue.purge()
+        except Exception as e:
+            print(f"[{self.name}] ⚠️ Opruimen van oude jobs mislukt: {e}", flush=True)
+            return
+        if purged:
+            print(f"[{self.name}] 🧹 {purged} oude job(s) opgeruimd", flush=True)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """Voer jobs uit tot `stop` gezet wordt."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.run_once():
+                stop.wait(self.poll_interval)
+
+
+def _process_main(kinds: Optional[list[str]]) -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    Worker(kinds=kinds).run(stop)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Workers voor de Sinterklaas job queue")
+    parser.add_argument("-n", "--processes", type=int, default=os.cpu_count() or 1,
+                        help="Aantal worker processen (standaard één per CPU core)")
+    parser.add_argument("--kinds", help=f"Enkel deze soorten jobs, komma-gescheiden ({', '.join(HANDLERS)})")
+    parser.add_argument("--once", action="store_true", help="Eén job uitvoeren en stoppen")
+    parser.add_argument("--purge", action="store_true",
+                        help="Afgewerkte jobs ouder dan SINTERKLAAS_JOB_RETENTION_HOURS opruimen en stoppen")
+    args = parser.parse_args(argv)
+
+    kinds = [kind.strip() for kind in args.kinds.split(",")] if args.kinds else None
+    if kinds and set(kinds) - set(HANDLERS):
+        parser.error(f"Onbekende soort job: {', '.join(sorted(set(kinds) - set(HANDLERS)))}")
+
+    if args.purge:
+        print(f"🧹 {get_job_queue().purge()} oude job(s) opgeruimd")
+        return 0
+
+    if args.once:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        return 0 if Worker(kinds=kinds).run_once() else 1
+
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(kinds,), name=f"worker-{i}")
+        for i in range(max(1, args.processes))
+    ]
+    for process in processes:
+        process.start()
+    print(f"🛠️ {len(processes)} worker(s) gestart ({', '.join(kinds or HANDLERS)})", flush=True)
+
+    def shutdown(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())